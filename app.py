@@ -1,14 +1,34 @@
-from flask import Flask, render_template, request, jsonify, send_file, make_response, redirect, flash, session, url_for
+from flask import Flask, render_template, request, jsonify, send_file, make_response, redirect, flash, session, url_for, \
+    Response, stream_with_context
 import pandas as pd
 from sqlalchemy import create_engine
+import csv
 import io
+import os
+import tempfile
 from datetime import datetime, timedelta
 import logging
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
-from pdf_generator import generate_mls_pdf
-from sqlalchemy.sql import text
+from pdf_generator import generate_mls_pdf, report_digest
+from mls_media import MediaLibrary
+from mls_stock import StockLedger, StockLedgerUnavailable
+from mls_pdf_jobs import PdfJobQueue, QueueFull
+from mls_pdf_export import ExportProgress, get_export_pool, render_reports, zip_stream
+from mls_columns import DETAIL_COLUMNS, decode_record
+from mls_loader import copy_frame, stream_frame, supports_copy
+from mls_http import compress_response, is_not_modified
+from mls_metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, DB_LOAD_SECONDS, PDF_RENDER_SECONDS, REGISTRY,
+                         SNAPSHOT_MEMORY_BYTES, SNAPSHOT_ROWS, SNAPSHOT_SYNC_AGE_SECONDS, track_requests)
+from mls_pdf_cache import PdfCache
+from mls_logging import configure_logging
+from mls_json import frame_payload, frame_records, json_response, ndjson_lines
+from mls_writes import MlsPointWriter, read_edits_csv
+from mls_store import HybridPointStore, MemoryPointStore, SqlPointStore, snapshot_details
+from mls_snapshot import MlsSnapshot, SnapshotLoader, SnapshotRefresher, normalise_column_name
+from sqlalchemy.sql import bindparam, text
 from functools import wraps
+import click
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'
@@ -16,7 +36,21 @@ app.secret_key = 'your_secret_key_here'
 app.permanent_session_lifetime = timedelta(hours=1)
 
 # ---- Logging Setup ----
-logging.basicConfig(level=logging.INFO)
+# Lines are written by a background thread from a queue (async), as text or
+# one JSON object per line with the request's route, method and path.
+# Per-request detail and data dumps are DEBUG; with level DEBUG, each
+# route's DEBUG lines are kept for debug_sample_rates[rule] of its requests
+# (debug_sample_rate for the rest)
+LOGGING_CONFIG = {
+    'level': 'INFO',
+    'json': False,
+    'queue': True,
+    'debug_sample_rate': 1.0,
+    'debug_sample_rates': {
+        '/api/mls_points/<district>/<mandal>': 0.01,
+        '/api/search_mls/<search_term>': 0.01
+    }
+}
 logger = logging.getLogger(__name__)
 
 # ---- PostgreSQL Config ----
@@ -28,7 +62,241 @@ PG_DATABASE_CONFIG = {
     'port': '5432'
 }
 PG_DATABASE_URL = f"postgresql://{PG_DATABASE_CONFIG['user']}:{PG_DATABASE_CONFIG['password']}@{PG_DATABASE_CONFIG['host']}:{PG_DATABASE_CONFIG['port']}/{PG_DATABASE_CONFIG['database']}"
-pg_engine = create_engine(PG_DATABASE_URL)
+
+# ---- Connection Pool Config ----
+# Connections are checked with a ping before use and replaced after
+# pool_recycle seconds, so ones dropped by Postgres or a firewall are not handed out
+PG_POOL_CONFIG = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True
+}
+pg_engine = create_engine(PG_DATABASE_URL, **PG_POOL_CONFIG)
+
+# ---- Data Access Config ----
+# Bulk reads (the snapshot load, change feed, SQL store and stock ledger) go
+# to replica_url when it is set; edits, and the detail lookups that must
+# show them straight away, stay on the primary. The list, search and detail
+# APIs read through `store`: 'memory' (the snapshot), 'sql' (indexed queries
+# on the replica) or 'hybrid', which answers from the snapshot unless it is
+# still loading, holds more than max_snapshot_rows points or has gone
+# max_snapshot_age_seconds without a load or change-feed poll. Workers
+# following a shared snapshot count that age from the generation they mapped
+DATA_ACCESS_CONFIG = {
+    'replica_url': None,
+    'store': 'hybrid',
+    'max_snapshot_age_seconds': None,
+    'max_snapshot_rows': None
+}
+pg_read_engine = pg_engine
+if DATA_ACCESS_CONFIG['replica_url']:
+    pg_read_engine = create_engine(DATA_ACCESS_CONFIG['replica_url'], **PG_POOL_CONFIG)
+
+# ---- Search Config ----
+# Columns covered by /api/search_mls, in ranking order
+SEARCH_FIELDS = ['mls_point_code', 'mls_point_name']
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 500
+
+# ---- Change Feed Config ----
+# Poll mls_points for rows whose watermark column moved; 0 disables the refresher.
+# Each poll re-reads overlap_seconds behind the watermark, so a transaction that
+# commits that long after its rows were stamped is still picked up
+REFRESH_CONFIG = {
+    'interval_seconds': 30,
+    'watermark_column': 'updated_at',
+    'overlap_seconds': 60
+}
+
+# ---- Map Config ----
+# Columns the map endpoints return per point, and the cap on a viewport query;
+# /api/mls_points/clusters aggregates the rest (see mls_geo.ClusterIndex)
+MAP_POINT_COLUMNS = [
+    'mls_point_code',
+    'mls_point_name',
+    'district_name',
+    'mandal_name',
+    'mls_point_latitude',
+    'mls_point_longitude',
+    'mls_point_incharge_name',
+    'storage_capacity_in_mts',
+    'phone_number'
+]
+MAP_BBOX_MAX_POINTS = 5000
+MAP_NEAREST_MAX_K = 100
+
+# ---- Filtered Data Config ----
+# Default projection for /get_filtered_data and the columns a client may ask for
+FILTERED_DATA_COLUMNS = [
+    'mls_point_code',
+    'mls_point_name',
+    'mandal_name',
+    'district_name',
+    'mls_point_incharge_name',
+    'storage_capacity_mts',
+    'phone_number'
+]
+FILTERED_DATA_ALLOWED_COLUMNS = FILTERED_DATA_COLUMNS + [
+    'district_code',
+    'mandal_code',
+    'mls_point_latitude',
+    'mls_point_longitude',
+    'deo_name',
+    'deo_phone_number',
+    'godown_area_sqft',
+    'mls_point_ownership'
+]
+FILTERED_DATA_DEFAULT_LIMIT = 100
+FILTERED_DATA_MAX_LIMIT = 1000
+FILTERED_DATA_STREAM_CHUNK = 500
+
+# ---- HTTP Cache Config ----
+# Read APIs carry an ETag/Last-Modified tied to the snapshot's data (the same
+# in every worker holding the same rows) and answer revalidations with 304;
+# JSON bodies above min_size are compressed
+HTTP_CACHE_CONFIG = {
+    'max_age': 0,
+    'compress_min_size': 1024
+}
+
+# ---- Metrics Config ----
+# Route latency, store query, PDF phase and load timings plus snapshot size
+# gauges, served in the Prometheus text format at /metrics. Each worker
+# process keeps and serves its own figures
+METRICS_CONFIG = {
+    'enabled': True
+}
+
+# ---- PDF Cache Config ----
+# Generated reports are kept per MLS code and reused while the fields they
+# show are unchanged; set directory to also keep them on disk across restarts
+PDF_CACHE_CONFIG = {
+    'max_bytes': 64 * 1024 * 1024,
+    'max_entry_bytes': 1024 * 1024,
+    'directory': None
+}
+
+# ---- PDF Streaming Config ----
+# Reports are rendered into a temp file that stays in memory up to
+# spool_max_bytes and moves to disk beyond that, then sent in chunks
+PDF_STREAM_CONFIG = {
+    'spool_max_bytes': 1024 * 1024
+}
+
+# ---- Bulk PDF Export Config ----
+# Reports are rendered on a pool of worker processes (None = one per CPU);
+# at most max_in_flight are queued or buffered at a time, and points are
+# read from the snapshot and Postgres batch_size at a time
+PDF_EXPORT_CONFIG = {
+    'processes': None,
+    'max_in_flight': 32,
+    'batch_size': 500,
+    'progress_every': 100
+}
+
+# ---- PDF Job Config ----
+# /api/pdf_jobs renders reports in the background on the export pool; past
+# max_pending waiting or running jobs, submissions get a 429. Finished
+# reports are kept for download up to max_results / max_result_bytes,
+# dropping the oldest first
+PDF_JOB_CONFIG = {
+    'max_pending': 50,
+    'result_ttl_seconds': 600,
+    'max_results': 500,
+    'max_result_bytes': 256 * 1024 * 1024,
+    'max_wait_seconds': 30
+}
+
+# ---- Media Config ----
+# Photos and location images for the PDF, as <media_dir>/<mls_point_code>/<name>.jpg
+# (see mls_media.IMAGE_NAMES); None leaves the placeholders. Resized copies
+# are kept in thumbnail_dir
+MEDIA_CONFIG = {
+    'media_dir': None,
+    'thumbnail_dir': '/tmp/mls_thumbnails',
+    'dpi': 150,
+    'quality': 80
+}
+
+# ---- Stock Ledger Config ----
+# Monthly stock movement summaries (sql/mls_stock_ledger.sql) are computed
+# for all points at once and cached per month; the current month's is
+# recomputed after current_month_ttl_seconds. After a failed query, reports
+# go without stock figures until a backoff from retry_initial_seconds (doubling
+# up to retry_max_seconds) runs out. Every check_interval_seconds, movements
+# recorded since the last check (re-reading overlap_seconds) drop the cached
+# months from the earliest one's date on
+STOCK_CONFIG = {
+    'current_month_ttl_seconds': 300,
+    'retry_initial_seconds': 5,
+    'retry_max_seconds': 300,
+    'check_interval_seconds': 60,
+    'overlap_seconds': 60
+}
+
+# ---- Bulk Update Config ----
+# /api/mls_points/bulk_update and /api/mls_points/import_csv apply at most
+# max_rows points' edits per request, all in one transaction
+BULK_UPDATE_CONFIG = {
+    'max_rows': 10000
+}
+
+# ---- Loader Config ----
+# Compact mode keeps names as categoricals, numbers as floats and Yes/No
+# flags as booleans, and leaves DETAIL_COLUMNS in Postgres until a detail
+# or PDF view asks for one point. With copy, the table is read with COPY
+# and parsed by Arrow; otherwise (or if COPY fails) rows are streamed from
+# a server-side cursor chunk_size at a time. Either way chunks are compacted
+# as they arrive
+LOADER_CONFIG = {
+    'compact': True,
+    'copy': True,
+    'chunk_size': 20000
+}
+
+# ---- Startup Config ----
+# In background mode the app imports immediately and loads mls_points on a
+# thread, retrying with backoff; routes answer 503 until the first load lands.
+# CLI commands give up after cli_wait_seconds without a successful load
+STARTUP_CONFIG = {
+    'background': True,
+    'retry_initial_seconds': 1,
+    'retry_max_seconds': 60,
+    'cli_wait_seconds': 300
+}
+
+# ---- Shared Snapshot Config ----
+# Under several gunicorn workers, one loader publishes mls_points as a
+# memory-mapped Arrow file and every worker maps it instead of holding its own copy
+SHARED_SNAPSHOT_CONFIG = {
+    'enabled': False,
+    'directory': '/tmp/mls_snapshot',
+    'poll_seconds': 5
+}
+
+pdf_cache = PdfCache(max_bytes=PDF_CACHE_CONFIG['max_bytes'],
+                     max_entry_bytes=PDF_CACHE_CONFIG['max_entry_bytes'],
+                     directory=PDF_CACHE_CONFIG['directory'])
+point_writer = MlsPointWriter(pg_engine, watermark_column=REFRESH_CONFIG['watermark_column'])
+stock_ledger = StockLedger(pg_read_engine, current_month_ttl_seconds=STOCK_CONFIG['current_month_ttl_seconds'],
+                           retry_initial_seconds=STOCK_CONFIG['retry_initial_seconds'],
+                           retry_max_seconds=STOCK_CONFIG['retry_max_seconds'],
+                           check_interval_seconds=STOCK_CONFIG['check_interval_seconds'],
+                           overlap_seconds=STOCK_CONFIG['overlap_seconds'])
+
+media_library = None
+if MEDIA_CONFIG['media_dir']:
+    media_library = MediaLibrary(MEDIA_CONFIG['media_dir'], MEDIA_CONFIG['thumbnail_dir'],
+                                 dpi=MEDIA_CONFIG['dpi'], quality=MEDIA_CONFIG['quality'])
+pdf_jobs = PdfJobQueue(lambda: get_export_pool(PDF_EXPORT_CONFIG['processes']),
+                       max_pending=PDF_JOB_CONFIG['max_pending'],
+                       result_ttl_seconds=PDF_JOB_CONFIG['result_ttl_seconds'],
+                       max_results=PDF_JOB_CONFIG['max_results'],
+                       max_result_bytes=PDF_JOB_CONFIG['max_result_bytes'],
+                       cache=pdf_cache,
+                       media=media_library)
 
 # ---- Login Credentials ----
 ADMIN_CREDENTIALS = {
@@ -49,18 +317,431 @@ def login_required(f):
 
 
 # ---- Load Data ----
+# Normalised column name -> column name as it appears in Postgres
+db_columns = {}
+
+
+def fetch_pg_data():
+    """Read the whole mls_points table; raises if Postgres is unavailable
+
+    In compact mode the DETAIL_COLUMNS are left out of the projection.
+    """
+    global db_columns
+    with pg_read_engine.connect() as conn:
+        names = list(conn.execute(text("SELECT * FROM mls_points LIMIT 0")).keys())
+    db_columns = {normalise_column_name(name): name for name in names}
+
+    query = f"SELECT {', '.join(snapshot_columns())} FROM mls_points"
+
+    with DB_LOAD_SECONDS.time('load'):
+        if LOADER_CONFIG['copy'] and supports_copy(pg_read_engine):
+            try:
+                return copy_frame(pg_read_engine, query, compact=LOADER_CONFIG['compact'])
+            except Exception as e:
+                logger.warning("COPY load of mls_points failed, reading through a cursor instead: %s", e)
+        return stream_frame(pg_read_engine, query, chunk_size=LOADER_CONFIG['chunk_size'],
+                            compact=LOADER_CONFIG['compact'])
+
+
+def snapshot_columns():
+    """Quoted names of the mls_points columns the snapshot holds; the change feed reads the same ones"""
+    quote = pg_read_engine.dialect.identifier_preparer.quote
+    return [quote(name) for key, name in db_columns.items()
+            if not (LOADER_CONFIG['compact'] and key in DETAIL_COLUMNS)]
+
+
+def fetch_detail_columns(mls_code):
+    """Read the DETAIL_COLUMNS for one point straight from Postgres"""
+    detail_names = {key: name for key, name in db_columns.items() if key in DETAIL_COLUMNS}
+    if not detail_names:
+        return {}
+
+    quote = pg_engine.dialect.identifier_preparer.quote
+    projection = ', '.join(quote(name) for name in detail_names.values())
+    code_column = quote(db_columns.get('mls_point_code', 'mls_point_code'))
+    query = text(f"SELECT {projection} FROM mls_points WHERE {code_column} = :code")
+    with pg_engine.connect() as conn:
+        row = conn.execute(query, {'code': mls_code}).mappings().first()
+    if row is None:
+        return {}
+    return {normalise_column_name(name): value for name, value in row.items()}
+
+
+def fetch_detail_rows(codes):
+    """Read the DETAIL_COLUMNS for many points in one query; returns {str(code): {column: value}}"""
+    detail_names = {key: name for key, name in db_columns.items() if key in DETAIL_COLUMNS}
+    if not detail_names or not codes:
+        return {}
+
+    quote = pg_engine.dialect.identifier_preparer.quote
+    code_name = db_columns.get('mls_point_code', 'mls_point_code')
+    projection = ', '.join(quote(name) for name in [code_name, *detail_names.values()])
+    query = text(f"SELECT {projection} FROM mls_points WHERE {quote(code_name)} IN :codes") \
+        .bindparams(bindparam('codes', expanding=True))
+    with pg_engine.connect() as conn:
+        rows = conn.execute(query, {'codes': list(codes)}).mappings().all()
+    return {str(row[code_name]): {normalise_column_name(name): row[name] for name in detail_names.values()}
+            for row in rows}
+
+
 def load_pg_data():
     try:
-        query = "SELECT * FROM mls_points"
-        df = pd.read_sql_query(query, pg_engine)
-        df.columns = df.columns.str.lower().str.replace(' ', '_').str.replace('.', '')
-        return df
+        return fetch_pg_data()
     except Exception as e:
-        logger.error(f"Error loading data from Postgres: {e}")
+        logger.error("Error loading data from Postgres: %s", e)
         return pd.DataFrame()
 
 
-df_pg = load_pg_data()
+def get_point_details(snap, mls_code):
+    """Return one point as a plain dict, with detail-only columns filled in"""
+    return snapshot_details(snap, mls_code, fetch_detail_columns if LOADER_CONFIG['compact'] else None)
+
+
+def get_stock_summary():
+    """Return the current month's stock summary, or None if the ledger can't be read"""
+    try:
+        return stock_ledger.summary()
+    except StockLedgerUnavailable:
+        # Logged by the ledger when the query failed; retried after a backoff
+        return None
+    except Exception as e:
+        logger.error("Error loading stock ledger summary: %s", e)
+        return None
+
+
+def get_report_data(snap, mls_code):
+    """Return everything a point's PDF shows: its details plus its stock movement figures"""
+    mls_data = get_point_details(snap, mls_code)
+    if mls_data is None:
+        return None
+
+    summary = get_stock_summary()
+    if summary is not None:
+        mls_data.update(summary.report_fields(mls_code))
+    return mls_data
+
+
+def iter_point_details(snap, point_labels, batch_size=500):
+    """Yield get_point_details()-style dicts for many points, one snapshot slice and query per batch"""
+    for start in range(0, len(point_labels), batch_size):
+        batch_labels = point_labels[start:start + batch_size]
+        with snap.lock:
+            records = [decode_record(record) for record in frame_records(snap.df.loc[batch_labels])]
+
+        if LOADER_CONFIG['compact']:
+            try:
+                details = fetch_detail_rows([record['mls_point_code'] for record in records])
+            except Exception as e:
+                logger.error("Error fetching detail columns for export batch: %s", e)
+                details = {}
+            for record in records:
+                record.update(details.get(str(record['mls_point_code']), {}))
+
+        yield from records
+
+
+def iter_export_records(snap, point_labels, batch_size=500):
+    """Yield get_report_data()-style dicts for many points"""
+    summary = get_stock_summary()
+    for record in iter_point_details(snap, point_labels, batch_size=batch_size):
+        if summary is not None:
+            record.update(summary.report_fields(record['mls_point_code']))
+        yield record
+
+
+def apply_point_edits(snap, edits):
+    """Write {mls_code: {column: value}} edits for many points in one transaction
+
+    Each point's edit is cut down to the columns whose values differ from the
+    current record, and the snapshot is updated once the transaction commits.
+    """
+    labels = {str(code): snap.code_index.get(code) for code in edits}
+    unknown = [code for code, label in labels.items() if label is None]
+    labels = {code: label for code, label in labels.items() if label is not None}
+
+    records = iter_point_details(snap, list(labels.values()), batch_size=PDF_EXPORT_CONFIG['batch_size'])
+    changes = [(code, point_writer.changes(record, edits[code])) for code, record in zip(labels, records)]
+    changes = [(code, values) for code, values in changes if values]
+
+    try:
+        written = point_writer.update_points(changes)
+    except Exception:
+        # The table may have changed under the cached reflection
+        point_writer.reset()
+        raise
+    snap.update_rows({labels[code]: values for code, values in changes})
+    for code, _ in changes:
+        pdf_cache.invalidate(code)
+
+    logger.info("Bulk update: %s points written, %s unchanged, %s unknown",
+                written, len(labels) - written, len(unknown))
+    return {'updated': written, 'unchanged': len(labels) - written, 'unknown': unknown}
+
+
+def export_pdf_archive(snap, point_labels):
+    """Render every point's report on the export pool and yield them as a ZIP, chunk by chunk"""
+    progress = ExportProgress(len(point_labels))
+    logger.info("Starting bulk PDF export of %s points", progress.total)
+    records = iter_export_records(snap, point_labels, batch_size=PDF_EXPORT_CONFIG['batch_size'])
+    reports = render_reports(records, get_export_pool(PDF_EXPORT_CONFIG['processes']), progress,
+                             max_in_flight=PDF_EXPORT_CONFIG['max_in_flight'],
+                             cache=pdf_cache,
+                             media=media_library,
+                             progress_every=PDF_EXPORT_CONFIG['progress_every'])
+    yield from zip_stream(reports, progress)
+
+
+def pdf_file_response(pdf_file, mls_code, size):
+    """Send a report from a file object in chunks rather than as one response body"""
+    response = send_file(pdf_file, mimetype='application/pdf', as_attachment=True,
+                         download_name=f'MLS_Point_{mls_code}.pdf')
+    response.content_length = size
+    return response
+
+
+# None until the first load finishes; routes answer 503 until then
+snapshot = None
+
+
+def get_snapshot():
+    return snapshot
+
+
+memory_store = MemoryPointStore(get_snapshot,
+                                fetch_detail_columns=fetch_detail_columns if LOADER_CONFIG['compact'] else None)
+sql_store = SqlPointStore(pg_read_engine, detail_engine=pg_engine)
+point_store = {
+    'memory': memory_store,
+    'sql': sql_store,
+    'hybrid': HybridPointStore(memory_store, sql_store,
+                               max_snapshot_age_seconds=DATA_ACCESS_CONFIG['max_snapshot_age_seconds'],
+                               max_snapshot_rows=DATA_ACCESS_CONFIG['max_snapshot_rows'])
+}[DATA_ACCESS_CONFIG['store']]
+
+
+def install_snapshot(df, source=None):
+    """Index a freshly loaded frame and make it the live snapshot in one reference swap"""
+    global snapshot
+    snapshot = MlsSnapshot(df, search_fields=SEARCH_FIELDS, watermark_column=REFRESH_CONFIG['watermark_column'])
+    logger.info("Installed snapshot %s from %s", snapshot.etag,
+                os.path.basename(source) if source else 'Postgres')
+    return snapshot
+
+
+shared_store = None
+shared_path = None
+is_loader = True
+if SHARED_SNAPSHOT_CONFIG['enabled']:
+    from mls_shared import SharedSnapshotStore, SharedSnapshotFollower
+
+    shared_store = SharedSnapshotStore(SHARED_SNAPSHOT_CONFIG['directory'])
+
+
+def load_initial_snapshot():
+    """Load the first snapshot, privately or through the shared store; raises on failure"""
+    global is_loader, shared_path
+    if shared_store is None:
+        install_snapshot(fetch_pg_data())
+        return
+
+    # Retried on every attempt so a worker can take over from a dead loader
+    is_loader = shared_store.try_acquire_loader()
+    if is_loader:
+        shared_store.publish(fetch_pg_data())
+
+    shared_path = shared_store.wait_for_current()
+    if shared_path is None:
+        raise RuntimeError("No shared snapshot has been published yet")
+    install_snapshot(shared_store.open(shared_path), source=shared_path)
+
+
+def on_refresh_applied(snap):
+    # The shared loader republishes whatever the change feed applies; workers follow
+    if shared_store is not None:
+        with snap.lock:
+            shared_store.publish(snap.df)
+
+
+refresher = None
+
+
+def start_background_services():
+    """Start the generation follower and change feed once the first snapshot is in place"""
+    global refresher
+    if shared_store is not None:
+        SharedSnapshotFollower(shared_store, install_snapshot,
+                               poll_seconds=SHARED_SNAPSHOT_CONFIG['poll_seconds'],
+                               current_path=shared_path).start()
+
+    if REFRESH_CONFIG['interval_seconds'] > 0 and is_loader:
+        refresher = SnapshotRefresher(pg_read_engine, get_snapshot,
+                                      interval_seconds=REFRESH_CONFIG['interval_seconds'],
+                                      watermark_column=REFRESH_CONFIG['watermark_column'],
+                                      overlap_seconds=REFRESH_CONFIG['overlap_seconds'],
+                                      columns=snapshot_columns,
+                                      on_applied=on_refresh_applied)
+        refresher.start()
+
+
+def new_snapshot_loader():
+    return SnapshotLoader(load_initial_snapshot,
+                          on_loaded=start_background_services,
+                          initial_delay_seconds=STARTUP_CONFIG['retry_initial_seconds'],
+                          max_delay_seconds=STARTUP_CONFIG['retry_max_seconds'])
+
+
+snapshot_loader = new_snapshot_loader()
+# The process start_app last ran in
+started_pid = None
+
+
+def start_app():
+    """Set up logging and start the first snapshot load, once in every serving process
+
+    Threads don't survive a fork, so a process forked after this ran (a
+    worker under gunicorn --preload) would keep a dead log listener and
+    loader and answer 503 for ever. Every request calls this, so such a
+    worker starts its own on its first request.
+    """
+    global snapshot_loader, started_pid
+    if started_pid == os.getpid():
+        return
+    if started_pid is not None:
+        snapshot_loader = new_snapshot_loader()
+    started_pid = os.getpid()
+    configure_logging(level=LOGGING_CONFIG['level'], json_output=LOGGING_CONFIG['json'],
+                      use_queue=LOGGING_CONFIG['queue'], debug_sample_rates=LOGGING_CONFIG['debug_sample_rates'],
+                      debug_sample_rate=LOGGING_CONFIG['debug_sample_rate'])
+    if STARTUP_CONFIG['background']:
+        snapshot_loader.start()
+    else:
+        snapshot_loader.run()
+
+
+@app.before_request
+def start_forked_worker():
+    start_app()
+
+
+def wait_for_snapshot():
+    """Block a CLI command until the first snapshot load lands; raises ClickException if it doesn't in time"""
+    timeout = STARTUP_CONFIG['cli_wait_seconds']
+    if not snapshot_loader.ready.wait(timeout):
+        snapshot_loader.stop()
+        raise click.ClickException(f"MLS point data did not load within {timeout}s "
+                                   f"({snapshot_loader.attempts} attempt(s)): {snapshot_loader.last_error}")
+    return get_snapshot()
+
+
+# ---- Snapshot Required Decorator ----
+def loading_response():
+    message = 'MLS point data is still loading, please try again shortly'
+    if request.accept_mimetypes.best == 'text/html':
+        response = make_response(message, 503)
+    else:
+        response = make_response(jsonify({'success': False, 'error': message}), 503)
+    response.headers['Retry-After'] = '5'
+    return response
+
+
+def snapshot_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if get_snapshot() is None:
+            return loading_response()
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+# ---- Store Required Decorator ----
+def store_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not point_store.ready():
+            return loading_response()
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+# ---- Generation Cache Decorator ----
+def cached_by_generation(get_snap):
+    """ETag/Last-Modified revalidation against the snapshot get_snap returns; no caching when it is None"""
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            snap = get_snap()
+            if snap is None:
+                return f(*args, **kwargs)
+            etag, modified_at = snap.etag, snap.modified_at
+
+            if is_not_modified(request, etag, modified_at):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            response.last_modified = modified_at
+            response.cache_control.private = True
+            response.cache_control.max_age = HTTP_CACHE_CONFIG['max_age']
+            response.cache_control.must_revalidate = True
+            return response
+
+        return decorated_function
+
+    return decorator
+
+
+generation_cached = cached_by_generation(get_snapshot)
+# Store answers are versioned by the snapshot only while they come from it
+store_cached = cached_by_generation(lambda: point_store.snapshot())
+
+
+# ---- Metrics ----
+def snapshot_gauge(read):
+    """A gauge function reading the live snapshot; the gauge is left out until it has loaded"""
+    def function():
+        snap = get_snapshot()
+        return read(snap) if snap is not None else None
+
+    return function
+
+
+if METRICS_CONFIG['enabled']:
+    # Registered before compress_json so its after_request runs last and the timing includes compression
+    track_requests(app)
+    SNAPSHOT_ROWS.set_function(snapshot_gauge(lambda snap: len(snap.df)))
+    SNAPSHOT_MEMORY_BYTES.set_function(snapshot_gauge(lambda snap: snap.memory_bytes()))
+    SNAPSHOT_SYNC_AGE_SECONDS.set_function(snapshot_gauge(lambda snap: round(snap.synced_age, 3)))
+
+
+@app.after_request
+def compress_json(response):
+    return compress_response(response, request.accept_encodings,
+                             min_size=HTTP_CACHE_CONFIG['compress_min_size'])
+
+
+# ---- Health Check ----
+@app.route('/health')
+def health():
+    snap = get_snapshot()
+    status = {
+        'status': 'ready' if snap is not None else 'loading',
+        'rows': len(snap.df) if snap is not None else 0,
+        'load_attempts': snapshot_loader.attempts
+    }
+    return jsonify(status), 200 if snap is not None else 503
+
+
+@app.route('/metrics')
+def metrics():
+    if not METRICS_CONFIG['enabled']:
+        return 'Metrics are disabled', 404
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
 
 
 # ---- Login Routes ----
@@ -80,14 +761,14 @@ def login():
             session.permanent = True  # Make the session permanent
             session['username'] = username
             session['login_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            logger.info(f"User '{username}' logged in successfully")
+            logger.info("User '%s' logged in successfully", username)
             flash('Login successful! Welcome to MLS Point Locator System.', 'success')
 
             # Redirect to the originally requested page or default to index
             next_page = request.args.get('next')
             return redirect(next_page or url_for('index'))
         else:
-            logger.warning(f"Failed login attempt for username: '{username}'")
+            logger.warning("Failed login attempt for username: '%s'", username)
             flash('Invalid username or password. Please try again.', 'danger')
 
     current_time = "2025-08-06 11:16:11"  # Use the provided timestamp
@@ -98,7 +779,7 @@ def login():
 def logout():
     username = session.pop('username', None)
     if username:
-        logger.info(f"User '{username}' logged out")
+        logger.info("User '%s' logged out", username)
         flash('You have been logged out successfully.', 'success')
     return redirect(url_for('login'))
 
@@ -114,9 +795,10 @@ def index():
 
 @app.route('/dashboard')
 @login_required
+@store_required
 def dashboard():
     try:
-        districts = sorted(df_pg['district_name'].dropna().unique())
+        districts = point_store.districts()
         return render_template(
             'index1.html',
             districts=districts,
@@ -124,109 +806,219 @@ def dashboard():
             current_user=session.get('username', 'JPKrishna28')
         )
     except Exception as e:
-        logger.error(f"Dashboard error: {e}")
+        logger.error("Dashboard error: %s", e)
         return str(e), 500
 
 
 @app.route('/get_filtered_data', methods=['POST'])
 @login_required
+@store_required
 def get_filtered_data():
     try:
         selected_district = request.form.get('district_name', 'All')
         selected_mandal = request.form.get('mandal_name', 'All')
+        response_format = request.form.get('format', 'records')
+        stream = response_format == 'ndjson'
+
+        # Page window; a stream with no limit runs to the end of the matches
+        offset = max(request.form.get('offset', 0, type=int), 0)
+        default_limit = None if stream else FILTERED_DATA_DEFAULT_LIMIT
+        limit = request.form.get('limit', default_limit, type=int)
+        if limit is not None:
+            limit = max(0, min(limit, FILTERED_DATA_MAX_LIMIT))
+
+        # Column projection, restricted to the columns the table may expose
+        requested_columns = request.form.get('columns')
+        if requested_columns:
+            display_columns = [col.strip() for col in requested_columns.split(',')
+                               if col.strip() in FILTERED_DATA_ALLOWED_COLUMNS]
+            if not display_columns:
+                return jsonify({'success': False, 'error': 'No valid columns requested'}), 400
+        else:
+            display_columns = FILTERED_DATA_COLUMNS
 
-        filtered_df = df_pg.copy()
-        if selected_district != "All":
-            filtered_df = filtered_df[filtered_df['district_name'] == selected_district]
-        if selected_mandal != "All":
-            filtered_df = filtered_df[filtered_df['mandal_name'] == selected_mandal]
+        total, total_capacity = point_store.summary(selected_district, selected_mandal)
+        end = total if limit is None else min(offset + limit, total)
 
-        display_columns = [
-            "mls_point_code",
-            "mls_point_name",
-            "mandal_name",
-            "district_name",
-            "mls_point_incharge_name",
-            "storage_capacity_mts",
-            "phone_number",
-        ]
+        if stream:
+            chunks = point_store.iter_page(selected_district, selected_mandal, display_columns,
+                                           offset=offset, limit=limit, chunk_size=FILTERED_DATA_STREAM_CHUNK)
+
+            def generate():
+                for chunk in chunks:
+                    yield ndjson_lines(frame_records(chunk))
+
+            response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+            response.headers['X-Total-Count'] = str(total)
+            return response
 
-        records = filtered_df[display_columns].to_dict('records')
-        return jsonify({'success': True, 'data': records})
+        page = point_store.page(selected_district, selected_mandal, display_columns, offset=offset, limit=limit)
+        records = frame_payload(page, columnar=response_format == 'columnar')
+
+        return json_response({
+            'success': True,
+            'data': records,
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'next_offset': end if end < total else None,
+            'total_capacity': total_capacity
+        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
 
 @app.route('/api/districts')
 @login_required
+@store_required
+@store_cached
 def get_districts():
     try:
-        districts = sorted(df_pg['district_name'].dropna().unique())
-        return jsonify(districts)
+        districts = point_store.districts()
+        return json_response(districts)
     except Exception as e:
-        logger.error(f"Error getting districts: {e}")
+        logger.error("Error getting districts: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/mandals/<district>')
 @login_required
+@store_required
+@store_cached
 def get_mandals(district):
     try:
-        mandals = sorted(df_pg[df_pg['district_name'] == district]['mandal_name'].dropna().unique())
-        return jsonify(mandals)
+        mandals = point_store.mandals(district)
+        return json_response(mandals)
     except Exception as e:
-        logger.error(f"Error getting mandals: {e}")
+        logger.error("Error getting mandals: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/mls_points/bbox')
+@login_required
+@snapshot_required
+@generation_cached
+def get_mls_points_in_bbox():
+    try:
+        snap = get_snapshot()
+        try:
+            south, west, north, east = (float(request.args[name]) for name in ('south', 'west', 'north', 'east'))
+        except (KeyError, ValueError):
+            return jsonify({'success': False, 'error': 'south, west, north and east are required numbers'}), 400
+        if south > north:
+            return jsonify({'success': False, 'error': 'south must not be greater than north'}), 400
+        limit = max(0, min(request.args.get('limit', MAP_BBOX_MAX_POINTS, type=int), MAP_BBOX_MAX_POINTS))
+
+        # One extra point tells us whether the viewport had more than the limit
+        point_labels = snap.spatial_index.bbox(south, west, north, east, limit=limit + 1)
+        truncated = len(point_labels) > limit
+        point_labels = point_labels[:limit]
+
+        with snap.lock:
+            available_columns = [col for col in MAP_POINT_COLUMNS if col in snap.df.columns]
+            points = frame_payload(snap.df.loc[point_labels, available_columns],
+                                   columnar=request.args.get('format') == 'columnar')
+
+        return json_response({'success': True, 'points': points, 'count': len(point_labels), 'truncated': truncated})
+    except Exception as e:
+        logger.error("Error getting MLS points in bounding box: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/mls_points/nearest')
+@login_required
+@snapshot_required
+@generation_cached
+def get_nearest_mls_points():
+    try:
+        snap = get_snapshot()
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        if lat is None or lng is None or abs(lat) > 90 or abs(lng) > 180:
+            return jsonify({'success': False, 'error': 'lat and lng are required coordinates'}), 400
+        k = max(1, min(request.args.get('k', 10, type=int), MAP_NEAREST_MAX_K))
+        max_km = request.args.get('max_km', type=float)
+
+        point_labels, distances = snap.spatial_index.nearest(lat, lng, k=k, max_km=max_km)
+
+        with snap.lock:
+            available_columns = [col for col in MAP_POINT_COLUMNS if col in snap.df.columns]
+            points = frame_records(snap.df.loc[point_labels, available_columns])
+        for point, distance in zip(points, distances):
+            point['distance_km'] = round(distance, 3)
+
+        return json_response({'success': True, 'points': points})
+    except Exception as e:
+        logger.error("Error getting nearest MLS points: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/mls_points/clusters')
+@login_required
+@snapshot_required
+@generation_cached
+def get_mls_point_clusters():
+    try:
+        snap = get_snapshot()
+        zoom = request.args.get('zoom', type=int)
+        if zoom is None:
+            return jsonify({'success': False, 'error': 'zoom is a required integer'}), 400
+        box = [request.args.get(name, type=float) for name in ('south', 'west', 'north', 'east')]
+        if any(value is None for value in box):
+            box = [-90, -180, 90, 180]
+        if box[0] > box[2]:
+            return jsonify({'success': False, 'error': 'south must not be greater than north'}), 400
+
+        index = snap.cluster_index(request.args.get('district'), request.args.get('mandal'))
+        clusters = index.clusters(zoom, *box)
+
+        # Lone points come back as map points, with the fields their popup shows
+        point_labels = [cluster.pop('label') for cluster in clusters if 'label' in cluster]
+        with snap.lock:
+            available_columns = [col for col in MAP_POINT_COLUMNS if col in snap.df.columns]
+            points = iter(frame_records(snap.df.loc[point_labels, available_columns]))
+        for cluster in clusters:
+            if cluster['count'] == 1:
+                cluster['point'] = next(points)
+
+        return json_response({'success': True, 'zoom': min(max(zoom, 0), index.max_zoom),
+                              'clusters': clusters, 'total': len(index), 'bounds': index.bounds()})
+    except Exception as e:
+        logger.error("Error getting MLS point clusters: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/mls_points/<district>/<mandal>')
 @login_required
+@store_required
+@store_cached
 def get_mls_points(district, mandal):
     try:
-        logger.info(f"Fetching MLS points for district: {district}, mandal: {mandal}")
+        logger.debug("Fetching MLS points for district: %s, mandal: %s", district, mandal)
 
-        # Log the dataframe columns
-        logger.info(f"Available columns: {df_pg.columns.tolist()}")
+        # Select required columns
+        columns_to_include = MAP_POINT_COLUMNS
 
-        # Filter the dataframe
-        filtered_df = df_pg[
-            (df_pg['district_name'] == district) &
-            (df_pg['mandal_name'] == mandal)
-            ]
+        # Take the rows for this district/mandal
+        point_rows = point_store.points(district, mandal, columns_to_include)
 
         # Log the number of points found
-        logger.info(f"Found {len(filtered_df)} points for {district}/{mandal}")
+        logger.debug("Found %s points for %s/%s", len(point_rows), district, mandal)
 
-        if filtered_df.empty:
+        if point_rows.empty:
             return jsonify([])
 
-        # Select required columns
-        columns_to_include = [
-            'mls_point_code',
-            'mls_point_name',
-            'district_name',
-            'mandal_name',
-            'mls_point_latitude',
-            'mls_point_longitude',
-            'mls_point_incharge_name',
-            'storage_capacity_in_mts',
-            'phone_number'
-        ]
-
-        # Get available columns
-        available_columns = [col for col in columns_to_include if col in filtered_df.columns]
-
         # Convert to records
-        points = filtered_df[available_columns].to_dict('records')
+        points = frame_payload(point_rows, columnar=request.args.get('format') == 'columnar')
 
         # Log sample data
-        if points:
-            logger.info(f"Sample point data: {points[0]}")
+        if isinstance(points, list) and points:
+            logger.debug("Sample point data: %s", points[0])
 
-        return jsonify(points)
+        return json_response(points)
 
     except Exception as e:
-        logger.error(f"Error getting MLS points: {str(e)}")
+        logger.error("Error getting MLS points: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -241,14 +1033,13 @@ def get_user():
 
 @app.route('/api/search_mls/<search_term>')
 @login_required
+@store_required
+@store_cached
 def search_mls(search_term):
     try:
-        logger.info(f"Searching for MLS point: {search_term}")
-        # Convert search_term to string to ensure contains() works properly
-        filtered_df = df_pg[df_pg['mls_point_code'].astype(str).str.contains(search_term, case=False)]
+        logger.debug("Searching for MLS point: %s", search_term)
+        limit = min(request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int), SEARCH_MAX_LIMIT)
 
-        if filtered_df.empty:
-            return jsonify([])
 
         # Select all relevant columns to ensure data is available for the view details
         display_columns = [
@@ -267,33 +1058,33 @@ def search_mls(search_term):
             'storage_capacity_mts'  # Changed from storage_capacity_in_mts to match column names
         ]
 
-        # Get only the columns that exist in the dataframe
-        available_columns = [col for col in display_columns if col in filtered_df.columns]
+        # Rows come back ranked: exact code, code prefix, code substring, then name matches
+        matches = point_store.search(search_term, display_columns, limit=max(limit, 1))
 
-        points = filtered_df[available_columns].to_dict('records')
-        logger.info(f"Found {len(points)} points matching '{search_term}'")
+        if matches.empty:
+            return jsonify([])
+
+        points = frame_payload(matches, columnar=request.args.get('format') == 'columnar')
+        logger.debug("Found %s points matching '%s'", len(matches), search_term)
 
-        return jsonify(points)
+        return json_response(points)
     except Exception as e:
-        logger.error(f"Search error: {str(e)}")
+        logger.error("Search error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/view_details/<mls_code>')
 @login_required
+@store_required
 def view_details(mls_code):
     try:
-        logger.info(f"Viewing details for MLS code: {mls_code}")
-        # Filter by mls_point_code as string to ensure correct matching
-        record_df = df_pg[df_pg['mls_point_code'].astype(str) == str(mls_code)]
+        logger.debug("Viewing details for MLS code: %s", mls_code)
+        details = point_store.point_details(mls_code)
 
-        if record_df.empty:
-            logger.error(f"No record found for MLS code: {mls_code}")
+        if details is None:
+            logger.error("No record found for MLS code: %s", mls_code)
             return f"Error: No record found for MLS code {mls_code}", 404
 
-        # Convert the first record to a dictionary
-        details = record_df.iloc[0].to_dict()
-
         # Make sure all necessary keys exist (even if empty)
         required_keys = [
             'mls_point_code', 'mls_point_name', 'district_name', 'district_code',
@@ -310,76 +1101,219 @@ def view_details(mls_code):
             if key not in details:
                 details[key] = ""
 
-        logger.info(f"Details fetched successfully for MLS code: {mls_code}")
+        logger.debug("Details fetched successfully for MLS code: %s", mls_code)
         return render_template('details.html',
                                info=details,
                                current_user=session.get('username', 'JPKrishna28'),
                                current_time="2025-08-06 11:16:11")
     except Exception as e:
-        logger.error(f"Error in view_details: {str(e)}")
+        logger.error("Error in view_details: %s", e)
         return f"Error: {str(e)}", 500
 
 
 @app.route('/api/download_pdf/<mls_code>')
 @login_required
+@snapshot_required
 def download_pdf(mls_code):
     try:
-        logger.info(f"Generating PDF for MLS code: {mls_code}")
+        snap = get_snapshot()
+        logger.info("Generating PDF for MLS code: %s", mls_code)
 
-        # Get the MLS data from database
-        record_df = df_pg[df_pg['mls_point_code'].astype(str) == str(mls_code)]
+        # Get the MLS data from the in-memory snapshot and the stock summary
+        mls_data = get_report_data(snap, mls_code)
 
-        if record_df.empty:
-            logger.error(f"No record found for MLS code: {mls_code}")
+        if mls_data is None:
+            logger.error("No record found for MLS code: %s", mls_code)
             return f"Error: No record found for MLS code {mls_code}", 404
 
-        # Convert the first record to a dictionary
-        mls_data = record_df.iloc[0].to_dict()
-
-        # Add current date and time
-        mls_data['generated_date'] = "2025-08-06 11:16:11"
+        # Add current date and time; not part of the cache key
+        mls_data['generated_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         mls_data['generated_by'] = session.get('username', 'JPKrishna28')
 
-        # Log data to help debug
-        logger.info(f"Generating PDF with data keys: {list(mls_data.keys())}")
-
         try:
-            # Generate PDF
-            pdf_data = generate_mls_pdf(mls_data)
-
-            # Create response
-            response = make_response(pdf_data)
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = f'attachment; filename=MLS_Point_{mls_code}.pdf'
-
-            logger.info(f"PDF generated successfully for MLS code: {mls_code}")
+            # Reuse the last report for this point if none of its fields changed
+            digest = report_digest(mls_data, media_library)
+            pdf_data = pdf_cache.get(mls_code, digest)
+            if pdf_data is not None:
+                response = pdf_file_response(io.BytesIO(pdf_data), mls_code, len(pdf_data))
+            else:
+                logger.debug("Generating PDF with data keys: %s", list(mls_data.keys()))
+                # Render into a spooled file and send that, rather than copying the bytes into the response
+                pdf_file = tempfile.SpooledTemporaryFile(max_size=PDF_STREAM_CONFIG['spool_max_bytes'])
+                try:
+                    timings = {}
+                    generate_mls_pdf(mls_data, pdf_file, media_library, timings)
+                    for phase, seconds in timings.items():
+                        PDF_RENDER_SECONDS.observe(seconds, phase)
+                    size = pdf_file.tell()
+                    if size <= pdf_cache.max_entry_bytes:
+                        pdf_file.seek(0)
+                        pdf_cache.put(mls_code, digest, pdf_file.read())
+                    pdf_file.seek(0)
+                    response = pdf_file_response(pdf_file, mls_code, size)
+                except Exception:
+                    # The response closes the file once sent; until one is built, it is ours to close
+                    pdf_file.close()
+                    raise
+
+            logger.info("PDF ready for MLS code: %s", mls_code)
             return response
         except Exception as pdf_error:
-            logger.error(f"PDF generation error: {str(pdf_error)}")
+            logger.error("PDF generation error: %s", pdf_error)
             return f"Error generating PDF: {str(pdf_error)}", 500
 
     except Exception as e:
-        logger.error(f"Error in download_pdf route: {str(e)}")
+        logger.error("Error in download_pdf route: %s", e)
         return f"Error in download_pdf route: {str(e)}", 500
 
 
+@app.route('/api/stock_movement/<mls_code>')
+@login_required
+@snapshot_required
+def get_stock_movement(mls_code):
+    try:
+        snap = get_snapshot()
+        if snap.code_index.get(mls_code) is None:
+            return jsonify({'success': False, 'error': f"No record found for MLS code {mls_code}"}), 404
+
+        try:
+            summary = stock_ledger.summary(request.args.get('month'))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'month must be YYYY-MM'}), 400
+        except StockLedgerUnavailable as e:
+            return jsonify({'success': False, 'error': str(e)}), 503
+
+        return json_response({
+            'success': True,
+            'mls_code': mls_code,
+            'month': str(summary.month),
+            'months': [str(month) for month in reversed(summary.months)],
+            'commodities': summary.point_table(mls_code)
+        })
+    except Exception as e:
+        logger.error("Error in get_stock_movement route: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/pdf_jobs/<mls_code>', methods=['POST'])
+@login_required
+@snapshot_required
+def submit_pdf_job(mls_code):
+    try:
+        snap = get_snapshot()
+        mls_data = get_report_data(snap, mls_code)
+        if mls_data is None:
+            return jsonify({'success': False, 'error': f"No record found for MLS code {mls_code}"}), 404
+
+        try:
+            job = pdf_jobs.submit(mls_code, mls_data, digest=report_digest(mls_data, media_library))
+        except QueueFull as e:
+            logger.warning("Rejected PDF job for MLS code %s: %s", mls_code, e)
+            response = make_response(jsonify({'success': False, 'error': 'Too many PDF jobs pending, try again shortly'}), 429)
+            response.headers['Retry-After'] = '5'
+            return response
+
+        status = job.to_dict()
+        status.update({'success': True, 'status_url': url_for('pdf_job_status', job_id=job.id)})
+        return jsonify(status), 202
+    except Exception as e:
+        logger.error("Error in submit_pdf_job route: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/pdf_jobs/<job_id>')
+@login_required
+def pdf_job_status(job_id):
+    job = pdf_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired job'}), 404
+
+    # Long poll: ?wait=N holds the request until the job finishes or N seconds pass
+    wait = min(max(request.args.get('wait', 0, type=float), 0), PDF_JOB_CONFIG['max_wait_seconds'])
+    if wait:
+        job.finished.wait(wait)
+
+    status = job.to_dict()
+    status['success'] = True
+    if job.status == 'done':
+        status['download_url'] = url_for('download_pdf_job', job_id=job.id)
+    return jsonify(status)
+
+
+@app.route('/api/pdf_jobs/<job_id>/download')
+@login_required
+def download_pdf_job(job_id):
+    job = pdf_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired job'}), 404
+    if job.status != 'done':
+        return jsonify({'success': False, 'error': f"Job is {job.status}", 'status': job.status}), 409
+
+    return pdf_file_response(io.BytesIO(job.result), job.mls_code, len(job.result))
+
+
+@app.route('/api/pdf_jobs')
+@login_required
+def pdf_job_stats():
+    return jsonify(pdf_jobs.stats())
+
+
+@app.route('/api/export_pdfs')
+@login_required
+@snapshot_required
+def export_pdfs():
+    try:
+        snap = get_snapshot()
+        district = request.args.get('district', 'All')
+        mandal = request.args.get('mandal', 'All')
+
+        point_labels = snap.filter_labels(district, mandal)
+        if not point_labels:
+            return jsonify({'success': False, 'error': 'No MLS points match the filter'}), 404
+
+        filename = f"MLS_Points_{district}_{mandal}.zip".replace(' ', '_')
+        response = Response(stream_with_context(export_pdf_archive(snap, point_labels)),
+                            mimetype='application/zip')
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        response.headers['X-Total-Count'] = str(len(point_labels))
+        return response
+    except Exception as e:
+        logger.error("Error in export_pdfs route: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.cli.command('export-pdfs')
+@click.option('--district', default='All', help='District name, or All')
+@click.option('--mandal', default='All', help='Mandal name, or All')
+@click.option('--output', '-o', default='mls_points.zip', show_default=True, help='ZIP file to write')
+def export_pdfs_command(district, mandal, output):
+    """Write the MLS AT A GLANCE report of every matching point into a ZIP file"""
+    snap = wait_for_snapshot()
+    point_labels = snap.filter_labels(district, mandal)
+    if not point_labels:
+        raise click.ClickException('No MLS points match the filter')
+
+    with open(output, 'wb') as f:
+        for chunk in export_pdf_archive(snap, point_labels):
+            f.write(chunk)
+    click.echo(f"Wrote {output}")
+
+
 @app.route('/edit_details/<mls_code>')
 @login_required
+@snapshot_required
 def edit_details(mls_code):
     try:
-        logger.info(f"Editing details for MLS code: {mls_code}")
-        # Filter by mls_point_code as string to ensure correct matching
-        record_df = df_pg[df_pg['mls_point_code'].astype(str) == str(mls_code)]
+        snap = get_snapshot()
+        logger.info("Editing details for MLS code: %s", mls_code)
+        details = get_point_details(snap, mls_code)
 
-        if record_df.empty:
-            logger.error(f"No record found for MLS code: {mls_code}")
+        if details is None:
+            logger.error("No record found for MLS code: %s", mls_code)
             return f"Error: No record found for MLS code {mls_code}", 404
 
-        # Convert the first record to a dictionary
-        details = record_df.iloc[0].to_dict()
-
         # Debug log
-        logger.info(f"Retrieved columns for editing: {list(details.keys())}")
+        logger.debug("Retrieved columns for editing: %s", list(details.keys()))
 
         # Make sure all necessary keys exist (even if empty)
         required_keys = [
@@ -398,27 +1332,29 @@ def edit_details(mls_code):
             if key not in details:
                 details[key] = ""
 
-        logger.info(f"Details fetched for editing for MLS code: {mls_code}")
+        logger.info("Details fetched for editing for MLS code: %s", mls_code)
         return render_template('edit_details.html',
                                info=details,
                                current_time="2025-08-06 11:16:11",
                                current_user=session.get('username', 'JPKrishna28'))
     except Exception as e:
-        logger.error(f"Error in edit_details: {str(e)}")
+        logger.error("Error in edit_details: %s", e)
         return f"Error: {str(e)}", 500
 
 
 @app.route('/update_details/<mls_code>', methods=['POST'])
 @login_required
+@snapshot_required
 def update_details(mls_code):
     try:
-        logger.info(f"Updating details for MLS code: {mls_code}")
+        snap = get_snapshot()
+        logger.info("Updating details for MLS code: %s", mls_code)
 
         # Check if the MLS code exists
-        record_df = df_pg[df_pg['mls_point_code'].astype(str) == str(mls_code)]
+        record_idx = snap.code_index.get(mls_code)
 
-        if record_df.empty:
-            logger.error(f"No record found for MLS code: {mls_code}")
+        if record_idx is None:
+            logger.error("No record found for MLS code: %s", mls_code)
             flash(f"Error: No record found for MLS code {mls_code}", "error")
             return redirect(f'/edit_details/{mls_code}')
 
@@ -426,52 +1362,104 @@ def update_details(mls_code):
         form_data = request.form.to_dict()
 
         # Log what we're updating
-        logger.info(f"Received form data with keys: {list(form_data.keys())}")
+        logger.debug("Received form data with keys: %s", list(form_data.keys()))
 
         try:
-            # Method 2: Use SQLAlchemy ORM-style update
-            from sqlalchemy import Table, MetaData, Column
-            from sqlalchemy.sql import update
-
-            metadata = MetaData()
-            mls_table = Table('mls_points', metadata, autoload_with=pg_engine)
-
-            # Prepare update values
-            update_values = {}
-            for key, value in form_data.items():
-                if key in df_pg.columns:
-                    update_values[key] = value
-
-            # Create update statement
-            stmt = update(mls_table).where(
-                mls_table.c.mls_point_code == mls_code
-            ).values(**update_values)
-
-            # Execute the update
-            with pg_engine.begin() as conn:
-                conn.execute(stmt)
-
-            # Update the dataframe as well to keep it in sync
-            record_idx = record_df.index[0]
-            for key, value in form_data.items():
-                if key in df_pg.columns:
-                    df_pg.at[record_idx, key] = value
-
-            logger.info(f"Successfully updated database record for MLS code: {mls_code}")
+            # Only the fields the form actually changed are written
+            update_values = point_writer.changes(get_point_details(snap, mls_code), form_data)
+            if update_values:
+                point_writer.update_points([(mls_code, update_values)])
+
+                # Update the snapshot and its indexes as well to keep them in sync
+                snap.update_row(record_idx, update_values)
+                pdf_cache.invalidate(mls_code)
+
+            logger.info("Updated %s columns for MLS code: %s", len(update_values), mls_code)
             flash("MLS Point details updated successfully!", "success")
 
         except Exception as db_error:
-            logger.error(f"Database update error: {str(db_error)}")
+            # The table may have changed under the cached reflection
+            point_writer.reset()
+            logger.error("Database update error: %s", db_error)
             flash(f"Warning: Database reported an error but data may have been updated: {str(db_error)}", "warning")
 
         # Redirect to the view page
         return redirect(f'/view_details/{mls_code}')
 
     except Exception as e:
-        logger.error(f"Error in update_details: {str(e)}")
+        logger.error("Error in update_details: %s", e)
         flash(f"Error updating details: {str(e)}", "error")
         return redirect(f'/edit_details/{mls_code}')
 
 
+@app.route('/api/mls_points/bulk_update', methods=['POST'])
+@login_required
+@snapshot_required
+def bulk_update_points():
+    try:
+        snap = get_snapshot()
+        payload = request.get_json(silent=True)
+        rows = payload.get('updates') if isinstance(payload, dict) else payload
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            return jsonify({'success': False, 'error': 'Expected {"updates": [{"mls_point_code": ..., ...}]}'}), 400
+        if len(rows) > BULK_UPDATE_CONFIG['max_rows']:
+            return jsonify({'success': False,
+                            'error': f"At most {BULK_UPDATE_CONFIG['max_rows']} points per request"}), 413
+
+        edits = {}
+        for row in rows:
+            values = dict(row)
+            mls_code = values.pop('mls_point_code', None)
+            if mls_code is None or str(mls_code).strip() == '':
+                return jsonify({'success': False, 'error': 'Every update needs an mls_point_code'}), 400
+            edits.setdefault(str(mls_code).strip(), {}).update(values)
+
+        return jsonify({'success': True, **apply_point_edits(snap, edits)})
+    except Exception as e:
+        logger.error("Error in bulk update: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/mls_points/import_csv', methods=['POST'])
+@login_required
+@snapshot_required
+def import_points_csv():
+    try:
+        snap = get_snapshot()
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'success': False, 'error': 'Upload the CSV as the "file" field'}), 400
+        try:
+            edits = read_edits_csv(io.StringIO(upload.read().decode('utf-8-sig'), newline=''))
+        except (UnicodeDecodeError, ValueError, csv.Error) as e:
+            return jsonify({'success': False, 'error': f"Could not read the CSV file: {e}"}), 400
+        if len(edits) > BULK_UPDATE_CONFIG['max_rows']:
+            return jsonify({'success': False,
+                            'error': f"At most {BULK_UPDATE_CONFIG['max_rows']} points per import"}), 413
+
+        return jsonify({'success': True, **apply_point_edits(snap, edits)})
+    except Exception as e:
+        logger.error("Error importing CSV: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.cli.command('import-points')
+@click.argument('csv_file', type=click.Path(exists=True, dir_okay=False))
+def import_points_command(csv_file):
+    """Apply the point edits in a CSV file (mls_point_code plus the columns to change) in one transaction"""
+    snap = wait_for_snapshot()
+    with open(csv_file, newline='', encoding='utf-8-sig') as f:
+        edits = read_edits_csv(f)
+    result = apply_point_edits(snap, edits)
+    click.echo(f"{result['updated']} points updated, {result['unchanged']} unchanged, "
+               f"{len(result['unknown'])} unknown codes")
+
+
+# PDF export workers are spawned, and a spawned process re-imports the script
+# it was started from as __mp_main__ (with `python app.py`, this file). They
+# only render reports, so they skip the logging setup and the snapshot load
+if __name__ != '__mp_main__':
+    start_app()
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
@@ -32,14 +32,14 @@ def login():
             session['login_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
             # Log successful login
-            logger.info(f"User '{username}' logged in successfully")
+            logger.info("User '%s' logged in successfully", username)
             flash('Login successful! Welcome to MLS Point Locator.', 'success')
 
             # Redirect to the main page
             return redirect(url_for('index'))
         else:
             # Log failed login attempt
-            logger.warning(f"Failed login attempt for username: '{username}'")
+            logger.warning("Failed login attempt for username: '%s'", username)
             flash('Invalid username or password. Please try again.', 'danger')
 
     # For GET request or failed login, show the login form
@@ -52,7 +52,7 @@ def login():
 def logout():
     username = session.pop('username', None)
     if username:
-        logger.info(f"User '{username}' logged out")
+        logger.info("User '%s' logged out", username)
         flash('You have been logged out successfully.', 'success')
     return redirect(url_for('login'))
 
@@ -0,0 +1,60 @@
+"""Micro-benchmark: MLS code lookup by string scan vs. the code index.
+
+Run from the repository root:
+
+    python benchmarks/bench_code_index.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mls_index import CodeIndex  # noqa: E402
+
+ROW_COUNTS = [10_000, 100_000, 1_000_000]
+LOOKUPS = 200
+
+
+def make_frame(n_rows):
+    """Build a synthetic mls_points frame with integer codes like the real table"""
+    return pd.DataFrame({
+        'mls_point_code': np.arange(1_000_000, 1_000_000 + n_rows),
+        'mls_point_name': [f"MLS Point {i}" for i in range(n_rows)],
+        'district_name': np.random.choice(['Guntur', 'Krishna', 'Kurnool'], n_rows),
+    })
+
+
+def scan_lookup(df, mls_code):
+    record_df = df[df['mls_point_code'].astype(str) == str(mls_code)]
+    return None if record_df.empty else record_df.iloc[0]
+
+
+def index_lookup(df, index, mls_code):
+    label = index.get(mls_code)
+    return None if label is None else df.loc[label]
+
+
+def main():
+    print(f"{'rows':>10} {'scan (ms)':>12} {'index (ms)':>12} {'build (ms)':>12} {'speedup':>10}")
+    for n_rows in ROW_COUNTS:
+        df = make_frame(n_rows)
+        codes = [str(c) for c in np.random.choice(df['mls_point_code'], LOOKUPS)]
+
+        build_s = timeit.timeit(lambda: CodeIndex(df), number=1)
+        index = CodeIndex(df)
+
+        # The scan path is slow at 1M rows, so time fewer lookups there
+        scan_n = max(5, LOOKUPS * 10_000 // n_rows)
+        scan_s = timeit.timeit(lambda: [scan_lookup(df, c) for c in codes[:scan_n]], number=1) / scan_n
+        index_s = timeit.timeit(lambda: [index_lookup(df, index, c) for c in codes], number=1) / LOOKUPS
+
+        print(f"{n_rows:>10} {scan_s * 1e3:>12.3f} {index_s * 1e3:>12.4f} {build_s * 1e3:>12.1f} "
+              f"{scan_s / index_s:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
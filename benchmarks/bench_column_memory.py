@@ -0,0 +1,75 @@
+"""Per-row memory of the mls_points snapshot: SELECT * object columns vs. the compact loader.
+
+Run from the repository root:
+
+    python benchmarks/bench_column_memory.py
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mls_columns import DETAIL_COLUMNS, compact_frame  # noqa: E402
+
+ROW_COUNTS = [10_000, 100_000]
+
+
+def make_frame(n_rows, seed=0):
+    """Synthetic mls_points rows as read_sql_query returns them: every text column object-dtype"""
+    rng = np.random.default_rng(seed)
+    districts = [f"District {i}" for i in range(26)]
+    mandals = [f"Mandal {i}" for i in range(680)]
+    yes_no = np.array(['Yes', 'No'], dtype=object)
+
+    def text(prefix):
+        return np.array([f"{prefix} {i}" for i in range(n_rows)], dtype=object)
+
+    def digits(width):
+        return np.array([str(v).zfill(width) for v in rng.integers(0, 10 ** width, n_rows)], dtype=object)
+
+    df = pd.DataFrame({
+        'mls_point_code': np.arange(1_000_000, 1_000_000 + n_rows),
+        'mls_point_name': text('MLS Point'),
+        'district_name': np.array(districts, dtype=object)[rng.integers(0, 26, n_rows)],
+        'district_code': rng.integers(500, 526, n_rows).astype(str).astype(object),
+        'mandal_name': np.array(mandals, dtype=object)[rng.integers(0, 680, n_rows)],
+        'mandal_code': rng.integers(4000, 4680, n_rows).astype(str).astype(object),
+        'mls_point_address': np.array([f"Door {i}, Main Road, Near Bus Stand, Village {i % 997}, PIN 52{i % 10000:04d}"
+                                       for i in range(n_rows)], dtype=object),
+        'mls_point_latitude': rng.uniform(13, 19, n_rows).round(6).astype(str).astype(object),
+        'mls_point_longitude': rng.uniform(77, 84, n_rows).round(6).astype(str).astype(object),
+        'mls_point_incharge_cfms_id': digits(8),
+        'mls_point_incharge_name': text('Incharge'),
+        'designation': np.array(['AM', 'DM', 'Manager'], dtype=object)[rng.integers(0, 3, n_rows)],
+        'phone_number': digits(10),
+        'aadhaar_number': digits(12),
+        'deo_cfms_id': digits(8),
+        'deo_name': text('DEO'),
+        'deo_aadhaar_number': digits(12),
+        'deo_phone_number': digits(10),
+        'storage_capacity_mts': rng.integers(100, 5000, n_rows).astype(str).astype(object),
+        'godown_area_sqft': rng.integers(1000, 50000, n_rows).astype(str).astype(object),
+        'mls_point_ownership': np.array(['Owned', 'Rented'], dtype=object)[rng.integers(0, 2, n_rows)],
+        'weighbridge_available': yes_no[rng.integers(0, 2, n_rows)],
+        'cc_cameras_installed': yes_no[rng.integers(0, 2, n_rows)],
+        'gps_installed_on_all_vehicles': yes_no[rng.integers(0, 2, n_rows)],
+    })
+    return df.astype({column: object for column in df.columns if column != 'mls_point_code'})
+
+
+def main():
+    print(f"{'rows':>10} {'select * (B/row)':>18} {'compact (B/row)':>17} {'reduction':>10}")
+    for n_rows in ROW_COUNTS:
+        full = make_frame(n_rows)
+        compact = compact_frame(full.drop(columns=[c for c in DETAIL_COLUMNS if c in full.columns]))
+
+        before = full.memory_usage(deep=True).sum() / n_rows
+        after = compact.memory_usage(deep=True).sum() / n_rows
+        print(f"{n_rows:>10} {before:>18.0f} {after:>17.0f} {before / after:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Benchmark: to_dict('records') + stdlib json (what jsonify did) vs. the mls_json serialiser.
+
+Run from the repository root:
+
+    python benchmarks/bench_json_serialization.py
+"""
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mls_json import dumps, frame_columnar, frame_records  # noqa: E402
+
+ROW_COUNTS = [1_000, 10_000, 100_000]
+
+
+def make_frame(n_rows, seed=0):
+    """The /get_filtered_data projection, with a few missing coordinates"""
+    rng = np.random.default_rng(seed)
+    latitude = rng.uniform(13, 19, n_rows)
+    latitude[rng.integers(0, n_rows, n_rows // 50)] = np.nan
+    return pd.DataFrame({
+        'mls_point_code': np.arange(1_000_000, 1_000_000 + n_rows),
+        'mls_point_name': [f"MLS Point {i}" for i in range(n_rows)],
+        'mandal_name': pd.Categorical([f"Mandal {i % 680}" for i in range(n_rows)]),
+        'district_name': pd.Categorical([f"District {i % 26}" for i in range(n_rows)]),
+        'mls_point_incharge_name': [f"Incharge {i}" for i in range(n_rows)],
+        'storage_capacity_mts': rng.uniform(100, 5000, n_rows),
+        'mls_point_latitude': latitude,
+    })
+
+
+def stdlib_path(df):
+    return json.dumps(df.to_dict('records')).encode()
+
+
+def orjson_records_path(df):
+    return dumps(frame_records(df))
+
+
+def orjson_columnar_path(df):
+    return dumps(frame_columnar(df))
+
+
+def main():
+    print(f"{'rows':>8} {'stdlib (ms)':>12} {'records (ms)':>13} {'columnar (ms)':>14} {'speedup':>14}")
+    for n_rows in ROW_COUNTS:
+        df = make_frame(n_rows)
+        repeat = max(3, 100_000 // n_rows)
+        baseline = timeit.timeit(lambda: stdlib_path(df), number=repeat) / repeat
+        records = timeit.timeit(lambda: orjson_records_path(df), number=repeat) / repeat
+        columnar = timeit.timeit(lambda: orjson_columnar_path(df), number=repeat) / repeat
+        print(f"{n_rows:>8} {baseline * 1e3:>12.2f} {records * 1e3:>13.2f} {columnar * 1e3:>14.2f} "
+              f"{baseline / records:>6.1f}x/{baseline / columnar:>5.1f}x")
+
+    # The stdlib encoder emits NaN, which browsers' JSON.parse rejects
+    df = make_frame(1_000)
+    print("stdlib output contains NaN:", b'NaN' in stdlib_path(df))
+    print("mls_json output contains NaN:", b'NaN' in orjson_records_path(df))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark: requests/sec of a get_mls_points-style route under different logging setups.
+
+"eager" is the old setup: basicConfig-style synchronous StreamHandler at
+INFO and f-string messages, including a dump of the first record. "same
+lines" writes those three INFO lines through configure_logging's queue;
+the rest use the route as it is now, with the lines at DEBUG. Lines go
+to a file in a temp directory, and to the same file through a sink that
+blocks 0.2 ms per write, as a terminal or a pipe to a log shipper that has
+fallen behind does.
+
+Run from the repository root:
+
+    python benchmarks/bench_logging.py
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mls_logging import configure_logging, stop_listener  # noqa: E402
+
+REQUESTS = 300
+ROUNDS = 7
+POINTS = 50
+
+logger = logging.getLogger('bench_logging')
+
+
+def make_app():
+    app = Flask(__name__)
+    points = [{'mls_point_code': 1000 + i, 'mls_point_name': f'Point {i}', 'district_name': 'Guntur',
+               'mandal_name': 'Tenali', 'mls_point_latitude': 16.2 + i / 1000, 'mls_point_longitude': 80.6,
+               'storage_capacity_mts': 250.0} for i in range(POINTS)]
+
+    @app.route('/eager/<district>/<mandal>')
+    def eager(district, mandal):
+        logger.info(f"Fetching MLS points for district: {district}, mandal: {mandal}")
+        logger.info(f"Found {len(points)} points for {district}/{mandal}")
+        logger.info(f"Sample point data: {points[0]}")
+        return jsonify(points)
+
+    @app.route('/lazy/<district>/<mandal>')
+    def lazy(district, mandal):
+        logger.debug("Fetching MLS points for district: %s, mandal: %s", district, mandal)
+        logger.debug("Found %s points for %s/%s", len(points), district, mandal)
+        logger.debug("Sample point data: %s", points[0])
+        return jsonify(points)
+
+    @app.route('/queued/<district>/<mandal>')
+    def queued(district, mandal):
+        # The eager route's three INFO lines, %-style, to compare the handlers alone
+        logger.info("Fetching MLS points for district: %s, mandal: %s", district, mandal)
+        logger.info("Found %s points for %s/%s", len(points), district, mandal)
+        logger.info("Sample point data: %s", points[0])
+        return jsonify(points)
+
+    return app
+
+
+def eager_setup(stream):
+    root = logging.getLogger()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+SETUPS = [
+    ('logging off', '/lazy/Guntur/Tenali', lambda stream: logging.disable(logging.CRITICAL)),
+    ('eager f-strings, sync, INFO', '/eager/Guntur/Tenali', eager_setup),
+    ('same lines, queue, text, INFO', '/queued/Guntur/Tenali',
+     lambda stream: configure_logging('INFO', stream=stream)),
+    ('queue, text, INFO', '/lazy/Guntur/Tenali', lambda stream: configure_logging('INFO', stream=stream)),
+    ('queue, JSON, INFO', '/lazy/Guntur/Tenali',
+     lambda stream: configure_logging('INFO', json_output=True, stream=stream)),
+    ('queue, JSON, DEBUG sampled 1%', '/lazy/Guntur/Tenali',
+     lambda stream: configure_logging('DEBUG', json_output=True, stream=stream,
+                                      debug_sample_rates={'/lazy/<district>/<mandal>': 0.01})),
+    ('queue, JSON, DEBUG every request', '/lazy/Guntur/Tenali',
+     lambda stream: configure_logging('DEBUG', json_output=True, stream=stream)),
+]
+
+
+def reset_logging():
+    logging.disable(logging.NOTSET)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+
+class SlowStream:
+    """A sink whose writes block, like a terminal or a pipe to a log shipper that has fallen behind"""
+
+    def __init__(self, stream, delay_seconds=0.0002):
+        self.stream = stream
+        self.delay_seconds = delay_seconds
+
+    def write(self, text):
+        time.sleep(self.delay_seconds)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+SINKS = [
+    ('file', lambda stream: stream),
+    ('slow sink', SlowStream),
+]
+
+
+def main():
+    client = make_app().test_client()
+    best = {(name, sink): float('inf') for name, _, _ in SETUPS for sink, _ in SINKS}
+    with tempfile.TemporaryDirectory() as directory:
+        # Alternate between setups so drift on the machine hits them all alike
+        for _ in range(ROUNDS):
+            for sink, make_sink in SINKS:
+                for name, path, setup in SETUPS:
+                    with open(os.path.join(directory, 'app.log'), 'a') as stream:
+                        setup(make_sink(stream))
+                        client.get(path)
+                        seconds = timeit.timeit(lambda: client.get(path), number=REQUESTS)
+                        best[name, sink] = min(best[name, sink], seconds)
+                        stop_listener()
+                        reset_logging()
+
+    print(f"{'setup':<36}" + ''.join(f"{sink + ' req/s':>16} {'vs off':>8}" for sink, _ in SINKS))
+    for name, _, _ in SETUPS:
+        row = f"{name:<36}"
+        for sink, _ in SINKS:
+            rate = REQUESTS / best[name, sink]
+            baseline = REQUESTS / best['logging off', sink]
+            row += f"{rate:>16.0f} {(rate / baseline - 1) * 100:>7.1f}%"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Benchmark: shipping every point to the map vs. ClusterIndex clusters for the viewport.
+
+Run from the repository root:
+
+    python benchmarks/bench_map_clusters.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_spatial_index import make_frame  # noqa: E402
+from mls_geo import ClusterIndex  # noqa: E402
+
+POINT_COUNTS = [10_000, 50_000, 200_000]
+# Whole state, district and mandal viewports (degrees across), at the zoom Leaflet would fit them to
+VIEWS = [(7, 8.0), (9, 1.5), (12, 0.2)]
+
+
+def main():
+    print(f"{'points':>8} {'build (ms)':>11} {'all points (KB)':>16} {'zoom':>5} {'clusters':>9} "
+          f"{'payload (KB)':>13} {'query (µs)':>11}")
+    for n_points in POINT_COUNTS:
+        df = make_frame(n_points)
+        df['storage_capacity_mts'] = np.random.default_rng(2).uniform(50, 500, n_points)
+        everything = len(orjson.dumps(df.to_dict('records')))
+
+        build = timeit.timeit(lambda: ClusterIndex(df), number=3) / 3
+        index = ClusterIndex(df)
+        assert sum(cluster['count'] for cluster in index.clusters(0)) == n_points
+
+        # Centre the viewports on a town
+        lat, lng = df['mls_point_latitude'].iloc[0], df['mls_point_longitude'].iloc[0]
+        for zoom, size in VIEWS:
+            box = (lat - size / 2, lng - size / 2, lat + size / 2, lng + size / 2)
+            clusters = index.clusters(zoom, *box)
+            payload = len(orjson.dumps(clusters, default=int))
+            query = timeit.timeit(lambda: index.clusters(zoom, *box), number=20) / 20
+            print(f"{n_points:>8} {build * 1e3:>11.1f} {everything / 1024:>16.0f} {zoom:>5} {len(clusters):>9} "
+                  f"{payload / 1024:>13.1f} {query * 1e6:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark: what the /metrics instrumentation adds to each observation and each request.
+
+Times Histogram.observe and the .time() context manager on their own, the
+track_requests hooks inside a request context, then a small JSON route
+through the Flask test client with and without track_requests (whole
+requests are noisy, so the hook timing is the steadier figure), and a
+scrape of the registry once many series exist.
+
+Run from the repository root:
+
+    python benchmarks/bench_metrics_overhead.py
+"""
+import os
+import sys
+import timeit
+
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mls_metrics import Histogram, MetricsRegistry, track_requests  # noqa: E402
+
+OBSERVATIONS = 200_000
+REQUESTS = 1_000
+ROUNDS = 15
+
+
+def make_app(instrumented, registry):
+    app = Flask(__name__)
+    if instrumented:
+        track_requests(app, Histogram('bench_request_seconds', 'Bench', ('route', 'method', 'status'),
+                                      registry=registry))
+
+    @app.route('/api/points/<district>')
+    def points(district):
+        return jsonify([{'mls_point_code': code, 'district_name': district} for code in range(20)])
+
+    return app
+
+
+def request_seconds(apps):
+    """Best per-request time for each app, alternating between them so drift hits both alike"""
+    clients = [app.test_client() for app in apps]
+    best = [float('inf')] * len(clients)
+    for _ in range(ROUNDS):
+        for position, client in enumerate(clients):
+            client.get('/api/points/Guntur')
+            seconds = timeit.timeit(lambda: client.get('/api/points/Guntur'), number=REQUESTS) / REQUESTS
+            best[position] = min(best[position], seconds)
+    return best
+
+
+def main():
+    registry = MetricsRegistry()
+    histogram = Histogram('bench_seconds', 'Bench', ('backend', 'operation'), registry=registry)
+
+    observe = min(timeit.repeat(lambda: histogram.observe(0.003, 'memory', 'search'),
+                                number=OBSERVATIONS, repeat=ROUNDS)) / OBSERVATIONS
+
+    def timed_block():
+        with histogram.time('memory', 'search'):
+            pass
+
+    timer = min(timeit.repeat(timed_block, number=OBSERVATIONS, repeat=ROUNDS)) / OBSERVATIONS
+    print(f"Histogram.observe: {observe * 1e6:.2f} µs    .time() block: {timer * 1e6:.2f} µs")
+
+    # The two hooks on their own, inside a matched request context
+    app = make_app(True, MetricsRegistry())
+    start_timer, observe_time = app.before_request_funcs[None][0], app.after_request_funcs[None][0]
+    response = app.response_class('[]')
+    with app.test_request_context('/api/points/Guntur'):
+        hooks = min(timeit.repeat(lambda: observe_time(start_timer() or response),
+                                  number=OBSERVATIONS // 4, repeat=ROUNDS)) / (OBSERVATIONS // 4)
+    print(f"track_requests hooks: {hooks * 1e6:.2f} µs per request")
+
+    plain, tracked = request_seconds([make_app(False, MetricsRegistry()), make_app(True, MetricsRegistry())])
+    plain_us, tracked_us = plain * 1e6, tracked * 1e6
+    print(f"request without metrics: {plain_us:.1f} µs    with track_requests: {tracked_us:.1f} µs    "
+          f"overhead: {tracked_us - plain_us:.1f} µs ({(tracked_us / plain_us - 1) * 100:.1f}%)")
+
+    # A scrape with the label sets a busy worker would have: every route x status, every store operation
+    for route in range(40):
+        for status in ('200', '304', '404', '500'):
+            histogram.observe(0.01, f"/route/{route}", status)
+    scrape = min(timeit.repeat(registry.render, number=20, repeat=ROUNDS)) / 20
+    print(f"scrape of {len(histogram._series)} histogram series: {scrape * 1e3:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark: embedding full-resolution photos vs. the MediaLibrary thumbnail cache.
+
+Run from the repository root:
+
+    python benchmarks/bench_pdf_images.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mls_media import IMAGE_NAMES, MediaLibrary  # noqa: E402
+from pdf_generator import generate_mls_pdf, get_pdf_template  # noqa: E402
+
+REPORTS = 5
+
+
+class FullResolutionMedia(MediaLibrary):
+    """Hands the camera originals straight to ReportLab, as a naive implementation would"""
+
+    def thumbnail(self, source, width, height):
+        return source[0]
+
+
+def make_media(media_dir, n_points, seed=0):
+    """One 4000x3000 camera-sized JPEG per image slot and point"""
+    rng = np.random.default_rng(seed)
+    # Smooth gradients plus noise, so the JPEGs compress like photos rather than static
+    y, x = np.mgrid[0:3000, 0:4000]
+    base = np.stack([x * 255 // 4000, y * 255 // 3000, (x + y) * 255 // 7000], axis=-1)
+    for point in range(n_points):
+        noise = rng.integers(0, 24, base.shape)
+        image = Image.fromarray((base + noise).clip(0, 255).astype(np.uint8))
+        directory = os.path.join(media_dir, str(1_000_000 + point))
+        os.makedirs(directory)
+        for name in IMAGE_NAMES:
+            image.save(os.path.join(directory, f"{name}.jpg"), quality=90)
+
+
+def run(media, records):
+    start = time.perf_counter()
+    sizes = [len(generate_mls_pdf(record, media=media)) for record in records]
+    return (time.perf_counter() - start) / len(records), sum(sizes) / len(sizes)
+
+
+def main():
+    root = tempfile.mkdtemp()
+    try:
+        media_dir = os.path.join(root, 'media')
+        make_media(media_dir, REPORTS)
+        records = [{'mls_point_code': str(1_000_000 + i), 'mls_point_name': f"MLS Point {i}"} for i in range(REPORTS)]
+        get_pdf_template()
+
+        full = run(FullResolutionMedia(media_dir, os.path.join(root, 'unused')), records)
+        thumbnails = MediaLibrary(media_dir, os.path.join(root, 'thumbnails'))
+        cold = run(thumbnails, records)
+        warm = run(thumbnails, records)
+
+        print(f"{'path':>18} {'ms/report':>10} {'KB/report':>10}")
+        for label, (seconds, size) in [('full resolution', full), ('thumbnails (cold)', cold),
+                                       ('thumbnails (warm)', warm)]:
+            print(f"{label:>18} {seconds * 1e3:>10.1f} {size / 1024:>10.1f}")
+        print(f"warm speedup: {full[0] / warm[0]:.0f}x, size reduction: {full[1] / warm[1]:.0f}x")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
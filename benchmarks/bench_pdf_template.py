@@ -0,0 +1,63 @@
+"""Benchmark: full platypus layout per report vs. replaying the pre-built PDF template.
+
+Run from the repository root:
+
+    python benchmarks/bench_pdf_template.py
+"""
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_generator import generate_mls_pdf, generate_mls_pdf_full, get_pdf_template  # noqa: E402
+
+REPORTS = 200
+
+
+def make_record(i):
+    """One point's worth of the fields the report shows"""
+    return {
+        'mls_point_code': str(1_000_000 + i),
+        'mls_point_name': f"MLS Point {i}",
+        'district_name': f"District {i % 26}",
+        'mandal_name': f"Mandal {i % 680}",
+        'mls_point_address': f"Door {i}-2-3, Main Road, near bus stand, Mandal {i % 680}, District {i % 26}",
+        'mls_point_latitude': 13 + (i % 600) / 100,
+        'mls_point_longitude': 77 + (i % 700) / 100,
+        'mls_point_incharge_cfms_id': f"CFMS{i:06d}",
+        'mls_point_incharge_name': f"Incharge {i}",
+        'designation': 'Deputy Manager',
+        'aadhaar_number': f"{i:012d}",
+        'phone_number': f"98{i:08d}",
+        'deo_cfms_id': f"DEO{i:06d}",
+        'deo_name': f"DEO {i}",
+        'godown_area_sqft': 1000.0 + i,
+        'storage_capacity_mts': 500.0 + i,
+        'mls_point_ownership': 'Owned' if i % 2 else 'Hired',
+        'weighbridge_available': 'Yes' if i % 3 else 'No',
+        'hamalies_working': float(i % 40),
+        'camera_vendor': 'Vendor A',
+        'cc_cameras_installed': 'Yes',
+    }
+
+
+def main():
+    records = [make_record(i) for i in range(REPORTS)]
+
+    start = time.perf_counter()
+    get_pdf_template()
+    print(f"template build (once): {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    full = timeit.timeit(lambda: [generate_mls_pdf_full(record) for record in records], number=1) / REPORTS
+    template = timeit.timeit(lambda: [generate_mls_pdf(record) for record in records], number=1) / REPORTS
+
+    print(f"{'path':>10} {'ms/report':>10} {'reports/s':>10}")
+    print(f"{'full':>10} {full * 1e3:>10.2f} {1 / full:>10.0f}")
+    print(f"{'template':>10} {template * 1e3:>10.2f} {1 / template:>10.0f}")
+    print(f"speedup: {full / template:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Micro-benchmark: a str.contains scan of the searched columns vs. the search index.
+
+Run from the repository root:
+
+    python benchmarks/bench_search_index.py
+
+'godown' matches every synthetic row, so it shows the worst case where the
+whole substring tier has to be ranked. The build line is what every new
+snapshot (a load, or a shared generation swap) pays.
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mls_index import SearchIndex  # noqa: E402
+
+ROW_COUNTS = [10_000, 100_000, 1_000_000]
+QUERIES = ['10', '1234', '99999', 'point 77', 'godown']
+
+
+def make_frame(n_rows):
+    """Build a synthetic mls_points frame with integer codes like the real table"""
+    return pd.DataFrame({
+        'mls_point_code': np.arange(1_000_000, 1_000_000 + n_rows),
+        'mls_point_name': [f"MLS Point {i} Godown" for i in range(n_rows)],
+    })
+
+
+def scan_search(df, term):
+    matches = (df['mls_point_code'].astype(str).str.contains(term, case=False, regex=False)
+               | df['mls_point_name'].str.contains(term, case=False, regex=False))
+    return df.index[matches].tolist()
+
+
+def main():
+    print(f"{'rows':>10} {'query':>10} {'scan (ms)':>12} {'index (ms)':>12} {'speedup':>10}")
+    for n_rows in ROW_COUNTS:
+        df = make_frame(n_rows)
+        build_s = timeit.timeit(lambda: SearchIndex(df, fields=['mls_point_code', 'mls_point_name']), number=1)
+        index = SearchIndex(df, fields=['mls_point_code', 'mls_point_name'])
+        print(f"{n_rows:>10} {'(build)':>10} {'':>12} {build_s * 1e3:>12.0f}")
+
+        for query in QUERIES:
+            repeat = 3 if n_rows >= 1_000_000 else 10
+            scan_s = timeit.timeit(lambda: scan_search(df, query), number=repeat) / repeat
+            index_s = timeit.timeit(lambda: index.search(query, limit=50), number=repeat) / repeat
+            print(f"{n_rows:>10} {query:>10} {scan_s * 1e3:>12.2f} {index_s * 1e3:>12.2f} "
+                  f"{scan_s / index_s:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
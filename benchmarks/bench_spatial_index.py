@@ -0,0 +1,74 @@
+"""Benchmark: full-table scans vs. the SpatialIndex grid for viewport and nearest-point queries.
+
+Run from the repository root:
+
+    python benchmarks/bench_spatial_index.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mls_geo import SpatialIndex, haversine_km  # noqa: E402
+
+POINT_COUNTS = [10_000, 50_000, 200_000]
+QUERIES = 200
+
+
+def make_frame(n_points, seed=0):
+    """Points spread over an Andhra Pradesh-sized box, clustered around towns"""
+    rng = np.random.default_rng(seed)
+    towns = np.column_stack([rng.uniform(12.6, 19.2, 300), rng.uniform(76.7, 84.8, 300)])
+    town = rng.integers(0, len(towns), n_points)
+    return pd.DataFrame({
+        'mls_point_latitude': towns[town, 0] + rng.normal(0, 0.08, n_points),
+        'mls_point_longitude': towns[town, 1] + rng.normal(0, 0.08, n_points),
+    })
+
+
+def scan_bbox(lats, lngs, south, west, north, east):
+    return np.flatnonzero((lats >= south) & (lats <= north) & (lngs >= west) & (lngs <= east))
+
+
+def scan_nearest(lats, lngs, lat, lng, k):
+    distances = haversine_km(lat, lng, lats, lngs)
+    top = np.argpartition(distances, k - 1)[:k]
+    return top[np.argsort(distances[top])]
+
+
+def main():
+    rng = np.random.default_rng(1)
+    # Mandal-sized map viewports and random query locations
+    boxes = [(lat, lng, lat + 0.3, lng + 0.4)
+             for lat, lng in zip(rng.uniform(12.6, 18.9, QUERIES), rng.uniform(76.7, 84.4, QUERIES))]
+    centres = list(zip(rng.uniform(12.6, 19.2, QUERIES), rng.uniform(76.7, 84.8, QUERIES)))
+
+    print(f"{'points':>8} {'build (ms)':>11} {'bbox scan (µs)':>15} {'bbox index (µs)':>16} "
+          f"{'knn scan (µs)':>14} {'knn index (µs)':>15}")
+    for n_points in POINT_COUNTS:
+        df = make_frame(n_points)
+        lats = df['mls_point_latitude'].to_numpy()
+        lngs = df['mls_point_longitude'].to_numpy()
+
+        build = timeit.timeit(lambda: SpatialIndex(df), number=3) / 3
+        index = SpatialIndex(df)
+
+        for south, west, north, east in boxes[:20]:
+            assert sorted(index.bbox(south, west, north, east)) == scan_bbox(lats, lngs, south, west, north, east).tolist()
+
+        bbox_scan = timeit.timeit(lambda: [scan_bbox(lats, lngs, *box) for box in boxes], number=1) / QUERIES
+        bbox_index = timeit.timeit(lambda: [index.bbox(*box) for box in boxes], number=1) / QUERIES
+        knn_scan = timeit.timeit(lambda: [scan_nearest(lats, lngs, lat, lng, 10) for lat, lng in centres],
+                                 number=1) / QUERIES
+        knn_index = timeit.timeit(lambda: [index.nearest(lat, lng, 10) for lat, lng in centres], number=1) / QUERIES
+
+        print(f"{n_points:>8} {build * 1e3:>11.1f} {bbox_scan * 1e6:>15.0f} {bbox_index * 1e6:>16.0f} "
+              f"{knn_scan * 1e6:>14.0f} {knn_index * 1e6:>15.0f}")
+
+
+if __name__ == '__main__':
+    main()
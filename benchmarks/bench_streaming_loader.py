@@ -0,0 +1,83 @@
+"""Benchmark: peak memory of a one-shot read_sql_query vs. the chunked, compact-as-you-go loader.
+
+Uses a throwaway SQLite file so it runs anywhere; against Postgres the
+chunked path also keeps the driver's own row buffer small, as it reads
+through a server-side cursor.
+
+Run from the repository root:
+
+    python benchmarks/bench_streaming_loader.py
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mls_columns import compact_frame, concat_compact  # noqa: E402
+
+N_POINTS = 200_000
+CHUNK_SIZE = 20_000
+
+
+def make_frame(n_points, seed=0):
+    rng = np.random.default_rng(seed)
+    districts = np.array([f"District {i}" for i in range(26)])
+    mandals = np.array([f"Mandal {i}" for i in range(700)])
+    return pd.DataFrame({
+        'mls_point_code': np.arange(n_points),
+        'mls_point_name': [f"MLS Point {i}" for i in range(n_points)],
+        'district_name': districts[rng.integers(0, len(districts), n_points)],
+        'mandal_name': mandals[rng.integers(0, len(mandals), n_points)],
+        'mls_point_latitude': rng.uniform(12.6, 19.2, n_points).astype(str),
+        'mls_point_longitude': rng.uniform(76.7, 84.8, n_points).astype(str),
+        'storage_capacity_mts': rng.integers(50, 500, n_points).astype(str),
+        'weighbridge_available': rng.choice(['Yes', 'No'], n_points),
+        'phone_number': rng.integers(6_000_000_000, 9_999_999_999, n_points).astype(str)
+    })
+
+
+def one_shot(engine):
+    return compact_frame(pd.read_sql_query(text("SELECT * FROM mls_points"), engine))
+
+
+def chunked(engine):
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=CHUNK_SIZE) as conn:
+        chunks = [compact_frame(chunk)
+                  for chunk in pd.read_sql_query(text("SELECT * FROM mls_points"), conn, chunksize=CHUNK_SIZE)]
+    return concat_compact(chunks)
+
+
+def measure(load, engine):
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = load(engine)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return df, elapsed, peak
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        make_frame(N_POINTS).to_sql('mls_points', engine, index=False)
+
+        print(f"{'loader':>10} {'seconds':>8} {'peak (MB)':>10} {'frame (MB)':>11}")
+        frames = []
+        for label, load in [('one-shot', one_shot), ('chunked', chunked)]:
+            df, elapsed, peak = measure(load, engine)
+            frames.append(df)
+            size = df.memory_usage(deep=True).sum()
+            print(f"{label:>10} {elapsed:>8.2f} {peak / 2 ** 20:>10.1f} {size / 2 ** 20:>11.1f}")
+        pd.testing.assert_frame_equal(*frames)
+
+
+if __name__ == '__main__':
+    main()
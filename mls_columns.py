@@ -0,0 +1,163 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pandas.api.types import union_categoricals
+
+# Get logger from the main application
+logger = logging.getLogger(__name__)
+
+# Low-cardinality names and codes, stored as categoricals
+CATEGORY_COLUMNS = [
+    'district_name', 'district_code', 'mandal_name', 'mandal_code',
+    'designation', 'mls_point_ownership', 'rented_type', 'camera_vendor'
+]
+
+# Coordinates, capacities and counts, stored as float arrays
+FLOAT_COLUMNS = [
+    'mls_point_latitude', 'mls_point_longitude', 'storage_capacity_mts',
+    'storage_capacity_in_mts', 'godown_area_sqft', 'hamalies_working',
+    'stage2_vehicles_registered'
+]
+
+# Yes/No answers, stored as bit-packed Arrow booleans
+FLAG_COLUMNS = [
+    'weighbridge_available', 'cc_cameras_installed', 'cameras_working',
+    'gps_installed_on_all_vehicles'
+]
+
+# Free text and personal identifiers only the detail and PDF views show;
+# left in Postgres and fetched per point on demand
+DETAIL_COLUMNS = [
+    'mls_point_address', 'aadhaar_number', 'deo_aadhaar_number',
+    'nominee_aadhaar_number', 'mls_point_incharge_cfms_id', 'deo_cfms_id',
+    'nominee_incharge_cfms_id', 'nominee_incharge_name', 'nominee_designation',
+    'nominee_phone_number'
+]
+
+FLAG_VALUES = {
+    'yes': True, 'y': True, 'true': True, '1': True,
+    'no': False, 'n': False, 'false': False, '0': False
+}
+
+BOOL_DTYPE = pd.ArrowDtype(pa.bool_())
+
+
+def compact_frame(df):
+    """Convert read_sql's object columns to compact dtypes where that loses nothing
+
+    A column only changes type if every non-null value converts; anything
+    else (e.g. a flag column that also holds 'Partial') falls back to a
+    categorical, or is left alone.
+    """
+    df = df.copy()
+    for column in df.columns:
+        if column in FLAG_COLUMNS:
+            flags = _to_flags(df[column])
+            if flags is not None:
+                df[column] = flags
+                continue
+            df[column] = df[column].astype('category')
+        elif column in FLOAT_COLUMNS:
+            numbers = pd.to_numeric(df[column], errors='coerce')
+            if numbers.notna().sum() == df[column].notna().sum():
+                df[column] = numbers.astype('float64')
+        elif column in CATEGORY_COLUMNS:
+            df[column] = df[column].astype('category')
+    return df
+
+
+def concat_compact(chunks):
+    """Stack compact_frame() chunks into one frame, keeping the compact dtypes
+
+    Categoricals are merged with union_categoricals, as a plain concat turns
+    differing categories into object columns; a column that came out
+    categorical in some chunks only is compacted again as a whole.
+    """
+    if len(chunks) == 1:
+        return chunks[0].reset_index(drop=True)
+
+    columns = {}
+    for column in chunks[0].columns:
+        parts = [chunk[column] for chunk in chunks]
+        categorical = [isinstance(part.dtype, pd.CategoricalDtype) for part in parts]
+        if all(categorical):
+            columns[column] = pd.Series(union_categoricals(parts, ignore_order=True), name=column)
+        elif any(categorical):
+            whole = pd.concat([part.astype(object) for part in parts], ignore_index=True)
+            columns[column] = compact_frame(whole.to_frame())[column]
+        else:
+            columns[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def append_compact(df, new_df):
+    """Append raw rows to a frame, converted to its column types first
+
+    A plain concat of raw rows turns the categorical, float and flag
+    columns back into object. New names are added to a categorical's
+    categories and other values go through encode_value; a column whose
+    new values don't fit its type is widened, as update_rows does.
+    """
+    new_df = new_df.reindex(columns=df.columns)
+    columns = {}
+    for column in df.columns:
+        old, raw = df[column], new_df[column]
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            added = [value for value in pd.unique(raw.dropna()) if value not in old.cat.categories]
+            if added:
+                old = old.cat.add_categories(added)
+            new = pd.Series(pd.Categorical(raw, dtype=old.dtype), index=new_df.index, name=column)
+            columns[column] = pd.concat([old, new])
+            continue
+        values = [encode_value(old, value) for value in raw.tolist()]
+        try:
+            new = pd.Series(values, index=new_df.index, dtype=old.dtype, name=column)
+        except (TypeError, ValueError):
+            new = pd.Series(values, index=new_df.index, dtype=object, name=column)
+        columns[column] = pd.concat([old, new])
+    return pd.DataFrame(columns)
+
+
+def encode_value(series, value):
+    """Convert a form string to the storage type of a compact column, if it has one"""
+    if isinstance(series.dtype, pd.ArrowDtype) and series.dtype == BOOL_DTYPE:
+        if value is None or str(value).strip() == '':
+            return None
+        return FLAG_VALUES.get(str(value).strip().lower(), value)
+    if pd.api.types.is_float_dtype(series.dtype) and isinstance(value, str):
+        if value.strip() == '':
+            return np.nan
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def decode_record(record):
+    """Turn stored values back into what the templates show and compare against
+
+    Booleans become Yes/No strings, and whole-number floats (counts such as
+    hamalies_working) become ints, so they don't render as "3.0".
+    """
+    for column in FLAG_COLUMNS:
+        value = record.get(column)
+        if isinstance(value, (bool, np.bool_)):
+            record[column] = 'Yes' if value else 'No'
+    for column in FLOAT_COLUMNS:
+        value = record.get(column)
+        if isinstance(value, float) and value.is_integer():
+            record[column] = int(value)
+    return record
+
+
+def _to_flags(series):
+    present = series.dropna()
+    mapped = present.astype(str).str.strip().str.lower().map(FLAG_VALUES)
+    if mapped.isna().any():
+        return None
+    flags = pd.Series(pd.NA, index=series.index, dtype=BOOL_DTYPE)
+    flags[present.index] = mapped.astype(bool)
+    return flags
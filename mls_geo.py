@@ -0,0 +1,283 @@
+import numpy as np
+import pandas as pd
+
+# Mean Earth radius
+EARTH_RADIUS_KM = 6371.0088
+
+# Kilometres per degree of latitude
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distance in km from one point to arrays of points"""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """Uniform latitude/longitude grid over the points' coordinates
+
+    Points are sorted by grid cell, numbered row by row, so the cells one
+    grid row of a bounding box covers are one contiguous slice found with
+    searchsorted. Rows without usable coordinates are left out.
+    """
+
+    def __init__(self, df, cell_degrees=0.1, lat_column='mls_point_latitude', lng_column='mls_point_longitude'):
+        self.cell_degrees = cell_degrees
+        self.n_cols = int(np.ceil(360 / cell_degrees))
+
+        if lat_column in df.columns and lng_column in df.columns:
+            lats = pd.to_numeric(df[lat_column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            lngs = pd.to_numeric(df[lng_column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        else:
+            lats = lngs = np.empty(0)
+        valid = np.isfinite(lats) & np.isfinite(lngs) & (np.abs(lats) <= 90) & (np.abs(lngs) <= 180)
+        labels = df.index.to_numpy()[valid] if len(lats) else np.empty(0, dtype=object)
+        lats, lngs = lats[valid], lngs[valid]
+
+        cells = self._rows(lats) * self.n_cols + self._cols(lngs)
+        order = np.argsort(cells, kind='stable')
+        self.cells = cells[order]
+        self.labels = labels[order]
+        self.lats = lats[order]
+        self.lngs = lngs[order]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _rows(self, lats):
+        return np.floor((np.asarray(lats) + 90) / self.cell_degrees).astype(np.int64)
+
+    def _cols(self, lngs):
+        return np.minimum(np.floor((np.asarray(lngs) + 180) / self.cell_degrees).astype(np.int64), self.n_cols - 1)
+
+    def _bbox_positions(self, south, west, north, east):
+        """Sorted-array positions of the points inside a box (west <= east)"""
+        rows = np.arange(self._rows(max(south, -90)), self._rows(min(north, 90)) + 1)
+        first_col, last_col = self._cols(max(west, -180)), self._cols(min(east, 180))
+        starts = np.searchsorted(self.cells, rows * self.n_cols + first_col, side='left')
+        ends = np.searchsorted(self.cells, rows * self.n_cols + last_col, side='right')
+
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        # Concatenate the per-row slices without a Python loop
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(total)
+
+        lats, lngs = self.lats[positions], self.lngs[positions]
+        inside = (lats >= south) & (lats <= north) & (lngs >= west) & (lngs <= east)
+        return positions[inside]
+
+    def bbox(self, south, west, north, east, limit=None):
+        """Labels of the points inside a box; a box with west > east crosses the antimeridian"""
+        if west <= east:
+            positions = self._bbox_positions(south, west, north, east)
+        else:
+            positions = np.concatenate([self._bbox_positions(south, west, north, 180),
+                                        self._bbox_positions(south, -180, north, east)])
+        if limit is not None:
+            positions = positions[:limit]
+        return self.labels[positions].tolist()
+
+    def nearest(self, lat, lng, k=10, max_km=None):
+        """Labels and distances (km) of the k points closest to (lat, lng), nearest first
+
+        Searches a box around the point and widens it until the k-th hit is
+        no further away than the box's inscribed circle, so nothing outside
+        could be closer.
+        """
+        if len(self) == 0 or k <= 0:
+            return [], []
+
+        radius_km = self.cell_degrees * KM_PER_DEGREE
+        while True:
+            positions = self._radius_positions(lat, lng, radius_km)
+            exhausted = radius_km >= np.pi * EARTH_RADIUS_KM or (max_km is not None and radius_km >= max_km)
+            if len(positions) >= k or exhausted:
+                distances = haversine_km(lat, lng, self.lats[positions], self.lngs[positions])
+                if max_km is not None:
+                    keep = distances <= max_km
+                    positions, distances = positions[keep], distances[keep]
+                if len(positions) > k:
+                    top = np.argpartition(distances, k - 1)[:k]
+                    positions, distances = positions[top], distances[top]
+                order = np.argsort(distances, kind='stable')
+                positions, distances = positions[order], distances[order]
+                if exhausted or len(positions) < k or distances[-1] <= radius_km:
+                    return self.labels[positions].tolist(), distances.tolist()
+                # Everything within the k-th distance is inside a box of that radius
+                radius_km = distances[-1]
+                continue
+            radius_km *= 2
+
+    def _radius_positions(self, lat, lng, radius_km):
+        """Positions inside the lat/lng box that contains the circle of radius_km around a point"""
+        dlat = radius_km / KM_PER_DEGREE
+        south, north = lat - dlat, lat + dlat
+        # Longitude degrees shrink towards the poles, so size the box for its
+        # poleward edge; a box reaching a pole takes every longitude
+        cos_lat = np.cos(np.radians(min(max(abs(south), abs(north)), 90)))
+        if north >= 90 or south <= -90 or cos_lat <= 1e-6:
+            return self._bbox_positions(max(south, -90), -180, min(north, 90), 180)
+        dlng = dlat / cos_lat
+        if dlng >= 180:
+            return self._bbox_positions(south, -180, north, 180)
+        west, east = lng - dlng, lng + dlng
+        if west < -180:
+            return np.concatenate([self._bbox_positions(south, west + 360, north, 180),
+                                   self._bbox_positions(south, -180, north, east)])
+        if east > 180:
+            return np.concatenate([self._bbox_positions(south, west, north, 180),
+                                   self._bbox_positions(south, -180, north, east - 360)])
+        return self._bbox_positions(south, west, north, east)
+
+
+# Web Mercator stops short of the poles
+MAX_MERCATOR_LATITUDE = 85.05112878
+
+
+def mercator_xy(lats, lngs):
+    """Project coordinates onto the unit Web Mercator square, x eastwards and y southwards from the top-left"""
+    x = (np.asarray(lngs, dtype=float) + 180) / 360
+    lat = np.radians(np.clip(np.asarray(lats, dtype=float), -MAX_MERCATOR_LATITUDE, MAX_MERCATOR_LATITUDE))
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2
+    return np.clip(x, 0, np.nextafter(1, 0)), np.clip(y, 0, np.nextafter(1, 0))
+
+
+class ClusterIndex:
+    """Points aggregated into Web Mercator grid cells for every zoom level of the map
+
+    At zoom z the world is 256 * 2**z pixels across and a cell covers
+    cell_pixels of them, so a viewport holds the same few hundred cells at
+    any zoom. The finest level is aggregated from the points and each
+    coarser one from the level below by merging 2x2 blocks of cells, so the
+    whole pyramid costs little more than one pass over the points.
+    """
+
+    def __init__(self, df, max_zoom=16, cell_pixels=64, capacity_column='storage_capacity_mts',
+                 lat_column='mls_point_latitude', lng_column='mls_point_longitude'):
+        self.max_zoom = max_zoom
+        # Cells per axis at zoom 0; a power of two so a cell splits into 2x2 at the next zoom
+        self.base_bits = max(0, int(np.log2(256 / cell_pixels)))
+
+        if lat_column in df.columns and lng_column in df.columns:
+            lats = pd.to_numeric(df[lat_column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            lngs = pd.to_numeric(df[lng_column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        else:
+            lats = lngs = np.empty(0)
+        valid = np.isfinite(lats) & np.isfinite(lngs) & (np.abs(lats) <= 90) & (np.abs(lngs) <= 180)
+        self.labels = df.index.to_numpy()[valid] if len(lats) else np.empty(0, dtype=object)
+        lats, lngs = lats[valid], lngs[valid]
+        if capacity_column in df.columns:
+            capacities = pd.to_numeric(df[capacity_column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            capacities = np.nan_to_num(capacities[valid])
+        else:
+            capacities = np.zeros(len(lats))
+
+        bits = self.base_bits + max_zoom
+        x, y = mercator_xy(lats, lngs)
+        level = {
+            'x': np.floor(x * 2 ** bits).astype(np.int64),
+            'y': np.floor(y * 2 ** bits).astype(np.int64),
+            'count': np.ones(len(lats), dtype=np.int64),
+            'capacity': capacities,
+            'lat_sum': lats,
+            'lng_sum': lngs,
+            'south': lats, 'west': lngs, 'north': lats, 'east': lngs,
+            'first': np.arange(len(lats))
+        }
+        self.levels = [None] * (max_zoom + 1)
+        for zoom in range(max_zoom, -1, -1):
+            level = self._merge(level, shift=0 if zoom == max_zoom else 1)
+            self.levels[zoom] = level
+
+    def __len__(self):
+        return len(self.labels)
+
+    @staticmethod
+    def _merge(level, shift):
+        """Group cells by their parent shift levels up, summing counts and widening bounds"""
+        x, y = level['x'] >> shift, level['y'] >> shift
+        keys = (y << 32) | x
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+
+        def reduce(ufunc, name):
+            if not len(starts):
+                return level[name][:0]
+            return ufunc.reduceat(level[name][order], starts)
+
+        return {
+            'x': x[order][starts],
+            'y': y[order][starts],
+            'key': keys[starts],
+            'count': reduce(np.add, 'count'),
+            'capacity': reduce(np.add, 'capacity'),
+            'lat_sum': reduce(np.add, 'lat_sum'),
+            'lng_sum': reduce(np.add, 'lng_sum'),
+            'south': reduce(np.minimum, 'south'),
+            'west': reduce(np.minimum, 'west'),
+            'north': reduce(np.maximum, 'north'),
+            'east': reduce(np.maximum, 'east'),
+            'first': reduce(np.minimum, 'first')
+        }
+
+    def bounds(self):
+        """(south, west, north, east) around every point, or None when there are none"""
+        if len(self) == 0:
+            return None
+        top = self.levels[0]
+        return (float(top['south'].min()), float(top['west'].min()),
+                float(top['north'].max()), float(top['east'].max()))
+
+    def _cell_positions(self, level, bits, south, west, north, east):
+        """Positions of a level's cells overlapping a box (west <= east), one searchsorted pair per cell row"""
+        (x0, x1), (y1, y0) = mercator_xy([south, north], [west, east])
+        first_x, last_x = int(x0 * 2 ** bits), int(x1 * 2 ** bits)
+        rows = np.arange(int(y0 * 2 ** bits), int(y1 * 2 ** bits) + 1, dtype=np.int64)
+        starts = np.searchsorted(level['key'], (rows << 32) | first_x, side='left')
+        ends = np.searchsorted(level['key'], (rows << 32) | last_x, side='right')
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+
+    def clusters(self, zoom, south=-90, west=-180, north=90, east=180):
+        """Clusters at a zoom level whose cells overlap a box; a box with west > east crosses the antimeridian
+
+        Each is a dict with the point count, summed capacity, centroid and
+        bounds; a cluster of one point also carries that point's label.
+        """
+        zoom = min(max(int(zoom), 0), self.max_zoom)
+        level = self.levels[zoom]
+        bits = self.base_bits + zoom
+        south, north = max(south, -90), min(north, 90)
+        if west <= east:
+            positions = self._cell_positions(level, bits, south, max(west, -180), north, min(east, 180))
+        else:
+            positions = np.concatenate([self._cell_positions(level, bits, south, west, north, 180),
+                                        self._cell_positions(level, bits, south, -180, north, east)])
+
+        counts = level['count'][positions]
+        lats = level['lat_sum'][positions] / np.maximum(counts, 1)
+        lngs = level['lng_sum'][positions] / np.maximum(counts, 1)
+        clusters = []
+        for i, position in enumerate(positions):
+            cluster = {
+                'lat': float(lats[i]),
+                'lng': float(lngs[i]),
+                'count': int(counts[i]),
+                'capacity': float(level['capacity'][position]),
+                'bounds': [float(level['south'][position]), float(level['west'][position]),
+                           float(level['north'][position]), float(level['east'][position])]
+            }
+            if counts[i] == 1:
+                cluster['label'] = self.labels[level['first'][position]]
+            clusters.append(cluster)
+        return clusters
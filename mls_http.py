@@ -0,0 +1,46 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    # Optional; without it responses are only gzip-compressed
+    brotli = None
+
+
+def is_not_modified(request, etag, modified_at):
+    """True if the client's validators still match the current data generation
+
+    If-Modified-Since only carries whole seconds, so it matches only when
+    the data last changed strictly before that second; an edit made within
+    the second a client last fetched in is never answered with a 304.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since is not None:
+        return modified_at < request.if_modified_since
+    return False
+
+
+def compress_response(response, accept_encodings, min_size=1024, gzip_level=6, brotli_quality=5):
+    """Compress a buffered JSON response in place with brotli or gzip, if the client accepts it"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code != 200
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    if brotli is not None and 'br' in accept_encodings:
+        response.set_data(brotli.compress(body, quality=brotli_quality))
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=gzip_level))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,299 @@
+import bisect
+import heapq
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Get logger from the main application
+logger = logging.getLogger(__name__)
+
+
+class CodeIndex:
+    """Maps mls_point_code (as a string) to the DataFrame index label of its row"""
+
+    def __init__(self, df=None):
+        self._labels = {}
+        if df is not None:
+            self.rebuild(df)
+
+    def rebuild(self, df):
+        """Rebuild the whole index from a freshly loaded DataFrame"""
+        labels = {}
+        if not df.empty and 'mls_point_code' in df.columns:
+            codes = df['mls_point_code'].astype(str).tolist()
+            # Insert in reverse so the first row wins for duplicate codes,
+            # same as record_df.iloc[0] did
+            labels = dict(zip(reversed(codes), reversed(df.index.tolist())))
+        self._labels = labels
+        logger.info("Code index built with %s MLS codes", len(labels))
+
+    def get(self, mls_code):
+        """Return the index label for an MLS code, or None if it is unknown"""
+        return self._labels.get(str(mls_code))
+
+    def set(self, mls_code, label):
+        self._labels[str(mls_code)] = label
+
+    def discard(self, mls_code):
+        self._labels.pop(str(mls_code), None)
+
+    def __contains__(self, mls_code):
+        return str(mls_code) in self._labels
+
+    def __len__(self):
+        return len(self._labels)
+
+
+class PointHierarchy:
+    """Pre-sorted district -> mandal -> rows lookup behind the cascading dropdowns"""
+
+    def __init__(self, df=None):
+        self.districts = []
+        self._mandals = {}
+        self._labels = {}
+        self._district_rows = {}
+        if df is not None:
+            self.rebuild(df)
+
+    def rebuild(self, df):
+        """Rebuild the whole hierarchy from a freshly loaded DataFrame"""
+        districts, mandals, labels, district_rows = [], {}, {}, {}
+        if not df.empty and {'district_name', 'mandal_name'}.issubset(df.columns):
+            district_counts = df['district_name'].value_counts()
+            district_rows = district_counts[district_counts > 0].to_dict()
+            districts = sorted(district_rows)
+            groups = df.groupby(['district_name', 'mandal_name'], sort=True, observed=True).groups
+            for (district, mandal), group_labels in groups.items():
+                labels[(district, mandal)] = group_labels.tolist()
+                mandals.setdefault(district, []).append(mandal)
+
+        self.districts = districts
+        self._mandals = mandals
+        self._labels = labels
+        self._district_rows = district_rows
+        logger.info("Point hierarchy built with %s districts and %s mandals", len(districts), len(labels))
+
+    def mandals(self, district):
+        """Return the sorted mandal names for a district"""
+        return self._mandals.get(district, [])
+
+    def point_labels(self, district, mandal):
+        """Return the index labels of the points in a district/mandal, in table order"""
+        return self._labels.get((district, mandal), [])
+
+    def move(self, label, old_district, old_mandal, new_district, new_mandal):
+        """Re-file one row after its district or mandal changed"""
+        if old_district == new_district and old_mandal == new_mandal:
+            return
+
+        if not _is_missing(old_district):
+            if not _is_missing(old_mandal):
+                key = (old_district, old_mandal)
+                group = self._labels.get(key, [])
+                if label in group:
+                    group.remove(label)
+                if not group:
+                    self._labels.pop(key, None)
+                    self._drop_sorted(self._mandals.get(old_district, []), old_mandal)
+            self._district_rows[old_district] = self._district_rows.get(old_district, 1) - 1
+            if self._district_rows[old_district] <= 0:
+                del self._district_rows[old_district]
+                self._mandals.pop(old_district, None)
+                self._drop_sorted(self.districts, old_district)
+
+        if not _is_missing(new_district):
+            if new_district not in self._district_rows:
+                bisect.insort(self.districts, new_district)
+            self._district_rows[new_district] = self._district_rows.get(new_district, 0) + 1
+            if not _is_missing(new_mandal):
+                key = (new_district, new_mandal)
+                if key not in self._labels:
+                    bisect.insort(self._mandals.setdefault(new_district, []), new_mandal)
+                bisect.insort(self._labels.setdefault(key, []), label)
+
+    @staticmethod
+    def _drop_sorted(values, value):
+        position = bisect.bisect_left(values, value)
+        if position < len(values) and values[position] == value:
+            del values[position]
+
+
+def _is_missing(value):
+    return value is None or bool(pd.isna(value))
+
+
+class SearchIndex:
+    """Literal, case-insensitive type-ahead search over a few text columns
+
+    Each field's lower-cased texts are held as an Arrow string array plus a
+    sorted copy, so exact and prefix matches come straight out of a bisect,
+    and substring matches are found by Arrow's vectorised find_substring
+    over the whole column. Rows edited or added since the build sit in a
+    small overlay searched in Python, and are folded into the arrays once
+    there are more than MAX_OVERLAY of them. Results are ranked field by
+    field: exact, then prefix (in sorted order), then substring (earliest
+    match first, then shortest), ties in table order.
+    """
+
+    MAX_OVERLAY = 5000
+
+    def __init__(self, df=None, fields=('mls_point_code',)):
+        self.fields = tuple(fields)
+        self._build(np.array([], dtype=np.int64), [[] for _ in self.fields])
+        if df is not None:
+            self.rebuild(df)
+
+    def rebuild(self, df):
+        """Rebuild the whole index from a freshly loaded DataFrame"""
+        labels = df.index.to_numpy()
+        columns = []
+        for field in self.fields:
+            if field in df.columns and not df.empty:
+                values = df[field].astype(object)
+                columns.append(values.where(values.notna(), '').astype(str).tolist())
+            else:
+                columns.append([''] * len(labels))
+        self._build(labels, columns)
+        logger.info("Search index built over %s for %s rows", list(self.fields), len(labels))
+
+    def _build(self, labels, columns):
+        self._labels = labels
+        self._label_index = pd.Index(labels)
+        self._texts, self._sorted, self._sorted_positions, self._lengths, self._ascii = [], [], [], [], []
+        for column in columns:
+            texts = pc.utf8_lower(pa.array(column, type=pa.string()))
+            # A stable sort, so equal texts stay in table order
+            order = pc.sort_indices(texts)
+            self._texts.append(texts)
+            self._sorted.append(texts.take(order))
+            self._sorted_positions.append(order.to_numpy())
+            self._lengths.append(pc.utf8_length(texts).to_numpy(zero_copy_only=False).astype(np.int64))
+            self._ascii.append(pc.string_is_ascii(texts).to_numpy(zero_copy_only=False))
+        # Rows edited or added since the build: label -> lower-cased texts
+        self._overlay = {}
+        # Rows of the arrays that the overlay supersedes
+        self._stale = np.zeros(len(labels), dtype=bool)
+
+    def _position(self, label):
+        try:
+            return self._label_index.get_loc(label)
+        except KeyError:
+            return None
+
+    def update(self, label, values):
+        """Re-index one row; values maps field name to its new value"""
+        position = self._position(label)
+        if position is not None:
+            self._stale[position] = True
+        self._overlay[label] = tuple('' if _is_missing(values.get(field)) else str(values.get(field)).lower()
+                                     for field in self.fields)
+        if len(self._overlay) > self.MAX_OVERLAY:
+            self._fold_overlay()
+
+    def _fold_overlay(self):
+        """Write the overlay into the arrays and rebuild them"""
+        labels = self._labels.tolist()
+        columns = [texts.to_pylist() for texts in self._texts]
+        for label, texts in self._overlay.items():
+            position = self._position(label)
+            if position is None:
+                labels.append(label)
+                for column, text in zip(columns, texts):
+                    column.append(text)
+            else:
+                for column, text in zip(columns, texts):
+                    column[position] = text
+        self._build(np.array(labels), columns)
+
+    def search(self, query, limit=50):
+        """Return up to limit index labels whose fields contain query, best matches first"""
+        query = str(query).strip().lower()
+        if not query or limit <= 0:
+            return []
+
+        results = []
+        seen = set()
+        for field_no in range(len(self.fields)):
+            for matches in (self._prefix_matches, self._substring_matches):
+                for label in matches(field_no, query, limit - len(results), seen):
+                    seen.add(label)
+                    results.append(label)
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def _prefix_matches(self, field_no, query, count, seen):
+        """Up to count unseen labels whose text starts with query, in sorted order"""
+        entries = self._sorted[field_no]
+        positions = self._sorted_positions[field_no]
+        matches = []
+        # Exact and prefix matches: a contiguous run of the sorted array
+        index = bisect.bisect_left(_ArrowStrings(entries), query)
+        while index < len(entries) and len(matches) < count:
+            text = entries[index].as_py()
+            if not text.startswith(query):
+                break
+            position = positions[index]
+            label = self._labels[position]
+            if not self._stale[position] and label not in seen:
+                matches.append((text, position, label))
+            index += 1
+
+        for label, texts in self._overlay.items():
+            text = texts[field_no]
+            if text.startswith(query) and label not in seen:
+                matches.append((text, self._overlay_position(label), label))
+        return [label for _, _, label in heapq.nsmallest(count, matches, key=lambda match: match[:2])]
+
+    def _substring_matches(self, field_no, query, count, seen):
+        """Up to count unseen labels containing query past its start, earliest and shortest first"""
+        texts = self._texts[field_no]
+        found = np.array(pc.find_substring(texts, query).to_numpy(zero_copy_only=False), dtype=np.int64)
+        positions = np.flatnonzero(found > 0)
+        positions = positions[~self._stale[positions]]
+
+        # find_substring counts bytes; texts with non-ASCII characters are measured again in characters
+        non_ascii = positions[~self._ascii[field_no][positions]]
+        for position in non_ascii:
+            found[position] = texts[int(position)].as_py().find(query)
+
+        # Keep enough of the best matches to fill count after dropping any already returned
+        wanted = count + len(seen)
+        offsets, lengths = found[positions], self._lengths[field_no][positions]
+        if len(positions) > wanted:
+            rank = offsets * (int(lengths.max()) + 1) + lengths
+            keep = rank <= np.partition(rank, wanted - 1)[wanted - 1]
+            positions, offsets, lengths = positions[keep], offsets[keep], lengths[keep]
+        order = np.lexsort((positions, lengths, offsets))[:wanted]
+        matches = [(int(offsets[i]), int(lengths[i]), int(positions[i]), self._labels[positions[i]])
+                   for i in order]
+
+        for label, overlay_texts in self._overlay.items():
+            text = overlay_texts[field_no]
+            offset = text.find(query)
+            if offset > 0:
+                matches.append((offset, len(text), self._overlay_position(label), label))
+        matches = [match for match in heapq.nsmallest(wanted, matches, key=lambda match: match[:3])
+                   if match[3] not in seen]
+        return [label for _, _, _, label in matches[:count]]
+
+    def _overlay_position(self, label):
+        """Where an overlay row sorts among equal matches: its old row, or after every row for a new one"""
+        position = self._position(label)
+        return len(self._labels) if position is None else position
+
+
+class _ArrowStrings:
+    """Sequence view of an Arrow string array, so bisect can search it"""
+
+    def __init__(self, array):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        return self.array[index].as_py()
@@ -0,0 +1,59 @@
+import datetime
+import decimal
+
+import numpy as np
+import orjson
+import pandas as pd
+from flask import Response
+
+# orjson writes NaN/Infinity as null; OPT_SERIALIZE_NUMPY covers numpy arrays and scalars
+DUMPS_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def column_values(series):
+    """Return a column as a list of plain Python values, with every kind of missing value as None"""
+    return series.to_numpy(dtype=object, na_value=None).tolist()
+
+
+def frame_records(df):
+    """Build the list-of-dicts payload for a frame, column by column rather than row by row"""
+    columns = [str(column) for column in df.columns]
+    values = [column_values(df[column]) for column in df.columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def frame_columnar(df):
+    """Build a {columns, rows} payload, which skips the per-row dicts entirely"""
+    values = [column_values(df[column]) for column in df.columns]
+    return {'columns': [str(column) for column in df.columns], 'rows': list(zip(*values))}
+
+
+def frame_payload(df, columnar=False):
+    return frame_columnar(df) if columnar else frame_records(df)
+
+
+def dumps(obj):
+    """Serialise to JSON bytes"""
+    return orjson.dumps(obj, default=_default, option=DUMPS_OPTIONS)
+
+
+def json_response(obj, status=200):
+    """Drop-in for jsonify() that goes through orjson"""
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+
+def ndjson_lines(records):
+    """Serialise records as newline-delimited JSON bytes"""
+    return b''.join(orjson.dumps(record, default=_default, option=DUMPS_OPTIONS) + b'\n' for record in records)
+
+
+def _default(value):
+    if isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date)):
+        return None if pd.isna(value) else value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if value is pd.NA or value is pd.NaT:
+        return None
+    return str(value)
@@ -0,0 +1,108 @@
+import logging
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+from sqlalchemy.sql import text
+
+from mls_columns import compact_frame, concat_compact
+from mls_snapshot import normalise_columns, normalise_column_name
+
+# Get logger from the main application
+logger = logging.getLogger(__name__)
+
+# Postgres type OIDs -> the Arrow type COPY's text for them is parsed as;
+# anything else is read as a string
+PG_ARROW_TYPES = {
+    16: pa.bool_(),  # bool
+    20: pa.int64(),  # int8
+    21: pa.int64(),  # int2
+    23: pa.int64(),  # int4
+    700: pa.float64(),  # float4
+    701: pa.float64(),  # float8
+    1700: pa.float64(),  # numeric
+    1082: pa.date32(),  # date
+    1114: pa.timestamp('us'),  # timestamp
+    1184: pa.timestamp('us', tz='UTC')  # timestamptz, written in UTC by copy_frame
+}
+
+
+def supports_copy(engine):
+    return engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2'
+
+
+def stream_frame(engine, query, chunk_size=20000, compact=True):
+    """Build a DataFrame from a query chunk by chunk over a server-side cursor
+
+    Only chunk_size raw rows are held at a time; each chunk is normalised
+    (and compacted) before the next one is fetched.
+    """
+    chunks = []
+    rows = 0
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunk_size) as conn:
+        for chunk in pd.read_sql_query(text(query), conn, chunksize=chunk_size):
+            chunk = normalise_columns(chunk)
+            chunks.append(compact_frame(chunk) if compact else chunk)
+            rows += len(chunk)
+            logger.debug("Loaded %s MLS points so far", rows)
+    return _concat(chunks, compact)
+
+
+def copy_frame(engine, query, compact=True, block_bytes=16 * 1024 * 1024, spool_bytes=64 * 1024 * 1024):
+    """Build a DataFrame from `COPY (query) TO STDOUT` instead of fetching rows through the driver
+
+    The CSV lands in a temp file (in memory up to spool_bytes) while the
+    connection is held, and is then parsed by Arrow in blocks of
+    block_bytes, straight into the column types Postgres reports.
+    """
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            # timestamptz comes out as UTC (+00), which Arrow parses; SET LOCAL ends with the rollback
+            cursor.execute("SET LOCAL TIME ZONE 'UTC'")
+            cursor.execute(f"SELECT * FROM ({query}) AS q LIMIT 0")
+            type_codes = {column.name: column.type_code for column in cursor.description}
+            output = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+            cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", output)
+        raw.rollback()
+    finally:
+        raw.close()
+
+    output.seek(0)
+    with output:
+        return read_copy_csv(output, type_codes, compact=compact, block_bytes=block_bytes)
+
+
+def read_copy_csv(source, type_codes, compact=True, block_bytes=16 * 1024 * 1024):
+    """Parse COPY ... (FORMAT csv, HEADER true) output given {column: Postgres type OID}
+
+    COPY writes NULL as an empty field and an empty string as "", so only
+    unquoted empty fields are read as nulls.
+    """
+    column_types = {name: PG_ARROW_TYPES.get(code, pa.string()) for name, code in type_codes.items()}
+    reader = pa_csv.open_csv(
+        source,
+        read_options=pa_csv.ReadOptions(block_size=block_bytes),
+        convert_options=pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True,
+                                              quoted_strings_can_be_null=False,
+                                              true_values=['t'], false_values=['f']))
+    chunks = []
+    rows = 0
+    for batch in reader:
+        chunk = normalise_columns(batch.to_pandas())
+        chunks.append(compact_frame(chunk) if compact else chunk)
+        rows += len(chunk)
+        logger.debug("Parsed %s MLS points from COPY so far", rows)
+
+    if not chunks:
+        return pd.DataFrame(columns=[normalise_column_name(name) for name in type_codes])
+    return _concat(chunks, compact)
+
+
+def _concat(chunks, compact):
+    if not chunks:
+        return pd.DataFrame()
+    if compact:
+        return concat_compact(chunks)
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,143 @@
+import atexit
+import copy
+import datetime
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+import orjson
+from flask import has_request_context, request
+
+# Attributes every LogRecord has; anything else was passed in `extra` and goes into the JSON output
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+_SAMPLED_KEY = 'mls.log_debug_sampled'
+
+# The listener started by the last configure_logging call
+_listener = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records logged during a request with its route, method and path
+
+    Runs in the logging thread, where the request is still at hand; the
+    listener thread that writes the record has no request context.
+    """
+
+    def filter(self, record):
+        if has_request_context():
+            rule = request.url_rule
+            record.route = rule.rule if rule is not None else None
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class DebugSampleFilter(logging.Filter):
+    """Keeps a request's DEBUG records only for a sampled share of requests per route
+
+    The choice is made once per request, so a sampled request keeps all of
+    its DEBUG lines and the rest keep none. rates maps route rules (e.g.
+    '/api/mls_points/<district>/<mandal>') to a share between 0 and 1;
+    other routes use default_rate. Records outside a request always pass.
+    """
+
+    def __init__(self, rates=None, default_rate=1.0):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or not has_request_context():
+            return True
+        environ = request.environ
+        sampled = environ.get(_SAMPLED_KEY)
+        if sampled is None:
+            rule = request.url_rule
+            rate = self.rates.get(rule.rule if rule is not None else None, self.default_rate)
+            sampled = environ[_SAMPLED_KEY] = rate >= 1 or random.random() < rate
+        return sampled
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request fields and any extras"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(
+                timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to a QueueListener with the message merged but not yet formatted
+
+    The stock QueueHandler runs the full formatter in the logging thread.
+    Here only the %-merge happens there, so later changes to the arguments
+    can't alter the line; the layout (text or JSON) and the write happen on
+    the listener thread.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level='INFO', json_output=False, use_queue=True, debug_sample_rates=None,
+                      debug_sample_rate=1.0, stream=None):
+    """Set up the root logger for the app; returns the QueueListener (None without a queue)
+
+    Records are filtered (level, DEBUG sampling) and stamped with request
+    fields in the logging thread, then written to stream (stderr by default)
+    by a background listener, so a request never waits on the write.
+    """
+    output = logging.StreamHandler(stream or sys.stderr)
+    if json_output:
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+    stop_listener()
+    handler = output
+    if use_queue:
+        global _listener
+        handler = DeferredQueueHandler(queue.SimpleQueue())
+        _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+    handler.addFilter(DebugSampleFilter(debug_sample_rates, debug_sample_rate))
+    if json_output:
+        # Only the JSON layout shows the request fields
+        handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    return _listener
+
+
+@atexit.register
+def stop_listener():
+    """Write out whatever is still queued and stop the listener thread, if one is running"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
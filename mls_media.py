@@ -0,0 +1,82 @@
+import hashlib
+import logging
+import math
+import os
+
+from PIL import Image, ImageOps
+
+# Get logger from the main application
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Image names the report has a slot for
+IMAGE_NAMES = [
+    'incharge_photo', 'deo_photo', 'contractor_photo',
+    'entrance', 'exit', 'loading_area', 'unloading_area', 'storage_1', 'storage_2'
+]
+
+
+class MediaLibrary:
+    """Photos and location images per MLS point, stored as <media_dir>/<mls_point_code>/<name>.<ext>
+
+    Full-resolution camera images are never embedded. thumbnail() returns a
+    JPEG already sized for its slot, kept in thumbnail_dir under a key made
+    from the source's path, size and mtime, so later renders (including the
+    export pool's worker processes) reuse it and replacing a photo makes a
+    new one.
+    """
+
+    def __init__(self, media_dir, thumbnail_dir, dpi=150, quality=80):
+        self.media_dir = media_dir
+        self.thumbnail_dir = thumbnail_dir
+        self.dpi = dpi
+        self.quality = quality
+        os.makedirs(thumbnail_dir, exist_ok=True)
+
+    def images(self, mls_code):
+        """Return {name: (path, size, mtime_ns)} for the images a point has"""
+        code = str(mls_code)
+        if not code or os.sep in code or code in ('.', '..'):
+            return {}
+
+        found = {}
+        try:
+            with os.scandir(os.path.join(self.media_dir, code)) as entries:
+                for entry in entries:
+                    name, extension = os.path.splitext(entry.name)
+                    if name in IMAGE_NAMES and extension.lower() in IMAGE_EXTENSIONS and entry.is_file():
+                        stat = entry.stat()
+                        found[name] = (entry.path, stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return {}
+        return found
+
+    def thumbnail(self, source, width, height):
+        """Return the path of a JPEG of source that fits width x height points at the configured dpi"""
+        path, size, mtime_ns = source
+        box = (math.ceil(width * self.dpi / 72), math.ceil(height * self.dpi / 72))
+        key = hashlib.sha1(f"{path}|{size}|{mtime_ns}|{box[0]}x{box[1]}|{self.quality}".encode()).hexdigest()
+        thumbnail_path = os.path.join(self.thumbnail_dir, f"{key}.jpg")
+        if os.path.exists(thumbnail_path):
+            return thumbnail_path
+
+        with Image.open(path) as image:
+            # Let the JPEG decoder scale down by powers of two while decoding;
+            # the larger side is used as EXIF rotation may swap the axes
+            side = max(box)
+            image.draft('RGB', (side, side))
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+            image.thumbnail(box, Image.LANCZOS)
+
+            tmp_path = f"{thumbnail_path}.{os.getpid()}.tmp"
+            image.save(tmp_path, 'JPEG', quality=self.quality, optimize=True)
+        os.replace(tmp_path, thumbnail_path)
+        return thumbnail_path
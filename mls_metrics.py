@@ -0,0 +1,210 @@
+import bisect
+import os
+import threading
+import time
+
+from flask import request
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds, in seconds, for request and query latencies
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Full table loads and change-feed polls run from milliseconds to minutes
+LOAD_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class MetricsRegistry:
+    """The metrics a process exposes, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            samples = list(metric.samples())
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+class Histogram:
+    """Observations counted into fixed buckets, per combination of label values
+
+    Label values are passed positionally, in labelnames order. An
+    observation is one bisect and a few additions under a lock.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def observe(self, value, *labels):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Bucket counts (the last one is +Inf), then the sum
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def time(self, *labels):
+        """Context manager that observes the seconds its block takes"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(snapshot):
+            named = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", named + [('le', bound)], cumulative
+            yield f"{self.name}_sum", named, total
+            yield f"{self.name}_count", named, cumulative
+
+
+class Gauge:
+    """A value that goes up and down, set directly or read from a function at scrape time
+
+    A function returns the value (or None to leave the gauge out), for
+    things like the snapshot's size that are cheaper to read when asked for.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._function = None
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            value = self._function()
+            if value is not None:
+                yield self.name, [], value
+            return
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield self.name, list(zip(self.labelnames, labels)), value
+
+
+class _Timer:
+    __slots__ = ('metric', 'labels', 'start')
+
+    def __init__(self, metric, labels):
+        self.metric = metric
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metric.observe(time.perf_counter() - self.start, *self.labels)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(_format_value(value) if name == "le" else value)}"'
+                          for name, value in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def resident_memory_bytes():
+    """This process's resident set size, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+REQUEST_SECONDS = Histogram('mls_http_request_duration_seconds',
+                            'Time to handle a request, up to the response headers of a streamed body',
+                            ('route', 'method', 'status'))
+STORE_QUERY_SECONDS = Histogram('mls_store_query_duration_seconds',
+                                'Time for one MlsPointStore read (DataFrame filters or SQL)',
+                                ('backend', 'operation'))
+PDF_RENDER_SECONDS = Histogram('mls_pdf_render_duration_seconds',
+                               'Time to render one report, split into drawing the pages and writing the PDF',
+                               ('phase',))
+DB_LOAD_SECONDS = Histogram('mls_db_load_duration_seconds',
+                            'Time to read mls_points: full loads and change-feed polls',
+                            ('kind',), buckets=LOAD_BUCKETS)
+SNAPSHOT_ROWS = Gauge('mls_snapshot_rows', 'MLS points in the live snapshot')
+SNAPSHOT_MEMORY_BYTES = Gauge('mls_snapshot_memory_bytes', 'Memory held by the live snapshot DataFrame')
+SNAPSHOT_SYNC_AGE_SECONDS = Gauge('mls_snapshot_sync_age_seconds',
+                                  'Seconds since the snapshot was last loaded or polled for changes')
+RESIDENT_MEMORY_BYTES = Gauge('process_resident_memory_bytes', 'Resident memory size in bytes')
+RESIDENT_MEMORY_BYTES.set_function(resident_memory_bytes)
+
+
+def track_requests(app, histogram=REQUEST_SECONDS):
+    """Time every request of a Flask app into histogram, labelled by route rule, method and status"""
+
+    # The start time rides in the WSGI environ: one proxy lookup per hook, half the cost of g
+    @app.before_request
+    def start_request_timer():
+        request.environ['mls.request_started'] = time.perf_counter()
+
+    @app.after_request
+    def observe_request_time(response):
+        environ = request.environ
+        started = environ.pop('mls.request_started', None)
+        if started is not None:
+            # The rule (e.g. /view_details/<mls_code>) rather than the path keeps the label set small
+            rule = request.url_rule
+            histogram.observe(time.perf_counter() - started, rule.rule if rule is not None else 'unmatched',
+                              environ['REQUEST_METHOD'], str(response.status_code))
+        return response
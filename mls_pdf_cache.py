@@ -0,0 +1,137 @@
+import glob
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+import orjson
+
+# Get logger from the main application
+logger = logging.getLogger(__name__)
+
+
+def content_digest(values):
+    """Short, stable hash of a JSON-serialisable value (dict keys in sorted order)"""
+    return hashlib.sha256(orjson.dumps(values, option=orjson.OPT_SORT_KEYS)).hexdigest()[:32]
+
+
+class PdfCache:
+    """Generated report bytes per MLS code, tagged with the digest of the fields they show
+
+    Only the latest version of each point is kept: a lookup with a different
+    digest is a miss, and storing a new version replaces the old one. The
+    memory tier is an LRU bounded by total bytes; the optional disk tier
+    (one file per point) survives restarts and is shared by workers that
+    point at the same directory.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=1024 * 1024, directory=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, mls_code, digest):
+        """Return the cached PDF bytes for this version of a point, or None"""
+        key = str(mls_code)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == digest:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        data = self._read_file(key, digest)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, digest, data)
+        return data
+
+    def put(self, mls_code, digest, data):
+        key = str(mls_code)
+        with self._lock:
+            self._store(key, digest, data)
+        self._write_file(key, digest, data)
+
+    def invalidate(self, mls_code):
+        """Drop every cached version of a point"""
+        key = str(mls_code)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= len(entry[1])
+        self._remove_files(key)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def _store(self, key, digest, data):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= len(old[1])
+        if len(data) > min(self.max_entry_bytes, self.max_bytes):
+            return
+        self._entries[key] = (digest, data)
+        self._size += len(data)
+        while self._size > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def _file_path(self, key, digest):
+        return os.path.join(self.directory, f"{_file_stem(key)}.{digest}.pdf")
+
+    def _read_file(self, key, digest):
+        if not self.directory:
+            return None
+        try:
+            with open(self._file_path(key, digest), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning("Could not read cached PDF for MLS code %s: %s", key, e)
+            return None
+
+    def _write_file(self, key, digest, data):
+        if not self.directory:
+            return
+        path = self._file_path(key, digest)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write cached PDF for MLS code %s: %s", key, e)
+            return
+        self._remove_files(key, keep=path)
+
+    def _remove_files(self, key, keep=None):
+        if not self.directory:
+            return
+        pattern = os.path.join(glob.escape(self.directory), f"{glob.escape(_file_stem(key))}.*.pdf")
+        for path in glob.glob(pattern):
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _file_stem(key):
+    # Dots are escaped too, so one code's files never match another code's pattern
+    return quote(key, safe='').replace('.', '%2E')
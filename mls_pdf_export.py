@@ -0,0 +1,142 @@
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pdf_generator import generate_mls_pdf, report_digest
+
+# Get logger from the main application
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_export_pool(processes=None):
+    """Return the process pool shared by every bulk export, starting it on first use
+
+    Workers are spawned rather than forked, so they never inherit the web
+    process's threads or locks; each one builds the PDF template once. A
+    spawned worker re-imports the script the app was started from as
+    __mp_main__, so app.py keeps its startup work out of that import.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=processes or os.cpu_count(),
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+class ExportProgress:
+    """Counters for one bulk export"""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.cached = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.done}/{self.total} reports ({self.cached} from cache) "
+                f"in {self.elapsed:.1f}s, {self.rate:.1f} points/s")
+
+
+def render_reports(records, pool, progress, max_in_flight=16, cache=None, media=None, progress_every=100):
+    """Yield (mls_code, pdf bytes) for each record, in order, rendering on the pool
+
+    At most max_in_flight reports are queued or held at once, so memory stays
+    flat however large the selection is and a slow reader holds the workers
+    back instead of piling up output.
+    """
+    records = iter(records)
+    pending = deque()
+
+    def submit_next():
+        mls_data = next(records, None)
+        if mls_data is None:
+            return False
+        code = mls_data.get('mls_point_code')
+        digest = report_digest(mls_data, media) if cache is not None else None
+        pdf_data = cache.get(code, digest) if cache is not None else None
+        if pdf_data is not None:
+            progress.cached += 1
+            pending.append((code, digest, None, pdf_data))
+        else:
+            pending.append((code, digest, pool.submit(generate_mls_pdf, mls_data, None, media), None))
+        return True
+
+    try:
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+        while pending:
+            code, digest, future, pdf_data = pending.popleft()
+            if future is not None:
+                pdf_data = future.result()
+                if cache is not None:
+                    cache.put(code, digest, pdf_data)
+            submit_next()
+
+            progress.done += 1
+            if progress.done % progress_every == 0 or progress.done == progress.total:
+                logger.info("Bulk PDF export: %s", progress.summary())
+            yield code, pdf_data
+    finally:
+        # The client went away or a render failed; don't leave queued work behind
+        for _, _, future, _ in pending:
+            if future is not None:
+                future.cancel()
+
+
+def report_filename(mls_code):
+    return f"MLS_Point_{re.sub(r'[^A-Za-z0-9_.-]', '_', str(mls_code))}.pdf"
+
+
+class _ZipSink:
+    """Write-only, unseekable file object that hands written bytes back in chunks"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def zip_stream(reports, progress=None):
+    """Yield a ZIP archive of (mls_code, pdf bytes) pairs piece by piece
+
+    PDF streams are already deflated, so entries are stored as-is. When
+    progress is given, an export_summary.txt entry closes the archive.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for code, pdf_data in reports:
+            archive.writestr(report_filename(code), pdf_data)
+            yield sink.drain()
+        if progress is not None:
+            archive.writestr('export_summary.txt', progress.summary() + '\n')
+    yield sink.drain()
@@ -0,0 +1,219 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from mls_metrics import PDF_RENDER_SECONDS
+from pdf_generator import generate_mls_pdf
+
+# Get logger from the main application
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while max_pending jobs are already waiting or running"""
+
+
+def timed_render(mls_data, media=None):
+    """Render one report in a pool worker; returns (pdf bytes, wall-clock start, render seconds, phase timings)"""
+    started_at = time.time()
+    start = time.perf_counter()
+    timings = {}
+    pdf_data = generate_mls_pdf(mls_data, media=media, timings=timings)
+    return pdf_data, started_at, time.perf_counter() - start, timings
+
+
+class PdfJob:
+    """One queued report and what happened to it"""
+
+    def __init__(self, mls_code, digest):
+        self.id = uuid.uuid4().hex
+        self.mls_code = mls_code
+        self.digest = digest
+        self.status = 'queued'
+        self.error = None
+        self.result = None
+        self.cached = False
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.render_seconds = None
+        self.future = None
+        self.finished = threading.Event()
+
+    def to_dict(self):
+        timing = {}
+        if self.started_at is not None:
+            timing['queue_seconds'] = round(self.started_at - self.submitted_at, 4)
+        if self.render_seconds is not None:
+            timing['render_seconds'] = round(self.render_seconds, 4)
+        if self.finished_at is not None:
+            timing['total_seconds'] = round(self.finished_at - self.submitted_at, 4)
+        return {
+            'job_id': self.id,
+            'mls_code': self.mls_code,
+            'status': 'running' if self.status == 'queued' and self.future is not None and self.future.running()
+            else self.status,
+            'error': self.error,
+            'cached': self.cached,
+            'size': len(self.result) if self.result is not None else None,
+            'timing': timing
+        }
+
+
+class PdfJobQueue:
+    """Background PDF rendering with a bounded backlog
+
+    Jobs are rendered on a process pool and tracked in this process's
+    memory, so under several workers a client has to poll the worker that
+    accepted its job (e.g. with sticky sessions). Finished jobs are kept
+    for result_ttl_seconds for the client to download, and at most
+    max_results of them holding at most max_result_bytes of PDFs in all;
+    past either limit the oldest are dropped first. A submission the PDF
+    cache can answer is refused like any other while max_pending jobs are
+    waiting or running.
+    """
+
+    def __init__(self, get_pool, max_pending=50, result_ttl_seconds=600, cache=None, media=None,
+                 max_results=500, max_result_bytes=256 * 1024 * 1024):
+        self.get_pool = get_pool
+        self.media = media
+        self.max_pending = max_pending
+        self.result_ttl_seconds = result_ttl_seconds
+        self.max_results = max_results
+        self.max_result_bytes = max_result_bytes
+        self.cache = cache
+        self._jobs = {}
+        # Finished job id -> result size, oldest first
+        self._finished = OrderedDict()
+        self._result_bytes = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._failed = 0
+        self._queue_seconds_total = 0.0
+        self._render_seconds_total = 0.0
+
+    def submit(self, mls_code, mls_data, digest=None):
+        """Queue a report; raises QueueFull if the backlog is at max_pending"""
+        self._expire()
+        job = PdfJob(mls_code, digest)
+
+        # Cache hits are turned away too, so a full queue sheds all new work
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"{self._pending} PDF jobs already pending")
+
+        pdf_data = self.cache.get(mls_code, digest) if self.cache is not None and digest else None
+        if pdf_data is not None:
+            job.cached = True
+            job.started_at = job.submitted_at
+            job.render_seconds = 0.0
+            with self._lock:
+                self._jobs[job.id] = job
+            self._finish(job, result=pdf_data)
+            return job
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"{self._pending} PDF jobs already pending")
+            self._pending += 1
+            self._jobs[job.id] = job
+
+        try:
+            future = self.get_pool().submit(timed_render, mls_data, self.media)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                del self._jobs[job.id]
+            raise
+        job.future = future
+        future.add_done_callback(lambda done: self._on_done(job, done))
+        return job
+
+    def get(self, job_id):
+        self._expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        """Queue depth and average timings since startup"""
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'jobs': len(self._jobs),
+                'results': len(self._finished),
+                'result_bytes': self._result_bytes,
+                'completed': self._completed,
+                'failed': self._failed,
+                'avg_queue_seconds': round(self._queue_seconds_total / finished, 4) if finished else None,
+                'avg_render_seconds': round(self._render_seconds_total / finished, 4) if finished else None
+            }
+
+    def _on_done(self, job, future):
+        with self._lock:
+            self._pending -= 1
+
+        if future.cancelled():
+            self._finish(job, error='cancelled')
+            return
+        error = future.exception()
+        if error is not None:
+            logger.error("PDF job %s for MLS code %s failed: %s", job.id, job.mls_code, error)
+            self._finish(job, error=str(error))
+            return
+
+        pdf_data, job.started_at, job.render_seconds, timings = future.result()
+        # Observed here, as the worker process's metrics are never scraped
+        for phase, seconds in timings.items():
+            PDF_RENDER_SECONDS.observe(seconds, phase)
+        if self.cache is not None and job.digest:
+            self.cache.put(job.mls_code, job.digest, pdf_data)
+        self._finish(job, result=pdf_data)
+
+    def _finish(self, job, result=None, error=None):
+        job.finished_at = time.time()
+        if job.started_at is None:
+            job.started_at = job.finished_at
+        job.result = result
+        job.error = error
+        job.status = 'failed' if error is not None else 'done'
+        with self._lock:
+            if error is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+            self._queue_seconds_total += job.started_at - job.submitted_at
+            self._render_seconds_total += job.render_seconds or 0.0
+            if job.id in self._jobs:
+                size = len(result) if result is not None else 0
+                self._finished[job.id] = size
+                self._result_bytes += size
+                self._evict()
+        job.finished.set()
+        logger.info("PDF job %s for MLS code %s %s in %.3fs",
+                    job.id, job.mls_code, job.status, job.finished_at - job.submitted_at)
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl_seconds
+        with self._lock:
+            # _finished is in finishing order, so the expired jobs are at the front
+            while self._finished and self._jobs[next(iter(self._finished))].finished_at < cutoff:
+                self._drop_oldest()
+
+    def _evict(self):
+        """Drop the oldest finished jobs until the rest fit max_results and max_result_bytes; call with _lock held"""
+        while self._finished and (len(self._finished) > self.max_results
+                                  or self._result_bytes > self.max_result_bytes):
+            job_id, size = next(iter(self._finished.items()))
+            logger.debug("Dropping PDF job %s (%s bytes) to stay within the result limits", job_id, size)
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        job_id, size = self._finished.popitem(last=False)
+        self._result_bytes -= size
+        # A download that already holds the job keeps its bytes until it is sent
+        del self._jobs[job_id]
@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+# Get logger from the main application
+logger = logging.getLogger(__name__)
+
+
+class SharedSnapshotStore:
+    """Generation files of mls_points in Arrow IPC format, shared by all workers
+
+    One process (whoever holds the loader lock) publishes a full copy of the
+    table as an uncompressed Arrow file and then flips the CURRENT pointer
+    with an atomic rename. Every worker memory-maps the current file
+    read-only, so the column data lives once in the page cache rather than
+    once per worker.
+    """
+
+    POINTER_NAME = 'CURRENT'
+    LOCK_NAME = '.loader.lock'
+
+    def __init__(self, directory, keep_generations=2):
+        self.directory = directory
+        self.keep_generations = keep_generations
+        self._lock_file = None
+        os.makedirs(directory, exist_ok=True)
+
+    def try_acquire_loader(self):
+        """Take the loader role without blocking; returns True if this process holds it"""
+        if self._lock_file is not None:
+            return True
+
+        import fcntl
+
+        lock_file = open(os.path.join(self.directory, self.LOCK_NAME), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        # Held for the life of the process; the OS drops it if the process dies
+        self._lock_file = lock_file
+        logger.info("Process %s is the shared snapshot loader", os.getpid())
+        return True
+
+    def publish(self, df):
+        """Write df as a new generation and make it current; returns its path"""
+        generation = time.time_ns()
+        name = f"mls_points.{generation}.arrow"
+        path = os.path.join(self.directory, name)
+        tmp_path = path + '.tmp'
+
+        table = _to_arrow_table(df)
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+        pointer_tmp = os.path.join(self.directory, f"{self.POINTER_NAME}.{generation}.tmp")
+        with open(pointer_tmp, 'w') as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer_tmp, os.path.join(self.directory, self.POINTER_NAME))
+
+        logger.info("Published shared snapshot generation %s with %s rows", name, table.num_rows)
+        self._prune(keep=name)
+        return path
+
+    def current_path(self):
+        """Return the path of the current generation file, or None if nothing is published"""
+        try:
+            with open(os.path.join(self.directory, self.POINTER_NAME)) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return os.path.join(self.directory, name) if name else None
+
+    def wait_for_current(self, timeout_seconds=120, poll_seconds=0.5):
+        """Block until a generation is published, for workers that lost the loader race"""
+        deadline = time.monotonic() + timeout_seconds
+        while time.monotonic() < deadline:
+            path = self.current_path()
+            if path is not None and os.path.exists(path):
+                return path
+            time.sleep(poll_seconds)
+        return None
+
+    @staticmethod
+    def open(path):
+        """Memory-map a generation file read-only and wrap it as a DataFrame"""
+        source = pa.memory_map(path, 'r')
+        table = pa.ipc.open_file(source).read_all()
+        # ArrowDtype keeps the columns pointing at the mapped buffers
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    def _prune(self, keep):
+        generations = sorted(name for name in os.listdir(self.directory)
+                             if name.startswith('mls_points.') and name.endswith('.arrow'))
+        for name in generations[:-self.keep_generations]:
+            if name == keep:
+                continue
+            # Workers still mapping an old generation keep their pages until they swap
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError as e:
+                logger.warning("Could not remove old snapshot generation %s: %s", name, e)
+
+
+class SharedSnapshotFollower(threading.Thread):
+    """Background thread that swaps to a newly published generation file
+
+    on_new_frame is called with the mapped DataFrame and the generation path.
+    """
+
+    def __init__(self, store, on_new_frame, poll_seconds=5, current_path=None):
+        super().__init__(name='mls-shared-snapshot-follower', daemon=True)
+        self.store = store
+        self.on_new_frame = on_new_frame
+        self.poll_seconds = poll_seconds
+        self.current_path = current_path
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.poll_seconds):
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error("Shared snapshot follow failed: %s", e)
+
+    def poll_once(self):
+        """Swap to the published generation if it moved; returns True if it did"""
+        path = self.store.current_path()
+        if path is None or path == self.current_path:
+            return False
+
+        df = self.store.open(path)
+        self.on_new_frame(df, path)
+        self.current_path = path
+        logger.info("Switched to shared snapshot generation %s", os.path.basename(path))
+        return True
+
+
+def _to_arrow_table(df):
+    arrays = []
+    for column in df.columns:
+        try:
+            arrays.append(pa.array(df[column], from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Object columns with mixed values (e.g. a form string written into
+            # a numeric column) are stored as text
+            arrays.append(pa.array([None if pd.isna(value) else str(value) for value in df[column]]))
+    return pa.Table.from_arrays(arrays, names=[str(column) for column in df.columns])
@@ -0,0 +1,451 @@
+import datetime
+import logging
+import random
+import threading
+import time
+import uuid
+import zlib
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+
+from mls_columns import append_compact, encode_value
+from mls_geo import ClusterIndex, SpatialIndex
+from mls_metrics import DB_LOAD_SECONDS
+from mls_index import CodeIndex, PointHierarchy, SearchIndex
+
+COORDINATE_COLUMNS = ('mls_point_latitude', 'mls_point_longitude')
+
+# Columns the map clusters are built from; editing any of them drops the cached cluster indexes
+CLUSTER_COLUMNS = COORDINATE_COLUMNS + ('storage_capacity_mts', 'district_name', 'mandal_name')
+
+# Cluster indexes kept for district/mandal selections, besides the whole-state one
+MAX_CLUSTER_SELECTIONS = 32
+
+# Get logger from the main application
+logger = logging.getLogger(__name__)
+
+
+def normalise_columns(df):
+    """Lower-case column names and strip spaces/dots, as the routes expect"""
+    df.columns = df.columns.str.lower().str.replace(' ', '_').str.replace('.', '')
+    return df
+
+
+def normalise_column_name(name):
+    return name.lower().replace(' ', '_').replace('.', '')
+
+
+class MlsSnapshot:
+    """In-memory copy of mls_points plus the lookup indexes built over it
+
+    Writers (update_details and the change-feed refresher) hold `lock` while
+    they touch the frame and its indexes, and readers hold it while they pull
+    rows out, so an edit being applied is never seen half-done.
+
+    `generation` goes up on every change. The ETag of the read APIs is
+    taken from the data instead, so every worker holding the same rows hands
+    out the same one: the row count and the latest watermark_column value,
+    plus a digest of the rows edited here while the change feed has yet to
+    bring them back, so workers holding different edits never share one.
+    Without that column it falls back to a token per process.
+    """
+
+    def __init__(self, df, search_fields=('mls_point_code',), watermark_column='updated_at'):
+        self.lock = threading.RLock()
+        self.search_fields = tuple(search_fields)
+        self.watermark_column = watermark_column
+        self.generation = 0
+        self._memory_bytes = None
+        self._rebuild(df)
+
+    def _rebuild(self, df):
+        self.df = df
+        self._stamp = self._latest_stamp(df)
+        # Codes edited here whose new stamps the change feed has not brought back yet
+        self._pending_codes = set()
+        self._pending_digest = None
+        self._token = uuid.uuid4().hex[:12] if self._stamp is None else None
+        self.code_index = CodeIndex(df)
+        self.hierarchy = PointHierarchy(df)
+        self.search_index = SearchIndex(df, fields=self.search_fields)
+        self._spatial_index = SpatialIndex(df)
+        self._cluster_indexes = {(None, None): ClusterIndex(df)}
+        self._code_ranks = None
+        self._touch()
+        self.mark_synced()
+
+    @property
+    def spatial_index(self):
+        """Grid index over the coordinates, rebuilt on first use after a point moves"""
+        with self.lock:
+            if self._spatial_index is None:
+                self._spatial_index = SpatialIndex(self.df)
+            return self._spatial_index
+
+    def cluster_index(self, district=None, mandal=None):
+        """Map clusters for the whole state, a district or one of its mandals, built on first use"""
+        key = (district or None, (mandal or None) if district else None)
+        with self.lock:
+            index = self._cluster_indexes.get(key)
+            if index is None:
+                if key[0] is None:
+                    labels = self.df.index
+                elif key[1] is None:
+                    labels = [label for mandal in self.hierarchy.mandals(key[0])
+                              for label in self.hierarchy.point_labels(key[0], mandal)]
+                else:
+                    labels = self.hierarchy.point_labels(*key)
+                index = ClusterIndex(self.df.loc[labels])
+                selections = [selection for selection in self._cluster_indexes if selection != (None, None)]
+                if key != (None, None) and len(selections) >= MAX_CLUSTER_SELECTIONS:
+                    del self._cluster_indexes[selections[0]]
+                self._cluster_indexes[key] = index
+            return index
+
+    def sort_by_code(self, labels):
+        """Return labels in mls_point_code order, the order SqlPointStore pages in
+
+        Equal codes keep their table order. The rank of every row is worked
+        out on first use and again after codes change or rows are added.
+        """
+        with self.lock:
+            if self._code_ranks is None:
+                codes = self.df['mls_point_code']
+                if not pd.api.types.is_numeric_dtype(codes.dtype):
+                    codes = codes.where(codes.isna(), codes.astype(str))
+                # Missing codes go last, as NULLs do in an ascending ORDER BY
+                order = codes.reset_index(drop=True).sort_values(kind='stable', na_position='last').index
+                ranks = np.empty(len(order), dtype=np.int64)
+                ranks[order.to_numpy()] = np.arange(len(order))
+                self._code_ranks = pd.Series(ranks, index=self.df.index)
+            ranks = self._code_ranks.loc[labels].to_numpy()
+            return [labels[i] for i in np.argsort(ranks, kind='stable')]
+
+    def _touch(self):
+        self.generation += 1
+        # Kept to the microsecond; Last-Modified rounds it down to the second
+        self.modified_at = datetime.datetime.now(datetime.timezone.utc)
+
+    def _latest_stamp(self, df):
+        if self.watermark_column not in df.columns:
+            return None
+        stamps = df[self.watermark_column].dropna()
+        return stamps.max() if not stamps.empty else None
+
+    @property
+    def etag(self):
+        with self.lock:
+            if self._token is not None:
+                return f"{self._token}-{self.generation}"
+            version = f"{len(self.df):x}-{zlib.crc32(str(self._stamp).encode()):08x}"
+            return f"{version}-{self._edited_rows_digest()}" if self._pending_codes else version
+
+    def _edited_rows_digest(self):
+        """crc32 of the codes and current values of the rows in _pending_codes, once per generation"""
+        if self._pending_digest is None or self._pending_digest[0] != self.generation:
+            codes = sorted(self._pending_codes)
+            labels = [label for label in map(self.code_index.get, codes) if label is not None]
+            rows = self.df.loc[labels].astype(str).to_numpy().tolist()
+            self._pending_digest = (self.generation, zlib.crc32(repr((codes, rows)).encode()))
+        return f"{self._pending_digest[1]:08x}"
+
+    def mark_synced(self):
+        """Record that the snapshot was just loaded or checked against Postgres"""
+        self.synced_at = time.monotonic()
+
+    @property
+    def synced_age(self):
+        """Seconds since the last load or successful change-feed poll"""
+        return time.monotonic() - self.synced_at
+
+    def memory_bytes(self):
+        """Deep memory use of the frame, measured once per generation"""
+        with self.lock:
+            if self._memory_bytes is None or self._memory_bytes[0] != self.generation:
+                self._memory_bytes = (self.generation, int(self.df.memory_usage(deep=True).sum()))
+            return self._memory_bytes[1]
+
+    def get_record(self, mls_code):
+        """Return the row for an MLS code as a Series, or None if it is unknown"""
+        with self.lock:
+            label = self.code_index.get(mls_code)
+            if label is None:
+                return None
+            return self.df.loc[label]
+
+    def filter_labels(self, district='All', mandal='All'):
+        """Return the index labels of rows matching a district/mandal filter, without copying the frame"""
+        with self.lock:
+            if district != 'All' and mandal != 'All':
+                return list(self.hierarchy.point_labels(district, mandal))
+
+            df = self.df
+            mask = np.ones(len(df), dtype=bool)
+            if district != 'All':
+                mask &= (df['district_name'] == district).to_numpy(dtype=bool, na_value=False)
+            if mandal != 'All':
+                mask &= (df['mandal_name'] == mandal).to_numpy(dtype=bool, na_value=False)
+            return df.index[mask].tolist()
+
+    def update_row(self, label, values):
+        """Write column values into one row and keep the indexes in step"""
+        self.update_rows({label: values})
+
+    def update_rows(self, updates):
+        """Write {label: {column: value}} edits for many rows at once and keep the indexes in step
+
+        Each column is assigned for all of its edited rows in one go rather
+        than cell by cell.
+        """
+        with self.lock:
+            codes = self._update_rows(updates)
+            if codes:
+                self._pending_codes.update(codes)
+                self._touch()
+
+    def _update_rows(self, updates):
+        """Apply edits without touching the generation; returns the codes of the edited rows"""
+        with self.lock:
+            df = self.df
+            updates = {label: {key: value for key, value in values.items() if key in df.columns}
+                       for label, values in updates.items()}
+            updates = {label: values for label, values in updates.items() if values}
+            if not updates:
+                return []
+
+            labels = list(updates)
+            old_rows = df.loc[labels, ['mls_point_code', 'district_name', 'mandal_name']].to_dict('index')
+
+            by_column = {}
+            for label, values in updates.items():
+                for key, value in values.items():
+                    by_column.setdefault(key, ([], []))
+                    by_column[key][0].append(label)
+                    by_column[key][1].append(encode_value(df[key], value))
+
+            for key, (column_labels, column_values) in by_column.items():
+                try:
+                    df.loc[column_labels, key] = column_values
+                except (TypeError, ValueError):
+                    # Form values arrive as strings; make room in a categorical,
+                    # or widen any other typed column, rather than drop the edit
+                    if isinstance(df[key].dtype, pd.CategoricalDtype):
+                        new_values = [value for value in set(column_values)
+                                      if not pd.isna(value) and value not in df[key].cat.categories]
+                        df[key] = df[key].cat.add_categories(new_values)
+                    else:
+                        df[key] = df[key].astype(object)
+                    df.loc[column_labels, key] = column_values
+
+            edited = set(by_column)
+            for label, old in old_rows.items():
+                new_code = df.at[label, 'mls_point_code']
+                if str(new_code) != str(old['mls_point_code']):
+                    self.code_index.discard(old['mls_point_code'])
+                    self.code_index.set(new_code, label)
+
+                self.hierarchy.move(label, old['district_name'], old['mandal_name'],
+                                    df.at[label, 'district_name'], df.at[label, 'mandal_name'])
+
+                if any(field in updates[label] for field in self.search_fields):
+                    self.search_index.update(label, df.loc[label].to_dict())
+
+            if any(column in edited for column in COORDINATE_COLUMNS):
+                self._spatial_index = None
+            if any(column in edited for column in CLUSTER_COLUMNS):
+                self._cluster_indexes = {}
+            if 'mls_point_code' in edited:
+                self._code_ranks = None
+
+            return [str(df.at[label, 'mls_point_code']) for label in labels]
+
+    def apply_changes(self, changed_df):
+        """Upsert rows pulled from the change feed, all under one lock hold"""
+        if changed_df.empty:
+            return 0
+
+        with self.lock:
+            if self.df.empty:
+                self._rebuild(changed_df.reset_index(drop=True))
+                return len(changed_df)
+
+            new_rows, updates = [], {}
+            for row in changed_df.to_dict('records'):
+                label = self.code_index.get(row.get('mls_point_code'))
+                if label is None:
+                    new_rows.append(row)
+                else:
+                    updates[label] = row
+            self._update_rows(updates)
+
+            if new_rows:
+                start = self.df.index.max() + 1
+                new_df = pd.DataFrame(new_rows, index=range(start, start + len(new_rows)))
+                self.df = append_compact(self.df, new_df)
+                for label, row in zip(new_df.index, new_rows):
+                    self.code_index.set(row.get('mls_point_code'), label)
+                    self.hierarchy.move(label, None, None, row.get('district_name'), row.get('mandal_name'))
+                    self.search_index.update(label, row)
+                self._spatial_index = None
+                self._cluster_indexes = {}
+                self._code_ranks = None
+
+            stamp = self._latest_stamp(changed_df)
+            if stamp is not None and (self._stamp is None or stamp > self._stamp):
+                self._stamp = stamp
+            self._pending_codes -= set(changed_df['mls_point_code'].astype(str))
+            self._touch()
+            return len(changed_df)
+
+
+class SnapshotRefresher(threading.Thread):
+    """Background thread that pulls rows changed since a watermark into the live snapshot
+
+    Relies on a timestamp column (``updated_at`` by default) that every
+    write bumps; see sql/mls_points_updated_at.sql for the trigger. Each
+    poll reads from overlap_seconds behind the watermark, since a
+    transaction that commits after a poll can carry an earlier timestamp
+    than rows already seen, and skips rows already applied at the same
+    timestamp. columns (a list of quoted column names, or a function
+    returning one) limits what a poll reads; by default every column.
+    Rows deleted in Postgres are not picked up; they drop out on the next
+    full load.
+    """
+
+    def __init__(self, engine, get_snapshot, interval_seconds=30, watermark_column='updated_at',
+                 on_applied=None, columns=None, overlap_seconds=60):
+        super().__init__(name='mls-snapshot-refresher', daemon=True)
+        self.engine = engine
+        self.get_snapshot = get_snapshot
+        self.interval_seconds = interval_seconds
+        self.watermark_column = watermark_column
+        self.on_applied = on_applied
+        self.columns = columns
+        self.overlap_seconds = overlap_seconds
+        self.watermark = None
+        # mls_point_code -> watermark value of the rows applied inside the overlap window
+        self._applied = {}
+        self._stop_event = threading.Event()
+        self._warned_missing = False
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        logger.info("Snapshot refresher started, polling every %ss", self.interval_seconds)
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                self.refresh_once()
+            except Exception as e:
+                logger.error("Snapshot refresh failed: %s", e)
+
+    def refresh_once(self):
+        """Fetch and apply one batch of changes; returns the number of rows applied"""
+        snapshot = self.get_snapshot()
+        if self.watermark is None:
+            self._start_from(snapshot.df)
+            if self.watermark is None:
+                return 0
+
+        columns = self.columns() if callable(self.columns) else self.columns
+        projection = ', '.join(columns) if columns else '*'
+        query = text(f"SELECT {projection} FROM mls_points WHERE {self.watermark_column} >= :since "
+                     f"ORDER BY {self.watermark_column}")
+        with DB_LOAD_SECONDS.time('refresh'), self.engine.connect() as conn:
+            changed_df = normalise_columns(pd.read_sql_query(query, conn, params={'since': self._since()}))
+
+        codes = changed_df['mls_point_code'].astype(str)
+        stamps = changed_df[self.watermark_column].map(self._to_param)
+        applied = [self._applied.get(code) == stamp for code, stamp in zip(codes, stamps)]
+        changed_df = changed_df[~np.array(applied, dtype=bool)]
+        if changed_df.empty:
+            snapshot.mark_synced()
+            return 0
+
+        applied = snapshot.apply_changes(changed_df)
+        snapshot.mark_synced()
+        self._advance(changed_df)
+        logger.info("Applied %s changed MLS points, watermark now %s", applied, self.watermark)
+        if self.on_applied is not None:
+            self.on_applied(snapshot)
+        return applied
+
+    def _since(self):
+        """Where the next poll starts: the watermark less the overlap, for timestamp watermarks"""
+        if self.overlap_seconds and isinstance(self.watermark, datetime.datetime):
+            return self.watermark - datetime.timedelta(seconds=self.overlap_seconds)
+        return self.watermark
+
+    def _start_from(self, df):
+        if self.watermark_column not in df.columns or df[self.watermark_column].dropna().empty:
+            if not self._warned_missing:
+                logger.warning("No '%s' values in mls_points; change feed is idle", self.watermark_column)
+                self._warned_missing = True
+            return
+        self._applied = {}
+        self._advance(df)
+
+    def _advance(self, changed_df):
+        stamps = changed_df[self.watermark_column].dropna().map(self._to_param)
+        # map() turns datetimes back into Timestamps, which not every driver binds
+        watermark = self._to_param(stamps.max())
+        if self.watermark is None or watermark > self.watermark:
+            self.watermark = watermark
+        since = self._since()
+        recent = stamps[stamps >= since]
+        self._applied = {code: stamp for code, stamp in self._applied.items() if stamp >= since}
+        self._applied.update(zip(changed_df.loc[recent.index, 'mls_point_code'].astype(str), recent))
+
+    @staticmethod
+    def _to_param(value):
+        """A watermark value as a query parameter; SQLite hands timestamps back as ISO text"""
+        if isinstance(value, pd.Timestamp):
+            return value.to_pydatetime()
+        if isinstance(value, str):
+            try:
+                return datetime.datetime.fromisoformat(value)
+            except ValueError:
+                return value
+        return value
+
+
+class SnapshotLoader(threading.Thread):
+    """Runs the first snapshot load off the import path, retrying with capped, jittered backoff"""
+
+    def __init__(self, load, on_loaded=None, initial_delay_seconds=1, max_delay_seconds=60):
+        super().__init__(name='mls-snapshot-loader', daemon=True)
+        self.load = load
+        self.on_loaded = on_loaded
+        self.initial_delay_seconds = initial_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.attempts = 0
+        self.last_error = None
+        self.ready = threading.Event()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        delay = self.initial_delay_seconds
+        while not self._stop_event.is_set():
+            self.attempts += 1
+            try:
+                self.load()
+            except Exception as e:
+                self.last_error = str(e)
+                wait = delay * random.uniform(0.5, 1.0)
+                logger.error("Snapshot load attempt %s failed, retrying in %.1fs: %s", self.attempts, wait, e)
+                if self._stop_event.wait(wait):
+                    return
+                delay = min(delay * 2, self.max_delay_seconds)
+                continue
+
+            self.last_error = None
+            self.ready.set()
+            logger.info("Snapshot ready after %s attempt(s)", self.attempts)
+            if self.on_loaded is not None:
+                self.on_loaded()
+            return
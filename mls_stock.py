@@ -0,0 +1,342 @@
+import datetime
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+
+# Get logger from the main application
+logger = logging.getLogger(__name__)
+
+# Rows of the report's commodity tables, in print order
+COMMODITIES = [
+    "Fortified Rice", "Fine Quality Rice", "Sugar", "P. Oil ½ Ltr.",
+    "P. Oil 1 Ltr.", "RG Dall 1Kg Pkts.", "RG Dall", "Jowar",
+    "Ragi", "Jaggery Powder", "Ragi Powder", "3 Kg THR Rice Pkts."
+]
+
+# The report month plus the six before it
+HISTORY_MONTHS = 6
+
+STOCK_FIELDS = ['opening', 'receipts', 'issues', 'closing']
+
+
+class StockSummary:
+    """Opening balance, receipts, issues and closing balance per point, commodity and month
+
+    Covers the report month and the HISTORY_MONTHS before it for every point
+    at once. Values are held as (keys x months) arrays, oldest month first,
+    with keys a sorted (mls_point_code, commodity) index.
+    """
+
+    def __init__(self, month, keys, receipts, issues, prior):
+        self.month = month
+        self.months = pd.period_range(end=month, periods=HISTORY_MONTHS + 1, freq='M')
+        self.keys = keys
+        net = receipts - issues
+        self.receipts = receipts
+        self.issues = issues
+        # Balance carried in from before the window, then month by month
+        self.closing = prior[:, None] + np.cumsum(net, axis=1)
+        self.opening = self.closing - net
+
+    @classmethod
+    def from_buckets(cls, month, buckets, carried=None):
+        """Build from grouped ledger sums; bucket -1 is everything before the window, 0.. the months in it
+
+        carried, a Series of balances at the start of the window by
+        (mls_point_code, commodity), stands in for bucket -1.
+        """
+        n_months = HISTORY_MONTHS + 1
+        if carried is not None:
+            carried = carried.rename('receipts').reset_index().assign(bucket=-1, issues=0.0)
+            buckets = pd.concat([carried, buckets], ignore_index=True) if not buckets.empty else carried
+        if buckets.empty:
+            keys = pd.MultiIndex.from_tuples([], names=['mls_point_code', 'commodity'])
+            empty = np.zeros((0, n_months))
+            return cls(month, keys, empty, empty.copy(), np.zeros(0))
+
+        buckets = buckets.assign(mls_point_code=buckets['mls_point_code'].astype(str),
+                                 receipts=buckets['receipts'].astype(float),
+                                 issues=buckets['issues'].astype(float))
+        keys = pd.MultiIndex.from_frame(buckets[['mls_point_code', 'commodity']].drop_duplicates()).sort_values()
+        rows = keys.get_indexer(pd.MultiIndex.from_frame(buckets[['mls_point_code', 'commodity']]))
+        columns = buckets['bucket'].to_numpy(dtype=int)
+
+        receipts = np.zeros((len(keys), n_months))
+        issues = np.zeros((len(keys), n_months))
+        prior = np.zeros(len(keys))
+        in_window = columns >= 0
+        np.add.at(receipts, (rows[in_window], columns[in_window]), buckets['receipts'].to_numpy()[in_window])
+        np.add.at(issues, (rows[in_window], columns[in_window]), buckets['issues'].to_numpy()[in_window])
+        np.add.at(prior, rows[~in_window],
+                  buckets['receipts'].to_numpy()[~in_window] - buckets['issues'].to_numpy()[~in_window])
+        return cls(month, keys, receipts, issues, prior)
+
+    def opening_balances(self, column):
+        """Balances at the start of months[column], as a Series by (mls_point_code, commodity)"""
+        return pd.Series(self.opening[:, column], index=self.keys)
+
+    def _point_rows(self, mls_code):
+        """Return {commodity: row} for one point"""
+        code = str(mls_code)
+        try:
+            positions = self.keys.get_loc(code)
+        except KeyError:
+            return {}
+        if isinstance(positions, slice):
+            positions = range(*positions.indices(len(self.keys)))
+        return {self.keys[row][1]: row for row in positions}
+
+    def point_table(self, mls_code):
+        """A point's movements as JSON-ready rows, one per commodity, newest month first"""
+        table = []
+        for commodity, row in self._point_rows(mls_code).items():
+            months = []
+            for column in range(len(self.months) - 1, -1, -1):
+                months.append({
+                    'month': str(self.months[column]),
+                    'opening': float(self.opening[row, column]),
+                    'receipts': float(self.receipts[row, column]),
+                    'issues': float(self.issues[row, column]),
+                    'closing': float(self.closing[row, column])
+                })
+            table.append({'commodity': commodity, 'months': months})
+        return table
+
+    def report_fields(self, mls_code):
+        """Flat stock_<months back>_<commodity no.>_<field> values for the PDF's commodity tables"""
+        fields = {}
+        rows = self._point_rows(mls_code)
+        last = len(self.months) - 1
+        for number, commodity in enumerate(COMMODITIES, 1):
+            row = rows.get(commodity)
+            if row is None:
+                continue
+            for back in range(HISTORY_MONTHS + 1):
+                column = last - back
+                for name in STOCK_FIELDS:
+                    fields[f"stock_{back}_{number}_{name}"] = format_quantity(getattr(self, name)[row, column])
+        return fields
+
+
+class StockLedgerUnavailable(Exception):
+    """The ledger query failed recently; raised without querying again until the backoff ends"""
+
+
+class StockLedger:
+    """Loads StockSummary objects from the mls_stock_ledger table and caches them per month
+
+    A summary for a closed month never changes and is kept until evicted;
+    the current month's is recomputed once it is older than
+    current_month_ttl_seconds, as movements are still being recorded, and
+    the previous one is served while that runs. Each month is computed by
+    one thread at a time, without holding up reads of other months.
+
+    Every summary carries forward the opening balances of its months, so a
+    later summary whose window starts at one of them only scans movements
+    from there on instead of the whole history. A failed query is cached
+    too: callers get StockLedgerUnavailable until a backoff (doubling from
+    retry_initial_seconds to retry_max_seconds) runs out.
+
+    The ledger is append-only (sql/mls_stock_ledger.sql), but a movement can
+    be backdated. At most every check_interval_seconds the rows recorded
+    since the last check are read, re-reading the last overlap_seconds for
+    transactions that committed late. The summaries and openings from the
+    month of the earliest movement among them onwards are then dropped.
+    """
+
+    def __init__(self, engine, current_month_ttl_seconds=300, max_months=12, retry_initial_seconds=5,
+                 retry_max_seconds=300, check_interval_seconds=60, overlap_seconds=60):
+        self.engine = engine
+        self.current_month_ttl_seconds = current_month_ttl_seconds
+        self.max_months = max_months
+        self.retry_initial_seconds = retry_initial_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self.overlap_seconds = overlap_seconds
+        self._summaries = {}
+        # Period -> Series of balances at the start of that month, by (mls_point_code, commodity)
+        self._openings = {}
+        # Month -> (retry after, delay, error message) for the last failed query
+        self._failures = {}
+        self._month_locks = {}
+        # Goes up whenever cached months are dropped, so a computation that
+        # read the ledger before that doesn't cache what it read
+        self._version = 0
+        self._checked_at = None
+        self._next_check = 0.0
+        # Ids of the rows the last check read, to tell them apart when re-read
+        self._recent_ids = set()
+        self._lock = threading.Lock()
+
+    def summary(self, month=None):
+        """Return the StockSummary for a month (a 'YYYY-MM' string or Period; default the current month)"""
+        current = pd.Period.now('M')
+        month = current if month is None else pd.Period(month, freq='M')
+        self._check_ledger()
+
+        with self._lock:
+            summary, fresh = self._cached(month, current)
+            if fresh:
+                return summary
+            month_lock = self._month_locks.setdefault(month, threading.Lock())
+
+        # A stale current-month summary is served while another thread recomputes it
+        if not month_lock.acquire(blocking=summary is None):
+            return summary
+        try:
+            with self._lock:
+                # Whoever held the month's lock may have just computed it, or failed to
+                summary, fresh = self._cached(month, current)
+                if fresh:
+                    return summary
+                carried = self._openings.get(month - HISTORY_MONTHS)
+                version = self._version
+
+            start = time.perf_counter()
+            try:
+                buckets = self.fetch_buckets(month, carried_forward=carried is not None)
+            except Exception as e:
+                error = self._failed(month, e)
+                if summary is not None:
+                    return summary
+                raise error from e
+            summary = StockSummary.from_buckets(month, buckets, carried)
+            logger.info("Computed stock summary for %s: %s point/commodity rows in %.2fs (%s)",
+                        month, len(summary.keys), time.perf_counter() - start,
+                        'carried forward' if carried is not None else 'full history')
+
+            with self._lock:
+                self._failures.pop(month, None)
+                if version != self._version:
+                    # Backdated movements turned up while this ran; compute it again next time
+                    return summary
+                self._summaries[month] = (time.monotonic(), summary)
+                while len(self._summaries) > self.max_months:
+                    del self._summaries[min(self._summaries, key=lambda key: self._summaries[key][0])]
+                # Only openings of months up to the current one are settled
+                for column, period in enumerate(summary.months):
+                    if period <= current:
+                        self._openings[period] = summary.opening_balances(column)
+                while len(self._openings) > self.max_months:
+                    del self._openings[min(self._openings)]
+            return summary
+        finally:
+            month_lock.release()
+
+    def _cached(self, month, current):
+        """(summary or None, whether to serve it as is) for a month; raises while its failure backoff runs"""
+        summary = None
+        cached = self._summaries.get(month)
+        if cached is not None:
+            loaded_at, summary = cached
+            if month < current or time.monotonic() - loaded_at < self.current_month_ttl_seconds:
+                return summary, True
+
+        failure = self._failures.get(month)
+        if failure is not None and time.monotonic() < failure[0]:
+            # Keep serving the previous summary until the next attempt
+            if summary is not None:
+                return summary, True
+            raise StockLedgerUnavailable(f"Stock ledger unavailable, retrying in "
+                                         f"{failure[0] - time.monotonic():.0f}s: {failure[2]}")
+        return summary, False
+
+    def _failed(self, month, error):
+        """Record a failed query for the month's backoff and return the exception to raise"""
+        message = driver_message(error)
+        with self._lock:
+            previous = self._failures.get(month)
+            delay = self.retry_initial_seconds if previous is None else min(previous[1] * 2, self.retry_max_seconds)
+            self._failures[month] = (time.monotonic() + delay, delay, message)
+        logger.error("Stock summary for %s failed, retrying in %ss: %s", month, delay, message)
+        return StockLedgerUnavailable(f"Stock ledger unavailable: {message}")
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._summaries.clear()
+            self._openings.clear()
+            self._failures.clear()
+
+    def _check_ledger(self):
+        """Drop the cached months that movements recorded since the last check reach back into"""
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.check_interval_seconds
+            checked_at = datetime.datetime.now(datetime.timezone.utc)
+            since = (self._checked_at or checked_at) - datetime.timedelta(seconds=self.overlap_seconds)
+
+        try:
+            recorded = self.fetch_recorded(since)
+        except Exception as e:
+            logger.warning("Could not check the stock ledger for backdated movements: %s", driver_message(e))
+            with self._lock:
+                # The next check reads everything from this one on
+                if self._checked_at is None:
+                    self._checked_at = checked_at
+            return
+
+        with self._lock:
+            new = recorded[~recorded['id'].isin(self._recent_ids)]
+            self._recent_ids = set(recorded['id'])
+            self._checked_at = checked_at
+            if new.empty:
+                return
+            earliest = min(pd.Period(value, freq='M') for value in new['movement_date'])
+            self._version += 1
+            for month in [month for month in self._summaries if month >= earliest]:
+                del self._summaries[month]
+            # The opening of the earliest month itself is the balance before it, so it still holds
+            for month in [month for month in self._openings if month > earliest]:
+                del self._openings[month]
+        logger.info("%s new stock movement(s) dated from %s; dropped the cached months since", len(new), earliest)
+
+    def fetch_recorded(self, since):
+        """Id and movement date of every ledger row recorded at or after since"""
+        query = text("SELECT id, movement_date FROM mls_stock_ledger WHERE created_at >= :since")
+        with self.engine.connect() as conn:
+            return pd.read_sql_query(query, conn, params={'since': since})
+
+    def fetch_buckets(self, month, carried_forward=False):
+        """Sum receipts and issues per point, commodity and month bucket in one grouped query
+
+        With carried_forward, the opening balances of the window's first month
+        are already known and only movements from its start are read.
+        """
+        months = pd.period_range(end=month, periods=HISTORY_MONTHS + 1, freq='M')
+        params = {f"m{i}": period.start_time.date() for i, period in enumerate(months)}
+        params['end'] = (month + 1).start_time.date()
+
+        bucket = ' '.join(f"WHEN movement_date < :m{i + 1} THEN {i}" for i in range(len(months) - 1))
+        bucket_expression = f"CASE WHEN movement_date < :m0 THEN -1 {bucket} ELSE {len(months) - 1} END"
+        since = "AND movement_date >= :m0" if carried_forward else ""
+        query = text(f"""
+            SELECT mls_point_code, commodity, {bucket_expression} AS bucket,
+                   SUM(CASE WHEN movement_type = 'receipt' THEN quantity ELSE 0 END) AS receipts,
+                   SUM(CASE WHEN movement_type = 'issue' THEN quantity ELSE 0 END) AS issues
+            FROM mls_stock_ledger
+            WHERE movement_date < :end {since}
+            GROUP BY 1, 2, 3
+        """)
+        with self.engine.connect() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+
+def driver_message(error):
+    """The database driver's own message, without the SQL that pandas and SQLAlchemy wrap around it"""
+    cause = error
+    while cause.__cause__ is not None:
+        cause = cause.__cause__
+    return (str(cause).strip().splitlines() or [type(cause).__name__])[0]
+
+
+def format_quantity(value):
+    """Whole numbers without decimals, anything else to two places"""
+    if value == int(value):
+        return str(int(value))
+    return f"{value:.2f}"
@@ -0,0 +1,382 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+from functools import wraps
+
+import pandas as pd
+from sqlalchemy.sql import text
+
+from mls_columns import decode_record
+from mls_metrics import STORE_QUERY_SECONDS
+from mls_snapshot import normalise_column_name
+
+# Get logger from the main application
+logger = logging.getLogger(__name__)
+
+
+def snapshot_details(snap, mls_code, fetch_detail_columns=None):
+    """Return one point of a snapshot as a plain dict, with detail-only columns filled in"""
+    record = snap.get_record(mls_code)
+    if record is None:
+        return None
+
+    details = decode_record(record.to_dict())
+    if fetch_detail_columns is not None:
+        try:
+            details.update(fetch_detail_columns(mls_code))
+        except Exception as e:
+            logger.error("Error fetching detail columns for MLS code %s: %s", mls_code, e)
+    return details
+
+
+def timed(operation):
+    """Time a store read into STORE_QUERY_SECONDS, labelled with the store's backend"""
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with STORE_QUERY_SECONDS.time(self.backend_name, operation):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class MlsPointStore(ABC):
+    """Read access to MLS points for the list, search and detail APIs
+
+    Row sets come back as DataFrames with normalised column names, keeping
+    only the requested columns that exist. A district or mandal of 'All'
+    matches every point. Pages come in mls_point_code order in every store,
+    so a client paging through HybridPointStore sees no gaps or repeats when
+    it switches backend.
+    """
+
+    def ready(self):
+        """Whether reads can be answered yet"""
+        return True
+
+    def snapshot(self):
+        """The snapshot answers come from right now, whose generation versions them; None for SQL"""
+        return None
+
+    @abstractmethod
+    def districts(self):
+        """District names, sorted"""
+
+    @abstractmethod
+    def mandals(self, district):
+        """Mandal names of one district, sorted"""
+
+    @abstractmethod
+    def points(self, district, mandal, columns):
+        """The points of one district/mandal"""
+
+    @abstractmethod
+    def search(self, term, columns, limit=50):
+        """Points whose code or name contains term, best matches first"""
+
+    @abstractmethod
+    def point_details(self, mls_code):
+        """One point as a dict with every column, or None if the code is unknown"""
+
+    @abstractmethod
+    def summary(self, district='All', mandal='All'):
+        """(number of points, total storage capacity) for a district/mandal filter"""
+
+    @abstractmethod
+    def page(self, district, mandal, columns, offset=0, limit=None):
+        """A window of the points matching a district/mandal filter"""
+
+    @abstractmethod
+    def iter_page(self, district, mandal, columns, offset=0, limit=None, chunk_size=500):
+        """The same window as page(), as a series of frames of at most chunk_size rows"""
+
+
+class MemoryPointStore(MlsPointStore):
+    """Answers from the live in-memory snapshot
+
+    Detail-only columns (compact mode) are read per point with
+    fetch_detail_columns.
+    """
+
+    backend_name = 'memory'
+
+    def __init__(self, get_snapshot, fetch_detail_columns=None):
+        self.get_snapshot = get_snapshot
+        self.fetch_detail_columns = fetch_detail_columns
+
+    def ready(self):
+        return self.get_snapshot() is not None
+
+    def snapshot(self):
+        return self.get_snapshot()
+
+    @staticmethod
+    def _rows(snap, labels, columns):
+        with snap.lock:
+            return snap.df.loc[labels, [column for column in columns if column in snap.df.columns]]
+
+    @timed('districts')
+    def districts(self):
+        snap = self.get_snapshot()
+        with snap.lock:
+            return list(snap.hierarchy.districts)
+
+    @timed('mandals')
+    def mandals(self, district):
+        snap = self.get_snapshot()
+        with snap.lock:
+            return list(snap.hierarchy.mandals(district))
+
+    @timed('points')
+    def points(self, district, mandal, columns):
+        snap = self.get_snapshot()
+        with snap.lock:
+            # The pre-grouped rows for this district/mandal
+            return self._rows(snap, snap.hierarchy.point_labels(district, mandal), columns)
+
+    @timed('search')
+    def search(self, term, columns, limit=50):
+        snap = self.get_snapshot()
+        with snap.lock:
+            # The term is matched literally, so regex characters need no escaping
+            return self._rows(snap, snap.search_index.search(term, limit=limit), columns)
+
+    @timed('point_details')
+    def point_details(self, mls_code):
+        return snapshot_details(self.get_snapshot(), mls_code, self.fetch_detail_columns)
+
+    @timed('summary')
+    def summary(self, district='All', mandal='All'):
+        snap = self.get_snapshot()
+        with snap.lock:
+            point_labels = snap.filter_labels(district, mandal)
+            total_capacity = 0.0
+            if 'storage_capacity_mts' in snap.df.columns and point_labels:
+                capacities = pd.to_numeric(snap.df.loc[point_labels, 'storage_capacity_mts'], errors='coerce')
+                total_capacity = float(capacities.sum())
+        return len(point_labels), total_capacity
+
+    def _window(self, snap, district, mandal, offset, limit):
+        point_labels = snap.sort_by_code(snap.filter_labels(district, mandal))
+        end = len(point_labels) if limit is None else min(offset + limit, len(point_labels))
+        return point_labels[offset:end]
+
+    @timed('page')
+    def page(self, district, mandal, columns, offset=0, limit=None):
+        snap = self.get_snapshot()
+        return self._rows(snap, self._window(snap, district, mandal, offset, limit), columns)
+
+    def iter_page(self, district, mandal, columns, offset=0, limit=None, chunk_size=500):
+        snap = self.get_snapshot()
+        page_labels = self._window(snap, district, mandal, offset, limit)
+        # Slice a bounded chunk at a time so memory stays flat for "All"/"All"
+        for start in range(0, len(page_labels), chunk_size):
+            yield self._rows(snap, page_labels[start:start + chunk_size], columns)
+
+
+class SqlPointStore(MlsPointStore):
+    """Answers straight from mls_points in Postgres, usually on a read replica
+
+    Column names are read from the table once and mapped to their
+    normalised form, like the snapshot's. Rows come in mls_point_code order;
+    see sql/mls_points_read_indexes.sql for the indexes the queries use.
+    point_details reads from detail_engine (the primary) when one is given,
+    so an edit shows on the details page straight away.
+    """
+
+    backend_name = 'sql'
+
+    def __init__(self, engine, table='mls_points', capacity_column='storage_capacity_mts', detail_engine=None):
+        self.engine = engine
+        self.detail_engine = detail_engine or engine
+        self.table = table
+        self.capacity_column = capacity_column
+        self._names = None
+        self._lock = threading.Lock()
+
+    def _columns(self):
+        """Normalised name -> column name as it appears in the database"""
+        with self._lock:
+            if self._names is None:
+                with self.engine.connect() as conn:
+                    names = list(conn.execute(text(f"SELECT * FROM {self.table} LIMIT 0")).keys())
+                self._names = {normalise_column_name(name): name for name in names}
+            return self._names
+
+    def ready(self):
+        try:
+            self._columns()
+        except Exception as e:
+            logger.warning("SQL point store unavailable: %s", e)
+            return False
+        return True
+
+    def _quoted(self, column):
+        return self.engine.dialect.identifier_preparer.quote(self._columns()[column])
+
+    def _projection(self, columns):
+        quote = self.engine.dialect.identifier_preparer.quote
+        names = self._columns()
+        return ', '.join(f"{quote(names[column])} AS {quote(column)}" for column in columns if column in names)
+
+    def _filter(self, district, mandal):
+        clauses, params = [], {}
+        if district != 'All':
+            clauses.append(f"{self._quoted('district_name')} = :district")
+            params['district'] = district
+        if mandal != 'All':
+            clauses.append(f"{self._quoted('mandal_name')} = :mandal")
+            params['mandal'] = mandal
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ''), params
+
+    def _read(self, query, params):
+        with self.engine.connect() as conn:
+            return pd.read_sql_query(text(query), conn, params=params)
+
+    def _distinct(self, column, where='', params=None):
+        name = self._quoted(column)
+        condition = f"{where} AND {name} IS NOT NULL" if where else f"WHERE {name} IS NOT NULL"
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(f"SELECT DISTINCT {name} FROM {self.table} {condition} ORDER BY 1"), params or {})
+            return [row[0] for row in rows]
+
+    @timed('districts')
+    def districts(self):
+        return self._distinct('district_name')
+
+    @timed('mandals')
+    def mandals(self, district):
+        where, params = self._filter(district, 'All')
+        return self._distinct('mandal_name', where, params)
+
+    @timed('points')
+    def points(self, district, mandal, columns):
+        return self._read(*self._page_query(district, mandal, columns, 0, None))
+
+    @timed('search')
+    def search(self, term, columns, limit=50):
+        term = str(term).strip().lower()
+        if not term or limit <= 0:
+            return self._read(f"SELECT {self._projection(columns)} FROM {self.table} WHERE false", {})
+
+        # Same ranking as SearchIndex: code prefix (exact first), code substring,
+        # name prefix, name substring; prefixes in sorted order, substrings by position
+        code = f"lower(CAST({self._quoted('mls_point_code')} AS text))"
+        name = f"lower(CAST({self._quoted('mls_point_name')} AS text))"
+        escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        tier = f"""CASE WHEN {code} LIKE :prefix ESCAPE '\\' THEN 0
+                        WHEN {code} LIKE :contains ESCAPE '\\' THEN 1
+                        WHEN {name} LIKE :prefix ESCAPE '\\' THEN 2
+                        ELSE 3 END"""
+        query = f"""
+            SELECT {self._projection(columns)} FROM {self.table}
+            WHERE {code} LIKE :contains ESCAPE '\\' OR {name} LIKE :contains ESCAPE '\\'
+            ORDER BY {tier},
+                     CASE {tier} WHEN 0 THEN {code} WHEN 2 THEN {name} END,
+                     CASE {tier} WHEN 1 THEN strpos({code}, :term) ELSE strpos({name}, :term) END,
+                     {code}
+            LIMIT :limit
+        """
+        return self._read(query, {'term': term, 'prefix': f"{escaped}%", 'contains': f"%{escaped}%", 'limit': limit})
+
+    @timed('point_details')
+    def point_details(self, mls_code):
+        query = text(f"SELECT * FROM {self.table} WHERE {self._quoted('mls_point_code')} = :code LIMIT 1")
+        with self.detail_engine.connect() as conn:
+            row = conn.execute(query, {'code': mls_code}).mappings().first()
+        if row is None:
+            return None
+        return decode_record({normalise_column_name(name): value for name, value in row.items()})
+
+    @timed('summary')
+    def summary(self, district='All', mandal='All'):
+        where, params = self._filter(district, mandal)
+        capacity = 'NULL'
+        if self.capacity_column in self._columns():
+            # Skip values that aren't numbers, as pd.to_numeric(errors='coerce') does
+            value = f"trim(CAST({self._quoted(self.capacity_column)} AS text))"
+            capacity = f"CASE WHEN {value} ~ '^-?[0-9]+(\\.[0-9]+)?$' THEN CAST({value} AS numeric) END"
+        with self.engine.connect() as conn:
+            total, total_capacity = conn.execute(
+                text(f"SELECT COUNT(*), SUM({capacity}) FROM {self.table} {where}"), params).one()
+        return int(total), float(total_capacity or 0)
+
+    def _page_query(self, district, mandal, columns, offset, limit):
+        where, params = self._filter(district, mandal)
+        query = f"SELECT {self._projection(columns)} FROM {self.table} {where} " \
+                f"ORDER BY {self._quoted('mls_point_code')}"
+        if limit is not None:
+            query += " LIMIT :limit"
+            params['limit'] = limit
+        if offset:
+            query += " OFFSET :offset"
+            params['offset'] = offset
+        return query, params
+
+    @timed('page')
+    def page(self, district, mandal, columns, offset=0, limit=None):
+        return self._read(*self._page_query(district, mandal, columns, offset, limit))
+
+    def iter_page(self, district, mandal, columns, offset=0, limit=None, chunk_size=500):
+        query, params = self._page_query(district, mandal, columns, offset, limit)
+        with self.engine.connect().execution_options(stream_results=True, max_row_buffer=chunk_size) as conn:
+            yield from pd.read_sql_query(text(query), conn, params=params, chunksize=chunk_size)
+
+
+class HybridPointStore(MlsPointStore):
+    """Answers from the snapshot while it is usable and from SQL otherwise
+
+    SQL takes over while the snapshot is still loading, once it has gone
+    max_snapshot_age_seconds without a successful load or change-feed poll,
+    or when it holds more than max_snapshot_rows points (None disables
+    either check).
+    """
+
+    def __init__(self, memory, sql, max_snapshot_age_seconds=None, max_snapshot_rows=None):
+        self.memory = memory
+        self.sql = sql
+        self.max_snapshot_age_seconds = max_snapshot_age_seconds
+        self.max_snapshot_rows = max_snapshot_rows
+
+    def backend(self):
+        snap = self.memory.snapshot()
+        if snap is None:
+            return self.sql
+        if self.max_snapshot_rows is not None and len(snap.df) > self.max_snapshot_rows:
+            return self.sql
+        if self.max_snapshot_age_seconds is not None and snap.synced_age > self.max_snapshot_age_seconds:
+            return self.sql
+        return self.memory
+
+    def ready(self):
+        return self.backend().ready()
+
+    def snapshot(self):
+        return self.backend().snapshot()
+
+    def districts(self):
+        return self.backend().districts()
+
+    def mandals(self, district):
+        return self.backend().mandals(district)
+
+    def points(self, district, mandal, columns):
+        return self.backend().points(district, mandal, columns)
+
+    def search(self, term, columns, limit=50):
+        return self.backend().search(term, columns, limit)
+
+    def point_details(self, mls_code):
+        return self.backend().point_details(mls_code)
+
+    def summary(self, district='All', mandal='All'):
+        return self.backend().summary(district, mandal)
+
+    def page(self, district, mandal, columns, offset=0, limit=None):
+        return self.backend().page(district, mandal, columns, offset, limit)
+
+    def iter_page(self, district, mandal, columns, offset=0, limit=None, chunk_size=500):
+        return self.backend().iter_page(district, mandal, columns, offset, limit, chunk_size)
@@ -0,0 +1,117 @@
+import csv
+import logging
+import numbers
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import MetaData, Table, bindparam, func, update
+
+from mls_columns import FLAG_VALUES
+from mls_snapshot import normalise_column_name
+
+# Get logger from the main application
+logger = logging.getLogger(__name__)
+
+
+def same_value(current, submitted):
+    """Whether a submitted (form or CSV) value leaves a stored value as it is"""
+    submitted = '' if submitted is None else str(submitted).strip()
+    if current is None or (pd.api.types.is_scalar(current) and pd.isna(current)):
+        return submitted == ''
+    if isinstance(current, (bool, np.bool_)):
+        return FLAG_VALUES.get(submitted.lower()) == bool(current)
+    if isinstance(current, numbers.Number):
+        try:
+            return float(submitted) == float(current)
+        except ValueError:
+            return False
+    return str(current).strip() == submitted
+
+
+class MlsPointWriter:
+    """Writes edits to mls_points, sending only the columns whose values changed
+
+    The table is reflected on first use and kept, rather than read back from
+    the catalog on every edit; reset() drops it after a schema change.
+    Columns are addressed by their normalised names, as in the snapshot.
+    """
+
+    def __init__(self, engine, watermark_column=None, table_name='mls_points'):
+        self.engine = engine
+        self.watermark_column = watermark_column
+        self.table_name = table_name
+        self._table = None
+        self._columns = None
+        self._lock = threading.Lock()
+
+    def _reflect(self):
+        with self._lock:
+            if self._table is None:
+                table = Table(self.table_name, MetaData(), autoload_with=self.engine)
+                self._columns = {normalise_column_name(column.name): column for column in table.c}
+                self._table = table
+                logger.info("Reflected %s with %s columns", self.table_name, len(self._columns))
+            return self._table, self._columns
+
+    def reset(self):
+        with self._lock:
+            self._table = None
+            self._columns = None
+
+    def changes(self, current, submitted):
+        """The submitted {column: value} entries that are table columns and differ from the current record"""
+        _, columns = self._reflect()
+        return {key: value for key, value in submitted.items()
+                if key in columns and key != self.watermark_column and not same_value(current.get(key), value)}
+
+    def update_points(self, edits):
+        """Write [(mls_code, {column: value})] in one transaction; returns the number of points written
+
+        Edits that change the same set of columns share one UPDATE statement,
+        executed with every point's parameters at once (executemany).
+        """
+        table, columns = self._reflect()
+        groups = {}
+        for mls_code, values in edits:
+            if values:
+                groups.setdefault(tuple(sorted(values)), []).append((mls_code, values))
+        if not groups:
+            return 0
+
+        written = 0
+        with self.engine.begin() as conn:
+            for keys, group in groups.items():
+                assignments = {columns[key].name: bindparam(f"value_{i}") for i, key in enumerate(keys)}
+                # Bump the change-feed watermark so other workers pick the edit up
+                if self.watermark_column in columns:
+                    assignments[columns[self.watermark_column].name] = func.now()
+                stmt = update(table).where(columns['mls_point_code'] == bindparam('point_code')).values(assignments)
+                params = [{'point_code': mls_code, **{f"value_{i}": values[key] for i, key in enumerate(keys)}}
+                          for mls_code, values in group]
+                conn.execute(stmt, params)
+                written += len(group)
+        return written
+
+
+def read_edits_csv(lines):
+    """Parse CSV text (a file object or list of lines) into {mls_code: {column: value}}
+
+    Headers are normalised like the snapshot's column names and must include
+    mls_point_code. Blank cells leave a column as it is; a code listed twice
+    takes the later row's values.
+    """
+    reader = csv.reader(lines)
+    headers = [normalise_column_name(name.strip()) for name in next(reader, [])]
+    if 'mls_point_code' not in headers:
+        raise ValueError('The CSV file needs an mls_point_code column')
+    code_position = headers.index('mls_point_code')
+
+    edits = {}
+    for row in reader:
+        if len(row) <= code_position or not row[code_position].strip():
+            continue
+        values = edits.setdefault(row[code_position].strip(), {})
+        values.update({header: value for header, value in zip(headers, row)
+                       if header != 'mls_point_code' and value.strip() != ''})
+    return edits
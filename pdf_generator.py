@@ -1,25 +1,44 @@
 from flask import make_response
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Image, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Image, Spacer, Flowable
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.pdfbase.pdfdoc import PDFStream, PDFZCompress
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.lib.utils import simpleSplit
 from reportlab.lib import colors
+import reportlab
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch, cm
+from functools import lru_cache
 from io import BytesIO
+import math
 import os
 import logging
+import threading
+import time
+
+from mls_pdf_cache import content_digest
+from mls_stock import COMMODITIES, HISTORY_MONTHS
 
 # Get logger from the main application
 logger = logging.getLogger(__name__)
 
+# Font, size and leading of each kind of per-point cell in the layout
+FIELD_FONTS = {
+    'basic': ('Helvetica', 9, 12),   # Paragraphs in the basic information table
+    'plain': ('Helvetica', 10, 12),  # Plain table text (Table's default size and leading)
+    'small': ('Helvetica', 8, 10),   # Paragraphs in the capacity table
+    'table8': ('Helvetica', 8, 9.6),  # Commodity table cells
+    'table7': ('Helvetica', 7, 8.4)   # Stock movement table cells
+}
 
-def generate_mls_pdf(mls_data):
-    """Generate a PDF report for an MLS point based on the template"""
+# Values too long for their cell are shrunk down to this size; past it, the
+# report is laid out in full
+MIN_FIELD_FONT_SIZE = 6
 
-    # Create a buffer for the PDF
-    buffer = BytesIO()
 
-    # Create the PDF document
-    doc = SimpleDocTemplate(
+def _new_doc(buffer):
+    return SimpleDocTemplate(
         buffer,
         pagesize=A4,
         rightMargin=50,
@@ -28,7 +47,10 @@ def generate_mls_pdf(mls_data):
         bottomMargin=50
     )
 
-    # Get styles
+
+@lru_cache(maxsize=1)
+def _report_styles():
+    """Paragraph styles shared by every report; getSampleStyleSheet() is built once"""
     styles = getSampleStyleSheet()
     title_style = ParagraphStyle(
         'Title',
@@ -53,6 +75,40 @@ def generate_mls_pdf(mls_data):
         borderPadding=3
     )
 
+    # Basic information table cells
+    cell_style = ParagraphStyle(
+        name='CellStyle',
+        fontName='Helvetica',
+        fontSize=9,
+        leading=12,
+        spaceAfter=4
+    )
+
+    # Capacity table cells
+    small_cell_style = ParagraphStyle(
+        name='TableCell',
+        fontName='Helvetica',
+        fontSize=8,
+        leading=10,
+        spaceAfter=2
+    )
+
+    return {
+        'normal': styles['Normal'],
+        'title': title_style,
+        'section': section_style,
+        'cell': cell_style,
+        'small_cell': small_cell_style
+    }
+
+
+def _build_elements(field):
+    """Lay out the four-page report; field(key, kind, ...) supplies every per-point cell"""
+    styles = _report_styles()
+    title_style = styles['title']
+    section_style = styles['section']
+    cell_style = styles['cell']
+
     # Store elements for the PDF
     elements = []
 
@@ -63,23 +119,15 @@ def generate_mls_pdf(mls_data):
     elements.append(Paragraph("MLS Point Details", section_style))
 
     # Basic information table
-    cell_style = ParagraphStyle(
-        name='CellStyle',
-        fontName='Helvetica',
-        fontSize=9,
-        leading=12,
-        spaceAfter=4
-    )
-
     # Table data with wrapped content
     basic_data = [
-        ["MLS Point Code", Paragraph(str(mls_data.get("mls_point_code", "")), cell_style)],
-        ["MLS Point Name", Paragraph(str(mls_data.get("mls_point_name", "")), cell_style)],
-        ["District Name", Paragraph(str(mls_data.get("district_name", "")), cell_style)],
-        ["Mandal Name", Paragraph(str(mls_data.get("mandal_name", "")), cell_style)],
-        ["MLS Point Address", Paragraph(str(mls_data.get("mls_point_address", "")), cell_style)],
-        ["Latitude", Paragraph(str(mls_data.get("mls_point_latitude", "")), cell_style)],
-        ["Longitude", Paragraph(str(mls_data.get("mls_point_longitude", "")), cell_style)],
+        ["MLS Point Code", field("mls_point_code", 'basic')],
+        ["MLS Point Name", field("mls_point_name", 'basic')],
+        ["District Name", field("district_name", 'basic')],
+        ["Mandal Name", field("mandal_name", 'basic')],
+        ["MLS Point Address", field("mls_point_address", 'basic', lines=2)],
+        ["Latitude", field("mls_point_latitude", 'basic')],
+        ["Longitude", field("mls_point_longitude", 'basic')],
         ["Fetch Live Location", Paragraph("", cell_style)],
         ["Mandals Tagged to MLS Point", Paragraph("", cell_style)]
     ]
@@ -103,11 +151,12 @@ def generate_mls_pdf(mls_data):
 
     # Create a table for incharge details with photo space
     incharge_data = [
-        ["CFMS / Corporation EMP ID", mls_data.get("mls_point_incharge_cfms_id", ""), ""],
-        ["Name", mls_data.get("mls_point_incharge_name", ""), "MLS"],
-        ["Designation", mls_data.get("designation", ""), "Incharge"],
-        ["Aadhaar Number", mls_data.get("aadhaar_number", ""), "Photo"],
-        ["Phone Number", mls_data.get("phone_number", ""), ""]
+        ["CFMS / Corporation EMP ID", field("mls_point_incharge_cfms_id", 'plain'),
+         field("incharge_photo", 'image', height=108)],
+        ["Name", field("mls_point_incharge_name", 'plain'), "MLS"],
+        ["Designation", field("designation", 'plain'), "Incharge"],
+        ["Aadhaar Number", field("aadhaar_number", 'plain'), "Photo"],
+        ["Phone Number", field("phone_number", 'plain'), ""]
     ]
 
     incharge_table = Table(incharge_data, colWidths=[150, 260, 70])
@@ -129,10 +178,10 @@ def generate_mls_pdf(mls_data):
 
     # Create a table for DEO details with photo space
     deo_data = [
-        ["Corporation Emp ID", mls_data.get("deo_cfms_id", ""), ""],
-        ["Name", mls_data.get("deo_name", ""), "DEO"],
-        ["Aadhaar Number", mls_data.get("deo_aadhaar_number", ""), "Photo"],
-        ["Phone Number", mls_data.get("deo_phone_number", ""), ""]
+        ["Corporation Emp ID", field("deo_cfms_id", 'plain'), field("deo_photo", 'image', height=84)],
+        ["Name", field("deo_name", 'plain'), "DEO"],
+        ["Aadhaar Number", field("deo_aadhaar_number", 'plain'), "Photo"],
+        ["Phone Number", field("deo_phone_number", 'plain'), ""]
     ]
 
     deo_table = Table(deo_data, colWidths=[150, 260, 70])
@@ -153,13 +202,7 @@ def generate_mls_pdf(mls_data):
     elements.append(Paragraph("MLS Point Details", section_style))
 
     # Create a table for capacity details
-    cell_style = ParagraphStyle(
-        name='TableCell',
-        fontName='Helvetica',
-        fontSize=8,
-        leading=10,
-        spaceAfter=2
-    )
+    cell_style = styles['small_cell']
 
     # Safe paragraph wrapper
     def safe_paragraph(value, style):
@@ -173,13 +216,13 @@ def generate_mls_pdf(mls_data):
     capacity_data = [
         [safe_paragraph(h, cell_style) for h in capacity_headers],
         [
-            safe_paragraph(mls_data.get("mls_point_name", ""), cell_style),
+            field("mls_point_name", 'small', lines=2),
             safe_paragraph("", cell_style),  # Dimensions - left blank
-            safe_paragraph(mls_data.get("godown_area_sqft", ""), cell_style),
-            safe_paragraph(mls_data.get("storage_capacity_mts", ""), cell_style),
-            safe_paragraph(mls_data.get("mls_point_ownership", ""), cell_style),
-            safe_paragraph(mls_data.get("rented_type", ""), cell_style),
-            safe_paragraph(mls_data.get("weighbridge_available", ""), cell_style)
+            field("godown_area_sqft", 'small'),
+            field("storage_capacity_mts", 'small'),
+            field("mls_point_ownership", 'small'),
+            field("rented_type", 'small'),
+            field("weighbridge_available", 'small')
         ]
     ]
 
@@ -222,7 +265,8 @@ def generate_mls_pdf(mls_data):
 
     image_data = [
         ["Entrance", "Exit", "Loading Area", "Unloading Area", "Storage", "Storage"],
-        ["[IMG]", "[IMG]", "[IMG]", "[IMG]", "[IMG]", "[IMG]"]
+        [field(name, 'image', height=60, placeholder="[IMG]")
+         for name in ["entrance", "exit", "loading_area", "unloading_area", "storage_1", "storage_2"]]
     ]
 
     image_table = Table(image_data, colWidths=[80, 80, 80, 80, 80, 80])
@@ -246,7 +290,7 @@ def generate_mls_pdf(mls_data):
 
     hamalies_data = [
         ["Hamalies Engaged", "Rate per Quintal", "Rate per Carton Box", "Rate per Bale"],
-        [mls_data.get("hamalies_working", ""), "", "", ""]
+        [field("hamalies_working", 'plain', align='CENTER'), "", "", ""]
     ]
 
     hamalies_table = Table(hamalies_data, colWidths=[120, 140, 140, 140])
@@ -265,7 +309,7 @@ def generate_mls_pdf(mls_data):
     elements.append(Paragraph("Stage II Contractor Details", section_style))
 
     contractor_data = [
-        ["Engaged Firm Name", "", ""],
+        ["Engaged Firm Name", "", field("contractor_photo", 'image', height=132)],
         ["PAN / GST Details", "", "Owner /"],
         ["Owner / Authorised Person Name", "", "Authorised"],
         ["Owner / Authorised Aadhaar Number", "", "Person"],
@@ -292,7 +336,7 @@ def generate_mls_pdf(mls_data):
 
     vehicle_data = [
         ["Vehicles Engaged", "Own Vehicles Engaged", "Hired vehicles Engaged", "GPS Fitted Vehicles"],
-        [mls_data.get("stage2_vehicles_registered", ""), "", "", mls_data.get("gps_installed_on_all_vehicles", "")]
+        [field("stage2_vehicles_registered", 'plain', align='CENTER'), "", "", field("gps_installed_on_all_vehicles", 'plain', align='CENTER')]
     ]
 
     vehicle_table = Table(vehicle_data, colWidths=[120, 120, 120, 120])
@@ -310,16 +354,15 @@ def generate_mls_pdf(mls_data):
     # Current Month Commodity Details - without icon
     elements.append(Paragraph("Current Month Commodity Details", section_style))
 
-    commodities = [
-        "Fortified Rice", "Fine Quality Rice", "Sugar", "P. Oil ½ Ltr.",
-        "P. Oil 1 Ltr.", "RG Dall 1Kg Pkts.", "RG Dall", "Jowar",
-        "Ragi", "Jaggery Powder", "Ragi Powder", "3 Kg THR Rice Pkts."
-    ]
+    commodities = COMMODITIES
 
+    # Values come from StockSummary.report_fields(); stock_0_* is the report month
     commodity_data = [
         ["SL. No.", "Commodity", "Opening Balance", "Received Quantity", "Issued Quantity", "Closing Balance"]]
     for idx, commodity in enumerate(commodities, 1):
-        commodity_data.append([str(idx), commodity, "", "", "", ""])
+        commodity_data.append([str(idx), commodity] +
+                              [field(f"stock_0_{idx}_{name}", 'table8', align='CENTER')
+                               for name in ["opening", "receipts", "issues", "closing"]])
 
     commodity_table = Table(commodity_data, colWidths=[40, 100, 100, 100, 100, 100])
     commodity_table.setStyle(TableStyle([
@@ -350,7 +393,14 @@ def generate_mls_pdf(mls_data):
     ]
 
     # Merge cells for the complex header
-    stock_table = Table(stock_header + [[c] + [""] * 19 for c in commodities],
+    stock_rows = []
+    for idx, commodity in enumerate(commodities, 1):
+        stock_rows.append([commodity] +
+                          [field(f"stock_{month}_{idx}_{name}", 'table7', align='CENTER')
+                           for month in range(1, HISTORY_MONTHS + 1)
+                           for name in ["opening", "receipts", "issues"]])
+
+    stock_table = Table(stock_header + stock_rows,
                         colWidths=[80] + [25] * 19)
 
     stock_styles = [
@@ -385,7 +435,7 @@ def generate_mls_pdf(mls_data):
 
     cameras_data = [
         ["Cameras Maintenance Vendor", "CC Camers installed", "Cameras with Live Feed"],
-        [mls_data.get("camera_vendor", ""), mls_data.get("cc_cameras_installed", ""), ""]
+        [field("camera_vendor", 'plain', align='CENTER'), field("cc_cameras_installed", 'plain', align='CENTER'), ""]
     ]
 
     cameras_table = Table(cameras_data, colWidths=[160, 160, 160])
@@ -420,7 +470,7 @@ def generate_mls_pdf(mls_data):
         ]))
         elements.append(camera_row)
 
-    elements.append(Paragraph("Add for more", styles['Normal']))
+    elements.append(Paragraph("Add for more", styles['normal']))
     elements.append(Spacer(1, 0.2 * inch))
 
     # Another Block/MLS Point
@@ -443,13 +493,401 @@ def generate_mls_pdf(mls_data):
         ]))
         elements.append(camera_row)
 
-    elements.append(Paragraph("Add for more", styles['Normal']))
+    elements.append(Paragraph("Add for more", styles['normal']))
+
+    return elements
+
+def generate_mls_pdf(mls_data, output=None, media=None, timings=None):
+    """Generate a PDF report for an MLS point based on the template
+
+    With output (a binary file object) the report is written there and None
+    is returned; otherwise the PDF bytes are returned. With media (an
+    mls_media.MediaLibrary) the point's photos fill the image slots. A
+    timings dict gets the seconds spent on each phase ('build', 'serialize').
+
+    On a ReportLab without the Canvas internals the template uses, the
+    report is laid out in full instead.
+    """
+    if template_supported():
+        return get_pdf_template().render(mls_data, output, media, timings)
+    return _render_full(mls_data, output, media, timings)
+
+
+def _render_full(mls_data, output=None, media=None, timings=None):
+    """generate_mls_pdf() through the full layout"""
+    start = time.perf_counter()
+    pdf_data = generate_mls_pdf_full(mls_data, media)
+    if timings is not None:
+        timings['build'] = time.perf_counter() - start
+    if output is not None:
+        output.write(pdf_data)
+        return None
+    return pdf_data
+
+
+def report_digest(mls_data, media=None):
+    """Digest of everything that shows up in a point's report
+
+    Keys the template does not draw (such as the generated_date and
+    generated_by stamp) are left out, so they never make a cached report
+    look stale. Images count by path, size and mtime.
+    """
+    images = media.images(mls_data.get('mls_point_code')) if media is not None else {}
+    if not template_supported():
+        return content_digest({'layout': 'full', 'fields': {key: _field_text(mls_data.get(key))
+                                                            for key in _field_keys()}, 'images': images})
+    template = get_pdf_template()
+    return content_digest({'layout': template.layout_digest, 'fields': template.field_values(mls_data),
+                           'images': images})
+
+
+def generate_mls_pdf_full(mls_data, media=None):
+    """Lay out and build the whole report with platypus, as before the template existed
+
+    Rows grow to fit their values, so this is what a report falls back to
+    when a value is too long for its template slot. Also kept for
+    comparison with the template output and for benchmarking.
+    """
+    styles = _report_styles()
+    images = media.images(mls_data.get('mls_point_code')) if media is not None else {}
+
+    def field(key, kind, lines=1, align='LEFT', height=None, placeholder=""):
+        if kind == 'image':
+            source = images.get(key)
+            return _FittedImage(media, source, height, placeholder) if source is not None else placeholder
+        value = _field_text(mls_data.get(key))
+        if kind == 'basic':
+            return Paragraph(value, styles['cell'])
+        if kind == 'small':
+            return Paragraph(value, styles['small_cell'])
+        return value
 
-    # Build the PDF
-    doc.build(elements)
+    buffer = BytesIO()
+    doc = _new_doc(buffer)
+    doc.build(_build_elements(field), canvasmaker=_BinaryStreamCanvas if template_supported() else Canvas)
 
-    # Get the value of the BytesIO buffer and write it to the response
     pdf_data = buffer.getvalue()
     buffer.close()
 
-    return pdf_data
\ No newline at end of file
+    return pdf_data
+
+
+class _FittedImage(Flowable):
+    """One of a point's images in the full layout, drawn like the template's image slots"""
+
+    def __init__(self, media, source, height, placeholder):
+        super().__init__()
+        self.media = media
+        self.source = source
+        self.box_height = height
+        self.placeholder = placeholder
+
+    def wrap(self, availWidth, availHeight):
+        self.width = availWidth
+        self.height = min(availHeight, self.box_height)
+        return self.width, self.height
+
+    def draw(self):
+        slot = {'x': 0, 'top': self.height, 'width': self.width, 'height': self.height,
+                'placeholder': self.placeholder}
+        _draw_image(self.canv, slot, self.media, self.source)
+
+
+class FieldSlot(Flowable):
+    """Placeholder for one per-point value; records where platypus put it instead of drawing"""
+
+    def __init__(self, key, kind, lines, align, registry):
+        super().__init__()
+        self.key = key
+        self.font_name, self.font_size, self.leading = FIELD_FONTS[kind]
+        self.lines = lines
+        self.align = align
+        self.registry = registry
+
+    def wrap(self, availWidth, availHeight):
+        self.width = availWidth
+        self.height = self.lines * self.leading
+        return self.width, self.height
+
+    def draw(self):
+        canv = self.canv
+        a, b, c, d, e, f = canv._currentMatrix
+        self.registry.append({
+            'page': canv.getPageNumber() - 1,
+            'kind': 'text',
+            'key': self.key,
+            'x': e,
+            'top': f + d * self.height,
+            'width': self.width,
+            'lines': self.lines,
+            'align': self.align,
+            'font_name': self.font_name,
+            'font_size': self.font_size,
+            'leading': self.leading
+        })
+
+
+class ImageSlot(Flowable):
+    """Placeholder for one of a point's images; fills its cell up to height points"""
+
+    def __init__(self, key, height, placeholder, registry):
+        super().__init__()
+        self.key = key
+        self.box_height = height
+        self.placeholder = placeholder
+        self.registry = registry
+
+    def wrap(self, availWidth, availHeight):
+        self.width = availWidth
+        self.height = min(availHeight, self.box_height)
+        return self.width, self.height
+
+    def draw(self):
+        canv = self.canv
+        a, b, c, d, e, f = canv._currentMatrix
+        self.registry.append({
+            'page': canv.getPageNumber() - 1,
+            'kind': 'image',
+            'key': self.key,
+            'x': e,
+            'top': f + d * self.height,
+            'width': self.width,
+            'height': self.height,
+            'placeholder': self.placeholder
+        })
+
+
+@lru_cache(maxsize=1)
+def template_supported():
+    """Whether this ReportLab has the Canvas internals MlsPdfTemplate relies on
+
+    The template reads and replays the page content stream (_code), takes
+    slot positions from the current transform (_currentMatrix), repeats the
+    font registrations (_doc.fontMapping) and sets the encoding of each
+    finished page (_doc.Pages). requirements.txt pins a release that has them.
+    """
+    canv = Canvas(BytesIO())
+    supported = (isinstance(getattr(canv, '_code', None), list)
+                 and len(getattr(canv, '_currentMatrix', ())) == 6
+                 and isinstance(getattr(canv._doc, 'fontMapping', None), dict)
+                 and isinstance(getattr(getattr(canv._doc, 'Pages', None), 'pages', None), list))
+    if not supported:
+        logger.warning("ReportLab %s lacks the Canvas internals the PDF template uses; "
+                       "laying out every report in full", reportlab.Version)
+    return supported
+
+
+@lru_cache(maxsize=1)
+def _field_keys():
+    """The keys of every per-point text cell in the layout"""
+    keys = set()
+
+    def field(key, kind, lines=1, align='LEFT', height=None, placeholder=""):
+        if kind != 'image':
+            keys.add(key)
+        return ""
+
+    _build_elements(field)
+    return sorted(keys)
+
+
+class _BinaryStreamCanvas(Canvas):
+    """Canvas that writes its compressed page streams as binary rather than ASCII85 text
+
+    The pure-Python ASCII85 encoder was most of the time spent saving a
+    report. rl_config.useA85 would do the same for every canvas in the
+    process, so only the pages of this one are given a plain Flate stream.
+    """
+
+    def showPage(self):
+        super().showPage()
+        page = self._doc.Pages.pages[-1]
+        if page.compression and page.stream and not page.Contents:
+            contents = PDFStream(content=page.stream, filters=[PDFZCompress])
+            contents.__Comment__ = "page stream"
+            page.Contents = contents
+
+
+class _RecordingCanvas(Canvas):
+    """Canvas that keeps a copy of every page's content stream as it is finished"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page_code = []
+
+    def showPage(self):
+        self.page_code.append(list(self._code))
+        super().showPage()
+
+
+class MlsPdfTemplate:
+    """The static part of the report, laid out once and replayed for every point
+
+    Building the template runs the normal platypus layout with FieldSlot
+    placeholders in place of the per-point cells and keeps each page's
+    finished content stream together with the slot positions. Rendering a
+    point then only copies those streams onto a fresh canvas and draws the
+    field text into the slots, which skips the table layout entirely.
+
+    Slots have a fixed size, so a value longer than its cell is shrunk down
+    to MIN_FIELD_FONT_SIZE. A point with a value that still doesn't fit is
+    laid out in full instead, where the row grows to take it.
+    """
+
+    def __init__(self):
+        slots = []
+
+        def field(key, kind, lines=1, align='LEFT', height=None, placeholder=""):
+            if kind == 'image':
+                return ImageSlot(key, height, placeholder, slots)
+            return FieldSlot(key, kind, lines, align, slots)
+
+        canvases = []
+
+        def make_canvas(*args, **kwargs):
+            canv = _RecordingCanvas(*args, **kwargs)
+            canvases.append(canv)
+            return canv
+
+        buffer = BytesIO()
+        doc = _new_doc(buffer)
+        doc.build(_build_elements(field), canvasmaker=make_canvas)
+        canv = canvases[-1]
+
+        self.pagesize = doc.pagesize
+        self.pages = canv.page_code
+        # Internal font names (/F1, /F2, ...) are referenced by the recorded
+        # streams, so a render has to register the fonts in the same order
+        self.font_names = [name for name, _ in sorted(canv._doc.fontMapping.items(),
+                                                       key=lambda item: int(item[1][2:]))]
+        self.slots = [[slot for slot in slots if slot['page'] == page] for page in range(len(self.pages))]
+        self.field_keys = sorted({slot['key'] for slot in slots if slot['kind'] == 'text'})
+        # Changes whenever the static layout does, so reports cached on disk
+        # by an older release are not served
+        self.layout_digest = content_digest(['\n'.join(code) for code in self.pages])
+
+        logger.info("Built PDF template with %s pages and %s field slots", len(self.pages), len(slots))
+
+    def field_values(self, mls_data):
+        """The text each slot would show for a point"""
+        return {key: _field_text(mls_data.get(key)) for key in self.field_keys}
+
+    def render(self, mls_data, output=None, media=None, timings=None):
+        """Return the PDF bytes for one point, or write them to output if given"""
+        start = time.perf_counter()
+        fitted = {}
+        for slot in (slot for slots in self.slots for slot in slots if slot['kind'] == 'text'):
+            fit = _fit_field(slot, _field_text(mls_data.get(slot['key'])))
+            if fit is None:
+                logger.info("%s of MLS code %s is too long for its slot; laying the report out in full",
+                            slot['key'], mls_data.get('mls_point_code'))
+                return _render_full(mls_data, output, media, timings)
+            fitted[id(slot)] = fit
+
+        images = media.images(mls_data.get('mls_point_code')) if media is not None else {}
+        buffer = output if output is not None else BytesIO()
+        canv = _BinaryStreamCanvas(buffer, pagesize=self.pagesize)
+        for font_name in self.font_names:
+            canv._doc.getInternalFontName(font_name)
+
+        for code, slots in zip(self.pages, self.slots):
+            canv._code.append('q')
+            canv._code.extend(code)
+            canv._code.append('Q')
+            for slot in slots:
+                if slot['kind'] == 'image':
+                    _draw_image(canv, slot, media, images.get(slot['key']))
+                else:
+                    _draw_field(canv, slot, *fitted[id(slot)])
+            canv.showPage()
+        built = time.perf_counter()
+        canv.save()
+        if timings is not None:
+            timings['build'] = built - start
+            timings['serialize'] = time.perf_counter() - built
+
+        if output is not None:
+            return None
+
+        pdf_data = buffer.getvalue()
+        buffer.close()
+
+        return pdf_data
+
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def get_pdf_template():
+    """Return the shared template, building it on first use"""
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = MlsPdfTemplate()
+    return _template
+
+
+def _field_text(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        # Counts come back from the compact float columns as e.g. 3.0
+        return str(int(value))
+    return str(value)
+
+
+def _fit_field(slot, text):
+    """(font size, lines) that fit text into a slot, shrinking it if need be; None if it can't fit"""
+    font_name = slot['font_name']
+    size = slot['font_size']
+    width = slot['width']
+    if not text:
+        return size, []
+    if stringWidth(text, font_name, size) <= width:
+        return size, [text]
+
+    lines = simpleSplit(text, font_name, size, width)
+    while len(lines) > slot['lines'] and size > MIN_FIELD_FONT_SIZE:
+        size -= 0.5
+        lines = simpleSplit(text, font_name, size, width)
+    # simpleSplit leaves a word wider than the slot on a line of its own
+    if len(lines) > slot['lines'] or any(stringWidth(line, font_name, size) > width for line in lines):
+        return None
+    return size, lines
+
+
+def _draw_field(canv, slot, size, lines):
+    if not lines:
+        return
+
+    font_name = slot['font_name']
+    width = slot['width']
+    leading = slot['leading'] * size / slot['font_size']
+    canv.setFont(font_name, size, leading)
+    y = slot['top'] - size
+    for line in lines:
+        if slot['align'] == 'CENTER':
+            canv.drawCentredString(slot['x'] + width / 2, y, line)
+        else:
+            canv.drawString(slot['x'], y, line)
+        y -= leading
+
+
+def _draw_image(canv, slot, media, source):
+    x, y = slot['x'], slot['top'] - slot['height']
+    if source is not None:
+        try:
+            thumbnail = media.thumbnail(source, slot['width'], slot['height'])
+        except Exception as e:
+            logger.warning("Could not prepare image %s: %s", source[0], e)
+        else:
+            # Drawn by path: a thumbnail used twice in one report is embedded once
+            canv.drawImage(thumbnail, x, y, slot['width'], slot['height'],
+                           preserveAspectRatio=True, anchor='c')
+            return
+
+    if slot['placeholder']:
+        canv.setFont(*FIELD_FONTS['plain'])
+        canv.drawCentredString(x + slot['width'] / 2, y + slot['height'] / 2 - 3.5, slot['placeholder'])
@@ -0,0 +1,14 @@
+-- Indexes for the direct-SQL reads of mls_points (see SqlPointStore in mls_store.py).
+-- Run on the primary; replicas pick them up through replication.
+
+-- District/mandal lists, filtered pages and point lookups, all in code order
+CREATE INDEX IF NOT EXISTS mls_points_district_mandal_code_idx
+    ON mls_points (district_name, mandal_name, mls_point_code);
+CREATE INDEX IF NOT EXISTS mls_points_code_idx ON mls_points (mls_point_code);
+
+-- Substring search on code and name; the expressions match the ones the search query uses
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS mls_points_code_trgm_idx
+    ON mls_points USING gin (lower(CAST(mls_point_code AS text)) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS mls_points_name_trgm_idx
+    ON mls_points USING gin (lower(CAST(mls_point_name AS text)) gin_trgm_ops);
@@ -0,0 +1,22 @@
+-- Change-feed watermark for mls_points (see SnapshotRefresher in mls_snapshot.py).
+-- Any write, from the app or straight into Postgres, bumps updated_at so other
+-- workers pick the row up on their next poll. The stamp is clock_timestamp(),
+-- the time of the write itself: now() is the transaction's start, which can
+-- fall well before its commit. Commit latency still lets a row land behind
+-- the watermark, which the refresher's overlap window re-reads.
+
+ALTER TABLE mls_points ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT clock_timestamp();
+
+CREATE INDEX IF NOT EXISTS mls_points_updated_at_idx ON mls_points (updated_at);
+
+CREATE OR REPLACE FUNCTION mls_points_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS mls_points_touch_updated_at ON mls_points;
+CREATE TRIGGER mls_points_touch_updated_at
+    BEFORE INSERT OR UPDATE ON mls_points
+    FOR EACH ROW EXECUTE FUNCTION mls_points_touch_updated_at();
@@ -0,0 +1,35 @@
+-- Stock movements per MLS point and commodity (see StockLedger in mls_stock.py).
+-- Opening stock is recorded as a receipt; balances are the running sum of
+-- receipts minus issues. Rows are never changed or removed: a correction is
+-- recorded as an opposite movement, possibly backdated, so StockLedger only
+-- has to look at newly recorded rows to know which cached months moved.
+
+CREATE TABLE IF NOT EXISTS mls_stock_ledger (
+    id bigserial PRIMARY KEY,
+    mls_point_code text NOT NULL,
+    commodity text NOT NULL,
+    movement_date date NOT NULL,
+    movement_type text NOT NULL CHECK (movement_type IN ('receipt', 'issue')),
+    quantity numeric(14, 3) NOT NULL CHECK (quantity >= 0),
+    created_at timestamptz NOT NULL DEFAULT clock_timestamp()
+);
+
+-- The monthly summary scans by date for all points at once
+CREATE INDEX IF NOT EXISTS mls_stock_ledger_movement_date_idx ON mls_stock_ledger (movement_date);
+CREATE INDEX IF NOT EXISTS mls_stock_ledger_point_idx ON mls_stock_ledger (mls_point_code, commodity, movement_date);
+
+-- StockLedger reads the rows recorded since its last check. created_at is
+-- clock_timestamp() rather than the transaction's start, so a row lands
+-- close to its commit; StockLedger's overlap window covers the rest
+CREATE INDEX IF NOT EXISTS mls_stock_ledger_created_at_idx ON mls_stock_ledger (created_at);
+
+CREATE OR REPLACE FUNCTION mls_stock_ledger_append_only() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION 'mls_stock_ledger is append-only; record a correcting movement instead';
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS mls_stock_ledger_append_only ON mls_stock_ledger;
+CREATE TRIGGER mls_stock_ledger_append_only
+    BEFORE UPDATE OR DELETE ON mls_stock_ledger
+    FOR EACH ROW EXECUTE FUNCTION mls_stock_ledger_append_only();
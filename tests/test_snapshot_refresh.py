@@ -0,0 +1,98 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from mls_columns import BOOL_DTYPE, compact_frame
+from mls_snapshot import MlsSnapshot, SnapshotRefresher, normalise_columns
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mls.db'}")
+    pd.DataFrame({
+        'mls_point_code': [1000, 1001, 1002],
+        'mls_point_name': ['Tenali', 'Mangalagiri', 'Vijayawada'],
+        'district_name': ['Guntur', 'Guntur', 'Krishna'],
+        'district_code': [7, 7, 8],
+        'mandal_name': ['Tenali', 'Mangalagiri', 'Vijayawada'],
+        'mls_point_latitude': [16.24, 16.43, 16.51],
+        'mls_point_longitude': [80.64, 80.56, 80.65],
+        'hamalies_working': [4, 6, 3],
+        'weighbridge_available': ['Yes', 'No', 'Yes'],
+        'updated_at': ['2025-01-01 00:00:00'] * 3,
+    }).to_sql('mls_points', engine, index=False)
+    return engine
+
+
+def test_change_feed_rereads_the_overlap_window(engine):
+    snapshot = MlsSnapshot(normalise_columns(pd.read_sql_query("SELECT * FROM mls_points", engine)))
+    refresher = SnapshotRefresher(engine, lambda: snapshot, overlap_seconds=60)
+    assert refresher.refresh_once() == 0
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE mls_points SET mls_point_name = 'First', updated_at = '2025-02-01 00:00:00' "
+                             "WHERE mls_point_code = 1000")
+    assert refresher.refresh_once() == 1
+
+    # A transaction that committed after that poll, stamped before the row it saw
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE mls_points SET mls_point_name = 'Late', updated_at = '2025-01-31 23:59:30' "
+                             "WHERE mls_point_code = 1001")
+    assert refresher.refresh_once() == 1
+    assert snapshot.get_record(1001)['mls_point_name'] == 'Late'
+    # Rows already applied inside the window are not applied again
+    assert refresher.refresh_once() == 0
+    assert snapshot.get_record(1000)['mls_point_name'] == 'First'
+
+
+def test_inserted_rows_keep_compact_dtypes(engine):
+    snapshot = MlsSnapshot(compact_frame(normalise_columns(pd.read_sql_query("SELECT * FROM mls_points", engine))))
+    dtypes = snapshot.df.dtypes.astype(str).to_dict()
+    refresher = SnapshotRefresher(engine, lambda: snapshot)
+    assert refresher.refresh_once() == 0
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO mls_points VALUES (1003, 'Nandigama', 'Krishna', NULL, 'Nandigama', 16.77, 80.28, 5, 'No', "
+            "'2025-02-01 00:00:00')")
+    assert refresher.refresh_once() == 1
+
+    df = snapshot.df
+    assert df.dtypes.astype(str).to_dict() == dtypes
+    assert isinstance(df['district_name'].dtype, pd.CategoricalDtype)
+    assert df['weighbridge_available'].dtype == BOOL_DTYPE
+
+    record = snapshot.get_record(1003)
+    assert record['mls_point_latitude'] == 16.77
+    assert record['hamalies_working'] == 5.0
+    assert not record['weighbridge_available']
+    assert snapshot.hierarchy.point_labels('Krishna', 'Nandigama') == [record.name]
+
+
+def test_workers_loading_the_same_rows_share_an_etag(engine):
+    query = "SELECT * FROM mls_points"
+    first, second = (MlsSnapshot(compact_frame(normalise_columns(pd.read_sql_query(query, engine)))) for _ in range(2))
+    assert first.etag == second.etag
+
+    # An edit made in one worker marks its ETag until the change feed brings the row back
+    first.update_row(first.code_index.get(1001), {'mls_point_name': 'Edited'})
+    assert first.etag != second.etag
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE mls_points SET mls_point_name = 'Edited', updated_at = '2025-03-01 00:00:00' "
+                             "WHERE mls_point_code = 1001")
+    for snapshot in (first, second):
+        assert SnapshotRefresher(engine, lambda: snapshot).refresh_once() == 1
+    assert first.etag == second.etag
+    assert first.generation != second.generation
+
+
+def test_workers_holding_different_edits_get_different_etags(engine):
+    query = "SELECT * FROM mls_points"
+    first, second = (MlsSnapshot(compact_frame(normalise_columns(pd.read_sql_query(query, engine)))) for _ in range(2))
+    first.update_row(first.code_index.get(1001), {'mls_point_name': 'Edited here'})
+    second.update_row(second.code_index.get(1001), {'mls_point_name': 'Edited there'})
+    assert first.etag != second.etag
+
+    # The same edit on the same rows gives the same ETag again
+    second.update_row(second.code_index.get(1001), {'mls_point_name': 'Edited here'})
+    assert first.etag == second.etag
@@ -0,0 +1,34 @@
+import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from mls_stock import StockLedger
+
+
+def movement(movement_id, movement_date, quantity, movement_type='receipt'):
+    return {'id': movement_id, 'mls_point_code': '1000', 'commodity': 'Sugar', 'movement_date': movement_date,
+            'movement_type': movement_type, 'quantity': quantity,
+            'created_at': datetime.datetime.now(datetime.timezone.utc)}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'stock.db'}")
+    pd.DataFrame([movement(1, '2025-01-05', 100.0), movement(2, '2025-03-10', 30.0, 'issue')]).to_sql(
+        'mls_stock_ledger', engine, index=False)
+    return engine
+
+
+def test_backdated_movements_reach_cached_months(engine):
+    ledger = StockLedger(engine, check_interval_seconds=0)
+    assert ledger.summary('2025-04').point_table('1000')[0]['months'][0]['closing'] == 70.0
+    # Its window starts at 2025-04, so it carries that month's opening forward
+    assert ledger.summary('2025-10').point_table('1000')[0]['months'][0]['closing'] == 70.0
+
+    pd.DataFrame([movement(3, '2025-02-01', 5.0)]).to_sql('mls_stock_ledger', engine, index=False, if_exists='append')
+    assert ledger.summary('2025-04').point_table('1000')[0]['months'][0]['closing'] == 75.0
+    assert ledger.summary('2025-10').point_table('1000')[0]['months'][0]['closing'] == 75.0
+    # Months before the backdated movement were left alone
+    assert ledger.summary('2025-01').point_table('1000')[0]['months'][0]['closing'] == 100.0